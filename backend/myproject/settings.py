@@ -74,6 +74,8 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "myproject.wsgi.application"
+# The chef order stream (Server-Sent Events) needs the ASGI entry point.
+ASGI_APPLICATION = "myproject.asgi.application"
 
 
 # Database
@@ -97,6 +99,26 @@ AUTH_USER_MODEL = "users.CustomUser"
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
+# The first hasher hashes new passwords; the others only verify old hashes.
+PASSWORD_HASHERS = [
+    "users.hashing.ConfigurablePBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+
+# PBKDF2 iterations for new hashes. Stored hashes with a different count
+# are rehashed on the next successful login, so this can be tuned to the
+# CPU of the nodes.
+PASSWORD_HASH_ITERATIONS = 1_000_000
+
+# Threads hashing passwords for login/signup per process, and how many
+# hashes may be running or waiting before those endpoints answer 429.
+PASSWORD_HASH_WORKERS = 4
+PASSWORD_HASH_QUEUE_DEPTH = 32
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -136,11 +158,43 @@ STATIC_URL = "static/"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 REST_FRAMEWORK = {
   
+    # Same output as DRF's JSONRenderer, encoded with orjson when installed.
+    "DEFAULT_RENDERER_CLASSES": [
+        "users.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "users.authentication.CookieJWTAuthentication",  # Custom class we'll create
-    ]
+        # Reads the user from the access token claims, no per-request query.
+        "users.authentication.CookieJWTStatelessAuthentication",
+    ],
+    # Token buckets per "<scope>.<kind>" (see users.ratelimit): the first
+    # number is the burst size, refilled evenly over the period.
+    "DEFAULT_THROTTLE_RATES": {
+        "login.ip": "30/min",
+        "login.identity": "10/min",
+        "signup.ip": "10/min",
+        "signup.identity": "5/min",
+        "verify-otp.ip": "30/min",
+        "verify-otp.identity": "10/min",
+        "place-order.ip": "120/min",
+        "place-order.identity": "60/min",
+    },
 }
 
+# Where rate limit buckets live. The in-memory backend limits each worker
+# process separately; use "users.ratelimit.CacheBucketBackend" (with
+# OPTIONS {"alias": "default"}) to share buckets between nodes via CACHES.
+RATE_LIMIT_BACKEND = {
+    "BACKEND": "users.ratelimit.MemoryBucketBackend",
+    "OPTIONS": {"shards": 16, "max_keys": 10000},
+}
+# Rejection totals are counted in this cache (point it at a shared one to
+# total them across workers); read them with the rate_limit_stats command.
+# Each "<scope>.<kind>" logs at most one warning per RATE_LIMIT_LOG_INTERVAL
+# seconds.
+RATE_LIMIT_STATS_CACHE = "default"
+RATE_LIMIT_LOG_INTERVAL = 60
+
 DEFAULT_FROM_EMAIL = "your-email@gmail.com"
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
 EMAIL_HOST = "smtp.gmail.com"
@@ -168,9 +222,61 @@ SIMPLE_JWT = {
     "ROTATE_REFRESH_TOKENS": True,
     "BLACKLIST_AFTER_ROTATION": True,
     "AUTH_HEADER_TYPES": ("Bearer",),
+    "TOKEN_USER_CLASS": "users.authentication.ClaimsUser",
     "AUTH_COOKIE": "access",  # Name of the cookie storing the access token
     "AUTH_COOKIE_REFRESH": "refresh",
     "AUTH_COOKIE_SECURE": not DEBUG,  # Use True in production (HTTPS)
     "AUTH_COOKIE_HTTP_ONLY": True,
     "AUTH_COOKIE_SAMESITE": "Lax",
 }
+
+# Cache for the public kitchen list/detail payloads. The LRU backend lives in
+# each worker process; switch to "users.cache.DjangoCacheBackend" (with
+# OPTIONS {"alias": "default"}) to share entries and invalidations between
+# workers through CACHES.
+KITCHEN_CACHE = {
+    "BACKEND": "users.cache.LRUCacheBackend",
+    "OPTIONS": {"max_entries": 1024},
+    "TIMEOUT": 300,
+}
+
+# How long a stored Idempotency-Key response is replayed for order placement.
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+
+# Carries order events between worker processes for the chef order stream.
+# LocalBroker only reaches streams served by the same process; point this at
+# a users.events.BaseBroker subclass backed by e.g. Redis when running
+# several workers.
+ORDER_EVENTS_BROKER = "users.events.LocalBroker"
+
+# Seconds users.authentication.get_full_user keeps a loaded user row per
+# process for views that need more than the token claims. 0 disables it.
+AUTH_USER_CACHE_TTL = 30
+
+# Retries for the outbound email queue (users.outbox): a failing email is
+# retried after OUTBOX_RETRY_BACKOFF, doubling each time, and given up after
+# OUTBOX_MAX_ATTEMPTS attempts.
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_BACKOFF = timedelta(seconds=30)
+
+# Where one-time passwords are kept. DatabaseOTPStore needs the
+# purge_expired_otps command on a schedule; users.otp.CacheOTPStore (with
+# OPTIONS {"alias": "default"}) relies on the cache TTL instead, which needs
+# a cache shared by all workers.
+OTP_STORE = {
+    "BACKEND": "users.otp.DatabaseOTPStore",
+    "OPTIONS": {},
+}
+OTP_TTL = timedelta(minutes=10)
+# Wrong guesses allowed per code before it is locked.
+OTP_MAX_ATTEMPTS = 5
+
+# Menu search (users.search). Unset, Postgres uses full-text search over GIN
+# indexes and other databases an in-memory index; set a dotted backend path
+# to force one. Price facet bucket boundaries:
+SEARCH_BACKEND = None
+SEARCH_PRICE_BUCKETS = [5, 10, 20]
+
+# Upper bound on the keys held by the per-process autocomplete index; each
+# name takes one key per word, up to three.
+AUTOCOMPLETE_MAX_KEYS = 400000
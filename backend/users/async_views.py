@@ -0,0 +1,177 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from .authentication import (
+    CookieJWTStatelessAuthentication,
+    UserRefreshToken,
+    set_auth_cookies,
+)
+from .events import order_events
+from .hashing import PoolSaturated, hash_password, verify_password
+from .models import CustomUser
+from .ratelimit import check_rate_limits
+from .serializers import ChefUserSerializer, CustomerUserSerializer, LoginSerializer
+from .utils import handle_otp_for_user
+
+KEEPALIVE_SECONDS = 15
+
+
+def _authenticate(request):
+    result = CookieJWTStatelessAuthentication().authenticate(request)
+    return result[0] if result else None
+
+
+async def chef_order_stream(request):
+    """
+    Server-Sent Events feed of new orders and status changes for the
+    logged-in chef. Needs an ASGI server; each open stream holds no database
+    connection while idle.
+    """
+    user = await sync_to_async(_authenticate)(request)
+    if user is None or user.role != "chef":
+        return JsonResponse({"error": "Unauthorized"}, status=403)
+
+    async def events():
+        async with order_events.subscribe(user.id) as subscription:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(
+                        subscription.get(), timeout=KEEPALIVE_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                event_type = json.loads(message)["type"]
+                yield f"event: {event_type}\ndata: {message}\n\n"
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+# Login and signup are async so the password hash runs on the bounded
+# hashing pool (users.hashing) instead of tying up a request worker. The
+# database work around it stays synchronous.
+
+
+def _json_body(request):
+    try:
+        data = json.loads(request.body or b"{}")
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _busy():
+    response = JsonResponse(
+        {"error": "Too many sign-ins in progress, please try again."}, status=429
+    )
+    response["Retry-After"] = "1"
+    return response
+
+
+@csrf_exempt
+@require_POST
+async def login(request):
+    if await sync_to_async(_authenticate)(request) is not None:
+        return JsonResponse({"status": "Already logged in"})
+
+    data = _json_body(request)
+    if data is None:
+        return JsonResponse({"detail": "Invalid JSON."}, status=400)
+    limited = await sync_to_async(check_rate_limits)(
+        request, "login", data.get("identifier")
+    )
+    if limited:
+        return limited
+    serializer = LoginSerializer(data=data, context={"check_password": False})
+    if not await sync_to_async(serializer.is_valid)():
+        return JsonResponse(serializer.errors, status=400)
+
+    user = serializer.validated_data["user"]
+    try:
+        matches, new_hash = await verify_password(
+            serializer.validated_data["password"], user.password
+        )
+    except PoolSaturated:
+        return _busy()
+    if not matches:
+        return JsonResponse({"non_field_errors": ["Invalid credentials."]}, status=400)
+    if new_hash:
+        await CustomUser.objects.filter(id=user.id).aupdate(password=new_hash)
+
+    if not user.is_active:
+        return await sync_to_async(handle_otp_for_user)(
+            user, "login", JsonResponse({"otp_sent": True})
+        )
+
+    refresh = await sync_to_async(UserRefreshToken.for_user)(user)
+    response = JsonResponse(
+        {
+            "user": {
+                "id": user.id,
+                "email": user.email,
+                "role": user.role,
+                "kitchen_name": user.kitchen_name,
+            },
+            "otp_sent": False,
+        }
+    )
+    return set_auth_cookies(response, refresh.access_token, refresh)
+
+
+def _create_user(serializer):
+    user = serializer.save()
+    return handle_otp_for_user(
+        user,
+        "signup",
+        JsonResponse(
+            {"message": "Account created. Please verify your email."}, status=201
+        ),
+    )
+
+
+async def _signup(request, serializer_class):
+    if await sync_to_async(_authenticate)(request) is not None:
+        return JsonResponse({"status": "Already logged in"})
+
+    data = _json_body(request)
+    if data is None:
+        return JsonResponse({"detail": "Invalid JSON."}, status=400)
+    limited = await sync_to_async(check_rate_limits)(
+        request, "signup", data.get("email")
+    )
+    if limited:
+        return limited
+    context = {}
+    serializer = serializer_class(data=data, context=context)
+    if not await sync_to_async(serializer.is_valid)():
+        return JsonResponse(serializer.errors, status=400)
+
+    try:
+        context["password_hash"] = await hash_password(
+            serializer.validated_data["password"]
+        )
+    except PoolSaturated:
+        return _busy()
+    # New accounts stay inactive (the model default) until the OTP is verified.
+    return await sync_to_async(_create_user)(serializer)
+
+
+@csrf_exempt
+@require_POST
+async def chef_signup(request):
+    return await _signup(request, ChefUserSerializer)
+
+
+@csrf_exempt
+@require_POST
+async def customer_signup(request):
+    return await _signup(request, CustomerUserSerializer)
@@ -1,14 +1,168 @@
+from django.conf import settings
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+from .cache import LRUCacheBackend
+from .models import CustomUser
+
+# Copied into every token so most requests can be served without loading the
+# user row. Access tokens inherit them from the refresh token they come from.
+USER_CLAIMS = ("email", "role", "kitchen_name", "is_active")
+
+
+class UserRefreshToken(RefreshToken):
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for claim in USER_CLAIMS:
+            token[claim] = getattr(user, claim)
+        return token
+
+
+class UserTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refresh that re-reads the user and re-issues its claims, so the claims
+    of an access token are never older than ACCESS_TOKEN_LIFETIME. Honors
+    ROTATE_REFRESH_TOKENS and BLACKLIST_AFTER_ROTATION like simplejwt's.
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+        user = CustomUser.objects.filter(
+            id=refresh.payload.get(api_settings.USER_ID_CLAIM)
+        ).first()
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(
+                self.error_messages["no_active_account"], "no_active_account"
+            )
+        for claim in USER_CLAIMS:
+            refresh[claim] = getattr(user, claim)
+
+        data = {"access": str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            refresh.outstand()
+            data["refresh"] = str(refresh)
+        return data
+
+
+class ClaimsUser(TokenUser):
+    """
+    Stateless ``request.user`` built from the claims of a validated access
+    token. ``role``, ``email`` and ``kitchen_name`` resolve to the claims of
+    the same name. Use ``get_full_user`` when a view needs the database row.
+    """
+
+    @property
+    def is_active(self):
+        return self.token.get("is_active", False)
+
 
 class CookieJWTAuthentication(JWTAuthentication):
     def authenticate(self, request):
-        print("cookie authentication check")
-        access_token = request.COOKIES.get('access')
+        access_token = request.COOKIES.get("access")
         if access_token is None:
             return None
         try:
             validated_token = self.get_validated_token(access_token)
-            print(validated_token, self.get_user(validated_token), validated_token)
             return self.get_user(validated_token), validated_token
         except Exception:
             return None
+
+
+class CookieJWTStatelessAuthentication(CookieJWTAuthentication):
+    """
+    Cookie authentication that trusts the claims in the access token instead
+    of selecting the user on every request. Tokens issued before the claims
+    were added fall back to the database lookup.
+
+    Changes to a user (deactivation, kitchen rename) reach requests when a
+    new access token is issued, i.e. within ACCESS_TOKEN_LIFETIME.
+    """
+
+    def get_user(self, validated_token):
+        if "role" not in validated_token:
+            return super().get_user(validated_token)
+        user = ClaimsUser(validated_token)
+        if not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return user
+
+
+user_cache = LRUCacheBackend(max_entries=4096)
+
+
+def get_full_user(user, fresh=False):
+    """
+    The ``CustomUser`` row behind ``request.user``.
+
+    Rows are kept in a small in-process cache for AUTH_USER_CACHE_TTL
+    seconds (0 disables it); pass ``fresh=True`` to bypass and refresh the
+    cached copy. Treat the result as read-only.
+    """
+    if isinstance(user, CustomUser):
+        return user
+    ttl = getattr(settings, "AUTH_USER_CACHE_TTL", 30)
+    if ttl and not fresh:
+        cached = user_cache.get(user.id)
+        if cached is not None:
+            return cached
+    full_user = CustomUser.objects.get(id=user.id)
+    if ttl:
+        user_cache.set(user.id, full_user, ttl)
+    return full_user
+
+
+def set_auth_cookies(response, access, refresh=None):
+    """
+    Store the tokens in HttpOnly cookies that expire with the tokens
+    themselves. Leaves the refresh cookie alone when ``refresh`` is None.
+    """
+    response.set_cookie(
+        key="access",
+        value=str(access),
+        httponly=True,
+        secure=settings.DEBUG is False,
+        samesite="Lax",
+        max_age=int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()),
+    )
+    if refresh is not None:
+        response.set_cookie(
+            key="refresh",
+            value=str(refresh),
+            httponly=True,
+            secure=settings.DEBUG is False,
+            samesite="Lax",
+            max_age=int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()),
+        )
+    return response
+
+
+def prune_expired_tokens(batch_size=1000):
+    """
+    Delete expired outstanding refresh tokens, and with them their
+    blacklist entries, ``batch_size`` rows at a time so no single statement
+    locks the tables for long. Returns the number of tokens deleted.
+    """
+    total = 0
+    now = aware_utcnow()
+    while True:
+        ids = list(
+            OutstandingToken.objects.filter(expires_at__lte=now).values_list(
+                "id", flat=True
+            )[:batch_size]
+        )
+        if not ids:
+            return total
+        OutstandingToken.objects.filter(id__in=ids).delete()
+        total += len(ids)
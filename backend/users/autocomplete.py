@@ -0,0 +1,213 @@
+import logging
+import re
+import threading
+from bisect import bisect_left
+from itertools import chain
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from .models import CustomUser, KitchenItem
+
+logger = logging.getLogger(__name__)
+
+KITCHEN = "kitchen"
+DISH = "dish"
+
+# Kitchens sort ahead of dishes sharing the same key.
+KIND_ORDER = {KITCHEN: 0, DISH: 1}
+
+# Names also match from the start of each of their first three words, so
+# "thai" finds "Vegan Pad Thai".
+MAX_WORD_KEYS = 3
+
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize(text):
+    return WHITESPACE_RE.sub(" ", (text or "").casefold()).strip()
+
+
+def prefix_keys(name):
+    key = normalize(name)
+    if not key:
+        return []
+    keys = [key]
+    for match in re.finditer(" ", key):
+        if len(keys) == MAX_WORD_KEYS:
+            break
+        keys.append(key[match.end() :])
+    return list(dict.fromkeys(keys))
+
+
+class PrefixIndex:
+    """
+    Names kept as a sorted array of ``(key, kind order, id)`` tuples, so a
+    prefix lookup is one bisect plus a scan over at most a page of matches.
+
+    Holds at most ``max_keys`` keys; names that would go past the bound are
+    left out (and logged) rather than growing without limit. Changes build
+    a new index (``without_kitchens`` then ``extend``) so readers of the
+    old one are never disturbed.
+    """
+
+    def __init__(self, max_keys=400000):
+        self.max_keys = max_keys
+        self._keys = []
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def extend(self, entries):
+        """Add many ``(kind, id, name, extra)`` at once with a single sort."""
+        added = []
+        for kind, entry_id, name, extra in entries:
+            keys = [(key, KIND_ORDER[kind], entry_id) for key in prefix_keys(name)]
+            if not keys:
+                continue
+            if len(self._keys) + len(added) + len(keys) > self.max_keys:
+                logger.warning("Autocomplete index is full; skipping the rest")
+                break
+            self._entries[(kind, entry_id)] = (name, extra, keys)
+            added.extend(keys)
+        self._keys.extend(added)
+        self._keys.sort()
+
+    def without_kitchens(self, chef_ids):
+        """A copy without the given kitchens and their dishes."""
+        index = PrefixIndex(self.max_keys)
+        index._entries = {
+            (kind, entry_id): entry
+            for (kind, entry_id), entry in self._entries.items()
+            if (entry_id if kind == KITCHEN else entry[1]["kitchen_id"]) not in chef_ids
+        }
+        kinds = {order: kind for kind, order in KIND_ORDER.items()}
+        index._keys = [
+            key for key in self._keys if (kinds[key[1]], key[2]) in index._entries
+        ]
+        return index
+
+    def search(self, prefix, limit=10):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        kinds = {order: kind for kind, order in KIND_ORDER.items()}
+        results, seen = [], set()
+        i = bisect_left(self._keys, (prefix,))
+        while i < len(self._keys) and len(results) < limit:
+            key, order, entry_id = self._keys[i]
+            if not key.startswith(prefix):
+                break
+            i += 1
+            kind = kinds[order]
+            if (kind, entry_id) in seen:
+                continue
+            seen.add((kind, entry_id))
+            name, extra, _ = self._entries[(kind, entry_id)]
+            results.append({"type": kind, "id": entry_id, "name": name, **extra})
+        return results
+
+
+class AutocompleteIndex:
+    """
+    Typeahead over kitchen names and published dish names, held in this
+    process and bounded by AUTOCOMPLETE_MAX_KEYS.
+
+    Lookups only ever read the current index and never touch the
+    database. Writes mark their kitchen through ``invalidate_kitchen``;
+    once the transaction commits, a background thread reloads the marked
+    kitchens, builds a new index in one sort and swaps it in. Until the
+    first build finishes lookups return nothing. With ``background`` off
+    the refresh runs in the committing thread instead (used by tests).
+    """
+
+    background = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._index = None
+            self._dirty = set()
+            self._scheduled = False
+            self._wanted = False
+
+    def invalidate_kitchen(self, chef_id):
+        with self._lock:
+            self._dirty.add(chef_id)
+        transaction.on_commit(self._schedule)
+
+    def _schedule(self):
+        with self._lock:
+            # Nothing to keep fresh until the first lookup asks for a build.
+            if self._scheduled or not self._wanted:
+                return
+            self._scheduled = True
+        if self.background:
+            threading.Thread(
+                target=self._refresh_in_thread, name="autocomplete-refresh", daemon=True
+            ).start()
+        else:
+            self.refresh()
+
+    def _refresh_in_thread(self):
+        try:
+            self.refresh()
+        except Exception:
+            logger.exception("Autocomplete refresh failed")
+        finally:
+            connections.close_all()
+
+    def _load(self, index, chef_ids=None):
+        chefs = CustomUser.objects.filter(role="chef", is_active=True).exclude(
+            kitchen_name=None
+        )
+        items = KitchenItem.objects.filter(
+            is_published=True, chef__role="chef", chef__is_active=True
+        )
+        if chef_ids is not None:
+            chefs = chefs.filter(id__in=chef_ids)
+            items = items.filter(chef_id__in=chef_ids)
+        kitchens = (
+            (KITCHEN, chef_id, name, {})
+            for chef_id, name in chefs.values_list("id", "kitchen_name")
+        )
+        dishes = (
+            (DISH, item_id, name, {"kitchen_id": chef_id})
+            for item_id, name, chef_id in items.values_list("id", "name", "chef_id")
+        )
+        index.extend(chain(kitchens, dishes))
+
+    def refresh(self):
+        """Build the index, or apply the pending kitchen changes, now."""
+        with self._refresh_lock:
+            with self._lock:
+                self._scheduled = False
+                dirty, self._dirty = self._dirty, set()
+                current = self._index
+            if current is None:
+                index = PrefixIndex(getattr(settings, "AUTOCOMPLETE_MAX_KEYS", 400000))
+                self._load(index)
+            elif dirty:
+                index = current.without_kitchens(dirty)
+                self._load(index, dirty)
+            else:
+                return
+            with self._lock:
+                self._index = index
+
+    def suggest(self, prefix, limit=10):
+        index = self._index
+        if index is None:
+            with self._lock:
+                self._wanted = True
+            self._schedule()
+            index = self._index
+        return index.search(prefix, limit) if index is not None else []
+
+
+autocomplete_index = AutocompleteIndex()
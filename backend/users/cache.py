@@ -0,0 +1,188 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+
+class LRUCacheBackend:
+    """
+    Bounded in-process cache. The least recently used entry is evicted once
+    ``max_entries`` is reached. Every worker process holds its own copy, so
+    use ``DjangoCacheBackend`` when invalidations must reach other workers.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                expires_at, value = self._data[key]
+            except KeyError:
+                return default
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def _store(self, key, value, timeout):
+        # Caller holds the lock.
+        expires_at = time.monotonic() + timeout if timeout else None
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def set(self, key, value, timeout=None):
+        with self._lock:
+            self._store(key, value, timeout)
+
+    def add(self, key, value, timeout=None):
+        """Store ``value`` unless a live entry exists; True when stored."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (entry[0] is None or entry[0] >= time.monotonic()):
+                return False
+            self._store(key, value, timeout)
+            return True
+
+    def incr(self, key):
+        with self._lock:
+            expires_at, value = self._data[key]
+            self._data[key] = (expires_at, value + 1)
+            self._data.move_to_end(key)
+            return value + 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class DjangoCacheBackend:
+    """Stores entries in one of the caches configured in ``CACHES``."""
+
+    def __init__(self, alias="default"):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get(self, key, default=None):
+        return self.cache.get(key, default)
+
+    def set(self, key, value, timeout=None):
+        self.cache.set(key, value, timeout)
+
+    def add(self, key, value, timeout=None):
+        return self.cache.add(key, value, timeout)
+
+    def incr(self, key):
+        return self.cache.incr(key)
+
+    def clear(self):
+        self.cache.clear()
+
+
+class KitchenCache:
+    """
+    Serialized public kitchen payloads.
+
+    Every kitchen has its own version and the catalogue has a global one.
+    Writing to a kitchen bumps both, which orphans that kitchen's detail
+    entry and every cached catalogue page without touching other kitchens.
+    Versions start from the current time so a lost version key can never
+    resurrect an old entry.
+    """
+
+    catalogue_version_key = "kitchens:version"
+
+    def __init__(self):
+        self._backend = None
+        self._lock = threading.Lock()
+
+    @property
+    def config(self):
+        return getattr(settings, "KITCHEN_CACHE", {})
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    backend_class = import_string(
+                        self.config.get("BACKEND", "users.cache.LRUCacheBackend")
+                    )
+                    self._backend = backend_class(**self.config.get("OPTIONS", {}))
+        return self._backend
+
+    @property
+    def timeout(self):
+        return self.config.get("TIMEOUT", 300)
+
+    def reset(self):
+        """Drop the backend so it is rebuilt from settings on next use."""
+        with self._lock:
+            if self._backend is not None:
+                self._backend.clear()
+            self._backend = None
+
+    def _version(self, key):
+        version = self.backend.get(key)
+        if version is None:
+            self.backend.add(key, time.time_ns())
+            version = self.backend.get(key)
+        return version
+
+    def _bump(self, key):
+        try:
+            self.backend.incr(key)
+        except (KeyError, ValueError):
+            self.backend.add(key, time.time_ns())
+
+    def _kitchen_version_key(self, kitchen_id):
+        return f"kitchens:{kitchen_id}:version"
+
+    def catalogue_version(self):
+        return self._version(self.catalogue_version_key)
+
+    def kitchen_version(self, kitchen_id):
+        return self._version(self._kitchen_version_key(kitchen_id))
+
+    def _catalogue_key(self, variant, version):
+        # Variants carry query parameters; hash them to keep keys short.
+        digest = hashlib.md5(variant.encode()).hexdigest()
+        return f"kitchens:catalogue:{version}:{digest}"
+
+    def _kitchen_key(self, kitchen_id, version):
+        return f"kitchens:{kitchen_id}:detail:{version}"
+
+    # Pass the version read before a miss to both get_* and set_*: a write
+    # that lands while the payload is being built then orphans it, rather
+    # than the stale payload being stored under the new version.
+
+    def get_catalogue(self, variant, version):
+        return self.backend.get(self._catalogue_key(variant, version))
+
+    def set_catalogue(self, variant, version, data):
+        self.backend.set(self._catalogue_key(variant, version), data, self.timeout)
+
+    def get_kitchen(self, kitchen_id, version):
+        return self.backend.get(self._kitchen_key(kitchen_id, version))
+
+    def set_kitchen(self, kitchen_id, version, data):
+        self.backend.set(self._kitchen_key(kitchen_id, version), data, self.timeout)
+
+    def invalidate_kitchen(self, kitchen_id):
+        self._bump(self._kitchen_version_key(kitchen_id))
+        self._bump(self.catalogue_version_key)
+
+
+kitchen_cache = KitchenCache()
@@ -0,0 +1,195 @@
+import hashlib
+
+from django.db.models import Count, Max, Q
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .autocomplete import autocomplete_index
+from .cache import kitchen_cache
+from .search import search_index
+from .models import CustomUser, KitchenItem
+from .fieldsets import Fieldset
+from .readers import ITEM_FIELDS, item_rows_by_chef
+from .tags import filter_items
+
+
+def published_items(allergen_free=(), ingredients=()):
+    """Published menu items, narrowed as in users.tags.filter_items."""
+    items = KitchenItem.objects.filter(is_published=True)
+    if allergen_free or ingredients:
+        items = filter_items(items, allergen_free, ingredients)
+    return items
+
+
+def kitchen_is_open(chef):
+    capacity = getattr(chef, "capacity", None)
+    return capacity is None or capacity.is_open
+
+
+# What kitchen_is_open reads from a chef's capacity.
+CAPACITY_COLUMNS = (
+    "capacity__is_accepting_orders",
+    "capacity__max_open_orders",
+    "capacity__open_orders",
+)
+
+# Catalogue key -> (chef columns read, value built from the chef).
+KITCHEN_VALUES = {
+    "id": ((), lambda chef: chef.id),
+    "name": (("kitchen_name",), lambda chef: chef.kitchen_name),
+    "description": (("first_name",), lambda chef: chef.first_name or ""),
+    "image": ((), lambda chef: "/placeholder-kitchen.jpg"),
+    # You can add logic to calculate actual rating
+    "rating": ((), lambda chef: 4.5),
+    "foodCount": ((), lambda chef: chef.food_count),
+    "isOpen": (CAPACITY_COLUMNS, kitchen_is_open),
+}
+KITCHEN_KEYS = (*KITCHEN_VALUES, "foodItems")
+SUMMARY_KEYS = ("id", "name", "description", "foodCount")
+
+
+def kitchen_fieldset(params=None, summary=False):
+    """
+    What a catalogue request asked for; ``summary`` defaults to the
+    summary keys without ``foodItems``.
+    """
+    return Fieldset(
+        params or {},
+        KITCHEN_KEYS,
+        embeds={"foodItems": ITEM_FIELDS},
+        default_fields=SUMMARY_KEYS if summary else None,
+        default_include=() if summary else None,
+    )
+
+
+def kitchen_queryset(fieldset=None, allergen_free=(), ingredients=()):
+    """
+    Chefs with at least one published item, annotated with ``food_count``
+    and loading only the columns ``fieldset`` needs.
+
+    ``allergen_free`` and ``ingredients`` narrow the items (see
+    users.tags.filter_items); kitchens left with no matching item are
+    dropped and ``food_count`` counts the matches.
+    """
+    fieldset = fieldset or kitchen_fieldset()
+    if allergen_free or ingredients:
+        items = published_items(allergen_free, ingredients)
+        food_count = Count("items", filter=Q(items__in=items.values("id")))
+    else:
+        food_count = Count("items", filter=Q(items__is_published=True))
+    chefs = (
+        CustomUser.objects.filter(role="chef")
+        .annotate(food_count=food_count)
+        .filter(food_count__gt=0)
+        .order_by("id")
+    )
+    columns = [
+        column
+        for key in fieldset.keys
+        for column in KITCHEN_VALUES.get(key, ((),))[0]
+    ]
+    if "isOpen" in fieldset:
+        chefs = chefs.select_related("capacity")
+    return chefs.only("id", *columns)
+
+
+def build_kitchen_catalogue(
+    chefs=None, fieldset=None, allergen_free=(), ingredients=()
+):
+    """
+    Serialize a page of ``kitchen_queryset``. When ``foodItems`` is
+    included the published items of the whole page are read with one
+    values() query, so the cost stays constant however many kitchens
+    there are.
+    """
+    fieldset = fieldset or kitchen_fieldset()
+    if chefs is None:
+        chefs = kitchen_queryset(fieldset, allergen_free, ingredients)
+    chefs = list(chefs)
+    items = {}
+    if "foodItems" in fieldset:
+        items = item_rows_by_chef(
+            published_items(allergen_free, ingredients)
+            .filter(chef_id__in=[chef.id for chef in chefs])
+            .order_by("id"),
+            fieldset.embedded["foodItems"],
+        )
+    values = [
+        (key, None if key == "foodItems" else KITCHEN_VALUES[key][1])
+        for key in fieldset.keys
+    ]
+    return [
+        {
+            key: items.get(chef.id, []) if build is None else build(chef)
+            for key, build in values
+        }
+        for chef in chefs
+    ]
+
+
+def mark_kitchen_modified(chef_id):
+    """Record a change to a kitchen's public data and drop its cached payloads."""
+    CustomUser.objects.filter(id=chef_id).update(kitchen_updated_at=timezone.now())
+    kitchen_cache.invalidate_kitchen(chef_id)
+    search_index.invalidate_kitchen(chef_id)
+    autocomplete_index.invalidate_kitchen(chef_id)
+
+
+def _validators(parts, last_modified):
+    digest = hashlib.md5(":".join(str(part) for part in parts).encode()).hexdigest()
+    etag = quote_etag(digest)
+    return etag, int(last_modified.timestamp()) if last_modified else None
+
+
+def kitchen_validators(chef, variant=""):
+    """ETag and Last-Modified timestamp for one variant of a kitchen's detail."""
+    last_modified = chef.kitchen_updated_at
+    if last_modified is None:
+        # Kitchens not touched since the timestamp was introduced.
+        last_modified = KitchenItem.objects.filter(chef=chef).aggregate(
+            last=Max("updated_at")
+        )["last"]
+    if last_modified is None:
+        return None, None
+    parts = ["k", chef.id, last_modified.timestamp()]
+    if variant:
+        parts.append(variant)
+    return _validators(parts, last_modified)
+
+
+def catalogue_validators(variant):
+    """ETag and Last-Modified timestamp for one variant of the kitchen list."""
+    chefs = CustomUser.objects.filter(role="chef").aggregate(
+        last=Max("kitchen_updated_at"), count=Count("id")
+    )
+    items = KitchenItem.objects.aggregate(last=Max("updated_at"), count=Count("id"))
+    last_modified = max(filter(None, [chefs["last"], items["last"]]), default=None)
+    if last_modified is None:
+        return None, None
+    parts = ["c", chefs["count"], items["count"], last_modified.timestamp(), variant]
+    return _validators(parts, last_modified)
+
+
+def set_validators(response, etag, last_modified):
+    if etag:
+        response.headers["ETag"] = etag
+    if last_modified:
+        response.headers["Last-Modified"] = http_date(last_modified)
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def conditional_response(request, etag, last_modified):
+    """
+    The 304 (or 412) response the request's conditional headers call for,
+    or None when the full payload has to be sent.
+    """
+    if not etag and not last_modified:
+        return None
+    response = set_validators(HttpResponse(), etag, last_modified)
+    result = get_conditional_response(
+        request, etag=etag, last_modified=last_modified, response=response
+    )
+    return None if result is response else result
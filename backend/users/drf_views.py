@@ -1,20 +1,71 @@
 from rest_framework_simplejwt.tokens import RefreshToken, TokenError
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status, viewsets
-from .models import KitchenItem, EmailVerificationToken, CustomUser, Order, OrderItem
+from .models import (
+    KitchenItem,
+    EmailVerificationToken,
+    CustomUser,
+    CustomerStats,
+    KitchenCapacity,
+    Order,
+)
 from .serializers import (
     KitchenItemSerializer,
-    ChefUserSerializer,
-    CustomerUserSerializer,
-    LoginSerializer,
     OrderSerializer,
+    KitchenCapacitySerializer,
+)
+from .fieldsets import Fieldset, FieldsetError, fieldset_requested
+from .readers import (
+    ITEM_FIELDS,
+    item_fieldset,
+    item_rows,
+    order_columns,
+    order_fieldset,
+    order_rows,
 )
-from .utils import handle_otp_for_user
-from django.conf import settings
+from .otp import EXPIRED, LOCKED, NOT_FOUND, VERIFIED, get_otp_store
+from .utils import query_flag
+from django.db import IntegrityError, transaction
+from django.utils import timezone
 from rest_framework.parsers import MultiPartParser, FormParser
+from .authentication import (
+    UserRefreshToken,
+    UserTokenRefreshSerializer,
+    get_full_user,
+    set_auth_cookies,
+)
 from .permissions import IsChef
+from .catalogue import (
+    build_kitchen_catalogue,
+    catalogue_validators,
+    conditional_response,
+    CAPACITY_COLUMNS,
+    kitchen_fieldset,
+    kitchen_is_open,
+    kitchen_queryset,
+    kitchen_validators,
+    mark_kitchen_modified,
+    set_validators,
+)
+from .idempotency import idempotent
+from .orders import (
+    OPEN_STATUSES,
+    OrderError,
+    filter_order_history,
+    place_cart_orders,
+    place_order,
+    transition_orders,
+)
+from .pagination import KitchenCursorPagination, OrderCursorPagination
+from .ratelimit import IdentityRateThrottle, IPRateThrottle
+from .stats import serialize_stats
+from .cache import kitchen_cache
+from .autocomplete import autocomplete_index
+from .search import SearchError, SearchParams, search_index
+from .tags import filter_items, tag_params
 
 
 class KitchenItemListCreateAPIView(APIView):
@@ -22,18 +73,19 @@ class KitchenItemListCreateAPIView(APIView):
 
     def get(self, request):
 
-        items = KitchenItem.objects.filter(chef=request.user)
-        serializer = KitchenItemSerializer(items, many=True)
-        print("items returned")
-        return Response(serializer.data)
+        try:
+            fieldset = item_fieldset(request.query_params)
+        except FieldsetError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        items = KitchenItem.objects.filter(chef_id=request.user.id)
+        return Response(item_rows(items, fieldset.keys))
 
     def post(self, request):
 
         serializer = KitchenItemSerializer(data=request.data)
         if serializer.is_valid():
-            item = serializer.save(chef=request.user)
-            item.chef = request.user
-            item.save()
+            item = serializer.save(chef_id=request.user.id)
+            mark_kitchen_modified(request.user.id)
             return Response(
                 KitchenItemSerializer(item).data, status=status.HTTP_201_CREATED
             )
@@ -54,131 +106,6 @@ class VerifyEmailAPIView(APIView):
             return Response({"error": "Invalid or expired token."}, status=400)
 
 
-class ChefSignupAPI(APIView):
-    # parser_classes = (MultiPartParser, FormParser)
-    def post(self, request):
-        if request.user.is_authenticated:
-            return Response({"status": "Already logged in"})
-
-        print("chef signup view")
-        print(request.data)
-        serializer = ChefUserSerializer(data=request.data)
-        if serializer.is_valid():
-            print(serializer.validated_data)
-
-            user = serializer.save()
-            user.is_active = False  # Block login until verified
-            user.save()
-
-            response = handle_otp_for_user(user,"signup", response = Response(
-                {"message": "Account created. Please verify your email."},
-                status=status.HTTP_201_CREATED,
-            ))
-
-            return response
-
-        else:
-            print(serializer.errors)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-
-class CustomerSignupAPI(APIView):
-    # parser_classes = (MultiPartParser, FormParser)
-
-    def post(self, request):
-        if request.user.is_authenticated:
-            return Response({"status": "Already logged in"})
-
-        print(request.data)
-        serializer = CustomerUserSerializer(data=request.data)
-        if serializer.is_valid():
-            print("valid")
-            user = serializer.save()
-            user.is_active = False
-            user.save()
-
-            
-
-            response = handle_otp_for_user(user,"signup", response = Response(
-                {"message": "Account created. Please verify your email."},
-                status=status.HTTP_201_CREATED,
-            ))
-
-            return response
-
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-
-class LoginAPIView(APIView):
-    def post(self, request):
-        print("login")
-        if request.user.is_authenticated:
-            return Response({"status": "Already logged in"})
-
-        serializer = LoginSerializer(data=request.data)
-        if serializer.is_valid():
-            user = serializer.validated_data["user"]
-            if (not user.is_active):
-                return handle_otp_for_user(user,"login",Response({"otp_sent":True}))
-           
-            refresh = RefreshToken.for_user(user)
-            response = Response(
-                {
-                    "user": {
-                        "id": user.id,
-                        "email": user.email,
-                        "role": user.role,
-                        "kitchen_name": user.kitchen_name,
-                    },
-                    "otp_sent": False
-                }
-            )
-
-            # Set tokens in HttpOnly cookies
-            response.set_cookie(
-                key="access",
-                value=str(refresh.access_token),
-                httponly=True,
-                secure=settings.DEBUG is False,
-                samesite="Lax",
-                max_age=3600,
-            )
-            response.set_cookie(
-                key="refresh",
-                value=str(refresh),
-                httponly=True,
-                secure=settings.DEBUG is False,
-                samesite="Lax",
-                max_age=7 * 24 * 3600,
-            )
-            print("logged in", response)
-            print(response.cookies)
-            return response
-
-            # signed_token = handle_otp_for_user(user,"login")
-            # print("logged in", response)
-            # # print(response.cookies)
-            # response = Response({
-            #     "message": "OTP sent to your email for verification."
-            # }, status=200)
-
-            # # Set signed OTP token as a cookie
-            # response.set_cookie(
-            #     key="otp_token",
-            #     value=signed_token,
-            #     max_age=300,  # 5 minutes
-            #     httponly=False,  # You want frontend JS to access it
-            #     secure=True,     # Only over HTTPS
-            #     samesite="Lax"
-            # )
-
-            # return response
-
-        else:
-            print(serializer.errors)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-
 class LogoutAPIView(APIView):
     def post(self, request):
         refresh_token = request.COOKIES.get("refresh")
@@ -209,6 +136,39 @@ class LogoutAPIView(APIView):
             )
 
 
+class TokenRefreshAPIView(APIView):
+    """
+    Swap the refresh cookie for a new access cookie (and a new refresh
+    cookie when ROTATE_REFRESH_TOKENS is on) without logging in again.
+    """
+
+    authentication_classes = []
+
+    def post(self, request):
+        refresh_token = request.COOKIES.get("refresh")
+        if refresh_token is None:
+            return Response(
+                {"detail": "Refresh token not found."},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+
+        serializer = UserTokenRefreshSerializer(data={"refresh": refresh_token})
+        try:
+            serializer.is_valid(raise_exception=True)
+        except (TokenError, AuthenticationFailed) as e:
+            response = Response(
+                {"detail": f"Token error: {str(e)}"},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+            response.delete_cookie("access")
+            response.delete_cookie("refresh")
+            return response
+
+        tokens = serializer.validated_data
+        response = Response({"detail": "Token refreshed."}, status=status.HTTP_200_OK)
+        return set_auth_cookies(response, tokens["access"], tokens.get("refresh"))
+
+
 class UpdateKitchenNameAPIView(APIView):
     permission_classes = [IsAuthenticated, IsChef]
 
@@ -221,22 +181,40 @@ class UpdateKitchenNameAPIView(APIView):
 
         # Check if another user already has this kitchen name
         if (
-            CustomUser.objects.filter(kitchen_name__iexact=new_kitchen_name)
+            CustomUser.objects.filter(kitchen_name__lower=new_kitchen_name.lower())
             .exclude(id=user.id)
             .exists()
         ):
             return Response({"error": "Kitchen name already taken."}, status=400)
 
-        user.kitchen_name = new_kitchen_name
-        user.save()
+        try:
+            with transaction.atomic():
+                CustomUser.objects.filter(id=user.id).update(
+                    kitchen_name=new_kitchen_name, kitchen_updated_at=timezone.now()
+                )
+        except IntegrityError:
+            # Lost a race with another chef claiming the same name.
+            return Response({"error": "Kitchen name already taken."}, status=400)
+        kitchen_cache.invalidate_kitchen(user.id)
+        search_index.invalidate_kitchen(user.id)
+        autocomplete_index.invalidate_kitchen(user.id)
 
-        return Response(
+        response = Response(
             {
                 "message": "Kitchen name updated successfully.",
-                "kitchen_name": user.kitchen_name,
+                "kitchen_name": new_kitchen_name,
             },
             status=200,
         )
+        # The kitchen name is a token claim: reissue the tokens so it sticks.
+        old_refresh = request.COOKIES.get("refresh")
+        if old_refresh:
+            try:
+                RefreshToken(old_refresh).blacklist()
+            except TokenError:
+                pass
+        refresh = UserRefreshToken.for_user(get_full_user(user, fresh=True))
+        return set_auth_cookies(response, refresh.access_token, refresh)
 
 
 class KitchenItemDeleteUpdateView(APIView):
@@ -244,7 +222,7 @@ class KitchenItemDeleteUpdateView(APIView):
 
     def get_object(self, pk, user):
         try:
-            return KitchenItem.objects.get(pk=pk, chef=user)
+            return KitchenItem.objects.get(pk=pk, chef_id=user.id)
         except KitchenItem.DoesNotExist:
             return None
 
@@ -258,6 +236,7 @@ class KitchenItemDeleteUpdateView(APIView):
                 {"error": "Item not found"}, status=status.HTTP_404_NOT_FOUND
             )
         item.delete()
+        mark_kitchen_modified(request.user.id)
         return Response({"message": "Item deleted"}, status=status.HTTP_200_OK)
 
     def put(self, request, pk):
@@ -270,6 +249,7 @@ class KitchenItemDeleteUpdateView(APIView):
         serializer = KitchenItemSerializer(item, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
+            mark_kitchen_modified(request.user.id)
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -283,6 +263,7 @@ class KitchenItemDeleteUpdateView(APIView):
 
         item.is_published = not item.is_published
         item.save()
+        mark_kitchen_modified(request.user.id)
         print(item.is_published)
         return Response(
             {
@@ -313,6 +294,13 @@ from .utils import verify_signed_token
 
 
 class VerifyOTPAPIView(APIView):
+    throttle_classes = [IPRateThrottle, IdentityRateThrottle]
+    throttle_scope = "verify-otp"
+
+    def get_throttle_identity(self, request):
+        payload = verify_signed_token(request.COOKIES.get("otp_token", ""))
+        return payload["email"] if payload else None
+
     def post(self, request):
         otp = request.data.get("otp")
         otp_token = request.COOKIES.get("otp_token")
@@ -325,39 +313,32 @@ class VerifyOTPAPIView(APIView):
             return Response({"detail": "Invalid or expired token."}, status=400)
 
         email = payload["email"]
-        print("email", email, "otp", otp)
-        # purpose = payload["purpose"]
-
-        try:
-            user = CustomUser.objects.get(email=email)
-        except CustomUser.DoesNotExist:
-            return Response({"detail": "User not found."}, status=404)
-
-        try:
-            user = CustomUser.objects.get(email=email)
-            record = EmailVerificationToken.objects.get(user=user)
-
-            if record.otp != otp:
-                return Response({"error": "Invalid OTP"}, status=400)
-
-            if record.is_expired():
-                return Response({"error": "OTP expired"}, status=400)
-
-            user.is_active = True
-            user.save()
-            record.delete()  # OTP used once
-
-            return Response({"message": "Email verified successfully."})
+        result = get_otp_store().verify(email, otp)
+        if result == NOT_FOUND:
+            return Response({"error": "OTP not found"}, status=404)
+        if result == EXPIRED:
+            return Response({"error": "OTP expired"}, status=400)
+        if result == LOCKED:
+            return Response(
+                {"error": "Too many attempts. Request a new OTP."},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+            )
+        if result != VERIFIED:
+            return Response({"error": "Invalid OTP"}, status=400)
 
-        except CustomUser.DoesNotExist:
+        if not CustomUser.objects.filter(email__lower=email.lower()).update(
+            is_active=True
+        ):
             return Response({"error": "User not found"}, status=404)
-        except EmailVerificationToken.DoesNotExist:
-            return Response({"error": "OTP not found"}, status=404)
+        return Response({"message": "Email verified successfully."})
 
 
 class PlaceOrderAPIView(APIView):
     permission_classes = [IsAuthenticated]
+    throttle_classes = [IPRateThrottle, IdentityRateThrottle]
+    throttle_scope = "place-order"
 
+    @idempotent
     def post(self, request):
         user = request.user
         if user.role != "customer":
@@ -376,104 +357,294 @@ class PlaceOrderAPIView(APIView):
 
         try:
             chef = CustomUser.objects.get(id=kitchen_id, role="chef")
-        except CustomUser.DoesNotExist:
+        except (CustomUser.DoesNotExist, ValueError):
             return Response({"error": "Invalid kitchen/chef ID."}, status=400)
 
-        order = Order.objects.create(customer=user, chef=chef)
+        try:
+            order = place_order(user, chef, items)
+        except OrderError as e:
+            return Response({"error": str(e)}, status=e.status_code)
 
-        for item in items:
-            try:
-                food = KitchenItem.objects.get(
-                    id=item["item_id"], chef=chef, is_published=True
-                )
-                OrderItem.objects.create(
-                    order=order, item=food, quantity=item["quantity"]
-                )
-            except KitchenItem.DoesNotExist:
-                continue  # Skip invalid items
-        print(OrderSerializer(order).data)
         return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
 
 
+class CartCheckoutAPIView(APIView):
+    """Checkout a cart spanning several kitchens: one order per chef."""
+
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [IPRateThrottle, IdentityRateThrottle]
+    throttle_scope = "place-order"
+
+    @idempotent
+    def post(self, request):
+        if request.user.role != "customer":
+            return Response(
+                {"error": "Only customers can place orders."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        try:
+            orders = place_cart_orders(request.user, request.data.get("items"))
+        except OrderError as e:
+            return Response({"error": str(e)}, status=e.status_code)
+
+        return Response(
+            {"orders": OrderSerializer(orders, many=True).data},
+            status=status.HTTP_201_CREATED,
+        )
+
+
 from rest_framework.generics import RetrieveAPIView
 
 
 class KitchenDetailAPIView(RetrieveAPIView):
+    """
+    A kitchen and its published menu. ``?allergen_free=`` and
+    ``?ingredients=`` (comma separated) filter the menu in the database,
+    and ``fields=``, ``include=food_items`` and ``fields[food_items]=``
+    narrow the payload (see users.fieldsets). Only the full, unfiltered
+    payload is cached.
+    """
+
+    keys = ("id", "name", "cuisine_type", "is_open", "food_items")
+
     def get(self, request, id):
         try:
-            chef = CustomUser.objects.get(id=id, role="chef", is_active=True)
-            items = KitchenItem.objects.filter(chef=chef, is_published=True)
-            serialized_items = KitchenItemSerializer(items, many=True).data
-
-            return Response(
-                {
-                    "id": chef.id,
-                    "name": chef.kitchen_name,
-                    "cuisine_type": (
-                        chef.kitchen_type
-                        if hasattr(chef, "kitchen_type")
-                        else "Unknown"
-                    ),
-                    "food_items": serialized_items,
-                }
+            fieldset = Fieldset(
+                request.query_params, self.keys, embeds={"food_items": ITEM_FIELDS}
             )
-        except CustomUser.DoesNotExist:
-            return Response(
-                {"error": "Kitchen not found."}, status=status.HTTP_404_NOT_FOUND
+        except FieldsetError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        allergen_free, ingredients = tag_params(request.query_params)
+        custom = bool(
+            allergen_free or ingredients or fieldset_requested(request.query_params)
+        )
+        entry = version = None
+        if not custom:
+            version = kitchen_cache.kitchen_version(id)
+            entry = kitchen_cache.get_kitchen(id, version)
+        if entry is None:
+            try:
+                chef = (
+                    CustomUser.objects.select_related("capacity")
+                    .only(
+                        "id", "kitchen_name", "kitchen_updated_at", *CAPACITY_COLUMNS
+                    )
+                    .get(id=id, role="chef", is_active=True)
+                )
+            except CustomUser.DoesNotExist:
+                return Response(
+                    {"error": "Kitchen not found."}, status=status.HTTP_404_NOT_FOUND
+                )
+            variant = (
+                "allergen_free={}:ingredients={}:{}".format(
+                    ",".join(allergen_free), ",".join(ingredients), fieldset.variant
+                )
+                if custom
+                else ""
             )
+            etag, last_modified = kitchen_validators(chef, variant)
+        else:
+            etag, last_modified = entry["etag"], entry["last_modified"]
+
+        not_modified = conditional_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        if custom:
+            data = self.serialize_kitchen(chef, fieldset, allergen_free, ingredients)
+            return set_validators(Response(data), etag, last_modified)
+        if entry is None:
+            entry = {
+                "etag": etag,
+                "last_modified": last_modified,
+                "data": self.serialize_kitchen(chef, fieldset),
+            }
+            kitchen_cache.set_kitchen(id, version, entry)
+        return set_validators(Response(entry["data"]), etag, last_modified)
+
+    def serialize_kitchen(self, chef, fieldset, allergen_free=(), ingredients=()):
+        data = {
+            "id": chef.id,
+            "name": chef.kitchen_name,
+            "cuisine_type": (
+                chef.kitchen_type if hasattr(chef, "kitchen_type") else "Unknown"
+            ),
+            "is_open": kitchen_is_open(chef),
+        }
+        if "food_items" in fieldset:
+            items = filter_items(
+                KitchenItem.objects.filter(chef=chef, is_published=True),
+                allergen_free,
+                ingredients,
+            )
+            data["food_items"] = item_rows(items, fieldset.embedded["food_items"])
+        return {key: data[key] for key in fieldset.keys}
+
+
+def order_history_response(view, request, orders):
+    """
+    Filter, order and (when asked for) cursor-paginate an order feed,
+    narrowed by ``fields=``, ``include=items`` and ``fields[items]=``. Each
+    page costs one query for the orders and, when included, one for their
+    lines.
+    """
+    try:
+        orders = filter_order_history(orders, request.query_params)
+    except OrderError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        fieldset = order_fieldset(request.query_params)
+    except FieldsetError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    orders = orders.order_by(*view.pagination_class.ordering).values(
+        *order_columns(fieldset)
+    )
+
+    paginator = view.pagination_class()
+    page = paginator.paginate_queryset(orders, request, view=view)
+    if page is None:
+        return Response(order_rows(orders, fieldset))
+    return paginator.get_paginated_response(order_rows(page, fieldset))
 
 
 class CustomerOrdersAPIView(APIView):
     permission_classes = [IsAuthenticated]
+    pagination_class = OrderCursorPagination
 
     def get(self, request):
         if request.user.role != "customer":
             return Response({"error": "Access denied"}, status=403)
 
-        orders = Order.objects.filter(customer=request.user).prefetch_related(
-            "items__item"
-        )
-        serializer = OrderSerializer(orders, many=True)
-        return Response(serializer.data)
+        orders = Order.objects.filter(customer_id=request.user.id)
+        return order_history_response(self, request, orders)
+
+
+class CustomerDashboardAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        if request.user.role != "customer":
+            return Response({"error": "Access denied"}, status=403)
+
+        try:
+            stats = CustomerStats.objects.get(customer_id=request.user.id)
+        except CustomerStats.DoesNotExist:
+            stats = CustomerStats(customer_id=request.user.id)
+        return Response(serialize_stats(stats))
 
 
 class KitchenListAPIView(APIView):
     # permission_classes = [IsAuthenticated]
 
+    pagination_class = KitchenCursorPagination
+
     def get(self, request):
-        chefs = CustomUser.objects.filter(role="chef")
-        kitchens = []
-
-        for chef in chefs:
-            items = KitchenItem.objects.filter(chef=chef, is_published=True)
-            if items.exists():
-                kitchens.append(
-                    {
-                        "id": chef.id,
-                        "name": chef.kitchen_name,
-                        "description": chef.first_name or "",
-                        "image": """ chef.profile_picture.url if chef.profile_picture else """
-                        "/placeholder-kitchen.jpg",
-                        "rating": 4.5,  # You can add logic to calculate actual rating
-                        "foodCount": items.count(),
-                        "isOpen": True,  # Add logic later if needed
-                        "foodItems": KitchenItemSerializer(items, many=True).data,
-                    }
+        try:
+            fieldset = kitchen_fieldset(
+                request.query_params, summary=query_flag(request, "summary")
+            )
+        except FieldsetError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        allergen_free, ingredients = tag_params(request.query_params)
+        variant = "cursor={}:page_size={}:allergens={}:ingredients={}:{}".format(
+            request.query_params.get("cursor", ""),
+            request.query_params.get("page_size", ""),
+            ",".join(allergen_free),
+            ",".join(ingredients),
+            fieldset.variant,
+        )
+        version = kitchen_cache.catalogue_version()
+        entry = kitchen_cache.get_catalogue(variant, version)
+        if entry is None:
+            etag, last_modified = catalogue_validators(variant)
+        else:
+            etag, last_modified = entry["etag"], entry["last_modified"]
+
+        not_modified = conditional_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        if entry is None:
+            chefs = kitchen_queryset(fieldset, allergen_free, ingredients)
+            paginator = self.pagination_class()
+            page = paginator.paginate_queryset(chefs, request, view=self)
+            if page is None:
+                response = Response(
+                    build_kitchen_catalogue(chefs, fieldset, allergen_free, ingredients)
                 )
-
-        return Response(kitchens)
+            else:
+                response = paginator.get_paginated_response(
+                    build_kitchen_catalogue(page, fieldset, allergen_free, ingredients)
+                )
+            entry = {"etag": etag, "last_modified": last_modified, "data": response.data}
+            kitchen_cache.set_catalogue(variant, version, entry)
+        return set_validators(Response(entry["data"]), etag, last_modified)
 
 
 class ChefOrderListAPIView(APIView):
     permission_classes = [IsAuthenticated]
+    pagination_class = OrderCursorPagination
 
     def get(self, request):
         if request.user.role != "chef":
             return Response({"error": "Unauthorized"}, status=status.HTTP_403_FORBIDDEN)
 
-        orders = Order.objects.filter(chef=request.user).order_by("-created_at")
-        serializer = OrderSerializer(orders, many=True)
-        return Response(serializer.data)
+        orders = Order.objects.filter(chef_id=request.user.id)
+        return order_history_response(self, request, orders)
+
+
+class ChefOrderStatusAPIView(APIView):
+    """Move many of the chef's orders to one status in a single request."""
+
+    permission_classes = [IsAuthenticated, IsChef]
+
+    def post(self, request):
+        try:
+            results = transition_orders(
+                request.user,
+                request.data.get("order_ids") or [],
+                request.data.get("status"),
+            )
+        except OrderError as e:
+            return Response({"error": str(e)}, status=e.status_code)
+        return Response({"status": request.data.get("status"), "results": results})
+
+
+class KitchenCapacityAPIView(APIView):
+    permission_classes = [IsAuthenticated, IsChef]
+
+    def get_object(self, user):
+        try:
+            return KitchenCapacity.objects.get(chef_id=user.id)
+        except KitchenCapacity.DoesNotExist:
+            return None
+
+    def get(self, request):
+        capacity = self.get_object(request.user)
+        if capacity is None:
+            return Response({"is_open": True, "limits": None})
+        return Response(KitchenCapacitySerializer(capacity).data)
+
+    def put(self, request):
+        with transaction.atomic():
+            capacity = self.get_object(request.user)
+            serializer = KitchenCapacitySerializer(
+                capacity, data=request.data, partial=capacity is not None
+            )
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            if capacity is None:
+                open_orders = Order.objects.filter(
+                    chef_id=request.user.id, status__in=OPEN_STATUSES
+                ).count()
+                capacity = serializer.save(
+                    chef_id=request.user.id, open_orders=open_orders
+                )
+            else:
+                capacity = serializer.save()
+        mark_kitchen_modified(request.user.id)
+        return Response(KitchenCapacitySerializer(capacity).data)
 
 
 class ChefOrderViewSet(viewsets.ReadOnlyModelViewSet):
@@ -481,8 +652,8 @@ class ChefOrderViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [IsChef]
 
     def get_queryset(self):
-        return Order.objects.filter(chef=self.request.user).prefetch_related(
-            "items__item"
+        return Order.objects.filter(chef_id=self.request.user.id).prefetch_related(
+            "items"
         )
 
 
@@ -538,4 +709,57 @@ class VerifyOTPAPIView(APIView):
             "refresh": str(refresh),
             "message": f"{purpose.capitalize()} verified successfully."
         }, status=200)
- """
\ No newline at end of file
+ """
+
+class SearchAPIView(APIView):
+    """
+    Full-text search over published menu items and kitchen names with
+    ``origin``, ``allergen_free`` (comma separated) and
+    ``price_min``/``price_max`` filters. Facet counts cover every match.
+    """
+
+    def get(self, request):
+        try:
+            params = SearchParams(request.query_params)
+        except SearchError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        result = search_index.search(params)
+        items = KitchenItem.objects.select_related("chef").in_bulk(result.ids)
+        return Response(
+            {
+                "count": result.count,
+                "results": [
+                    serialize_search_hit(items[item_id])
+                    for item_id in result.ids
+                    if item_id in items
+                ],
+                "facets": result.facets,
+            }
+        )
+
+
+def serialize_search_hit(item):
+    data = KitchenItemSerializer(item).data
+    data["kitchen"] = {"id": item.chef_id, "name": item.chef.kitchen_name}
+    return data
+
+
+class AutocompleteAPIView(APIView):
+    """
+    Typeahead suggestions for the browse search box: kitchens and published
+    dishes whose name, or one of its words, starts with ``q``.
+    """
+
+    max_limit = 20
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get("limit", 10))
+        except ValueError:
+            return Response(
+                {"error": "limit must be a number."}, status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = max(1, min(limit, self.max_limit))
+        query = request.query_params.get("q", "")[:100]
+        return Response({"results": autocomplete_index.suggest(query, limit)})
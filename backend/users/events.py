@@ -0,0 +1,150 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+
+class BaseBroker:
+    """
+    Moves messages between worker processes. ``subscribe`` registers a
+    callback for a channel and returns a function that removes it. Callbacks
+    may be invoked from any thread.
+    """
+
+    def publish(self, channel, message):
+        raise NotImplementedError
+
+    def subscribe(self, channel, callback):
+        raise NotImplementedError
+
+
+class LocalBroker(BaseBroker):
+    """
+    Delivers messages within the current process only. Fine for a single
+    worker and for tests; multi-worker deployments need a broker backed by
+    a shared service such as Redis pub/sub.
+    """
+
+    def __init__(self):
+        self._callbacks = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        with self._lock:
+            callbacks = list(self._callbacks.get(channel, ()))
+        for callback in callbacks:
+            callback(message)
+
+    def subscribe(self, channel, callback):
+        with self._lock:
+            self._callbacks[channel].append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                self._callbacks[channel].remove(callback)
+                if not self._callbacks[channel]:
+                    del self._callbacks[channel]
+
+        return unsubscribe
+
+
+class Subscription:
+    def __init__(self, hub, chef_id, max_pending):
+        self.hub = hub
+        self.chef_id = chef_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=max_pending)
+
+    def deliver(self, message):
+        # Called from whichever thread published the message.
+        self.loop.call_soon_threadsafe(self._put, message)
+
+    def _put(self, message):
+        if self.queue.full():
+            # A stalled client loses its oldest events rather than growing
+            # the queue without bound.
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self):
+        """The next event as its JSON-encoded message."""
+        return await self.queue.get()
+
+    async def __aenter__(self):
+        self.hub._add(self)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.hub._remove(self)
+
+
+class OrderEventHub:
+    """
+    Fans order events out to the chef streams open in this process.
+
+    The hub holds a single broker subscription per chef with at least one
+    open stream, however many dashboards that chef has open.
+    """
+
+    def __init__(self, broker=None):
+        self._broker = broker
+        self._subscriptions = defaultdict(set)
+        self._unsubscribe = {}
+        self._lock = threading.RLock()
+
+    @property
+    def broker(self):
+        if self._broker is None:
+            with self._lock:
+                if self._broker is None:
+                    broker_path = getattr(
+                        settings, "ORDER_EVENTS_BROKER", "users.events.LocalBroker"
+                    )
+                    self._broker = import_string(broker_path)()
+        return self._broker
+
+    @staticmethod
+    def channel(chef_id):
+        return f"orders:chef:{chef_id}"
+
+    def publish(self, chef_id, event):
+        message = json.dumps(event, cls=DjangoJSONEncoder)
+        self.broker.publish(self.channel(chef_id), message)
+
+    def publish_on_commit(self, chef_id, event):
+        transaction.on_commit(lambda: self.publish(chef_id, event))
+
+    def subscribe(self, chef_id, max_pending=100):
+        return Subscription(self, chef_id, max_pending)
+
+    def _fan_out(self, chef_id, message):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(chef_id, ()))
+        for subscription in subscriptions:
+            subscription.deliver(message)
+
+    def _add(self, subscription):
+        chef_id = subscription.chef_id
+        with self._lock:
+            if not self._subscriptions[chef_id]:
+                self._unsubscribe[chef_id] = self.broker.subscribe(
+                    self.channel(chef_id),
+                    lambda message: self._fan_out(chef_id, message),
+                )
+            self._subscriptions[chef_id].add(subscription)
+
+    def _remove(self, subscription):
+        chef_id = subscription.chef_id
+        with self._lock:
+            self._subscriptions[chef_id].discard(subscription)
+            if not self._subscriptions[chef_id]:
+                del self._subscriptions[chef_id]
+                self._unsubscribe.pop(chef_id)()
+
+
+order_events = OrderEventHub()
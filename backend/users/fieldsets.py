@@ -0,0 +1,76 @@
+class FieldsetError(Exception):
+    pass
+
+
+def _pick(params, key, allowed, default):
+    raw = params.get(key)
+    if raw is None:
+        return tuple(default)
+    names = {name.strip() for name in raw.split(",")} - {""}
+    unknown = names.difference(allowed)
+    if unknown:
+        raise FieldsetError(
+            "Unknown {} for {}: {}. Choose from: {}.".format(
+                "value" if key == "include" else "field",
+                key,
+                ", ".join(sorted(unknown)),
+                ", ".join(allowed),
+            )
+        )
+    return tuple(name for name in allowed if name in names)
+
+
+class Fieldset:
+    """
+    The parts of a payload a client asked for:
+
+    - ``fields=a,b`` picks the plain keys (default: ``default_fields``, or all);
+    - ``include=x`` picks the embedded collections (default:
+      ``default_include``, or all);
+    - ``fields[x]=a,b`` picks the fields of embedded collection ``x``.
+
+    ``order`` lists every key in payload order; ``embeds`` maps each
+    embedded key to its allowed fields. Unknown names raise FieldsetError.
+    """
+
+    def __init__(
+        self, params, order, embeds=None, default_fields=None, default_include=None
+    ):
+        embeds = embeds or {}
+        plain = [key for key in order if key not in embeds]
+        fields = _pick(
+            params,
+            "fields",
+            plain,
+            plain if default_fields is None else default_fields,
+        )
+        include = _pick(
+            params,
+            "include",
+            list(embeds),
+            embeds if default_include is None else default_include,
+        )
+        self.keys = tuple(key for key in order if key in fields or key in include)
+        self.embedded = {
+            name: _pick(params, f"fields[{name}]", allowed, allowed)
+            for name, allowed in embeds.items()
+            if name in include
+        }
+        self.variant = "fields={}:include={}:{}".format(
+            ",".join(fields),
+            ",".join(include),
+            ":".join(
+                "{}={}".format(name, ",".join(value))
+                for name, value in self.embedded.items()
+            ),
+        )
+
+    def __contains__(self, key):
+        return key in self.keys
+
+
+def fieldset_requested(params):
+    """Whether the request narrows the payload at all."""
+    return any(
+        key in ("fields", "include") or key.startswith("fields[") for key in params
+    )
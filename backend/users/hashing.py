@@ -0,0 +1,106 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    PBKDF2PasswordHasher,
+    check_password,
+    identify_hasher,
+    make_password,
+)
+
+
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 with the iteration count taken from PASSWORD_HASH_ITERATIONS, so
+    the CPU cost of a login can be tuned per deployment. Passwords stored
+    with another count are rehashed on the user's next successful login.
+    """
+
+    @property
+    def iterations(self):
+        return getattr(
+            settings, "PASSWORD_HASH_ITERATIONS", PBKDF2PasswordHasher.iterations
+        )
+
+
+class PoolSaturated(Exception):
+    """Raised instead of queueing when the hashing pool is full."""
+
+
+class HashingPool:
+    """
+    A bounded thread pool for password hashing.
+
+    PBKDF2 runs in OpenSSL with the GIL released, so threads hash in
+    parallel. At most ``max_pending`` hashes may be running or queued;
+    beyond that ``run`` raises PoolSaturated at once so callers can answer
+    429 instead of piling up requests. Only pure hashing runs here, never
+    database work.
+    """
+
+    def __init__(self, max_workers=None, max_pending=None):
+        self._max_workers = max_workers
+        self._max_pending = max_pending
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def max_workers(self):
+        return self._max_workers or getattr(settings, "PASSWORD_HASH_WORKERS", 4)
+
+    @property
+    def max_pending(self):
+        return self._max_pending or getattr(settings, "PASSWORD_HASH_QUEUE_DEPTH", 32)
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="password-hash"
+                )
+            return self._executor
+
+    def _release(self, future):
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, func, *args):
+        executor = self.executor
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise PoolSaturated
+            self._pending += 1
+        future = executor.submit(func, *args)
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+
+hashing_pool = HashingPool()
+
+
+async def hash_password(password):
+    return await hashing_pool.run(make_password, password)
+
+
+def _verify(password, encoded):
+    if not check_password(password, encoded):
+        return False, None
+    try:
+        outdated = identify_hasher(encoded).must_update(encoded)
+    except ValueError:
+        outdated = False
+    return True, make_password(password) if outdated else None
+
+
+async def verify_password(password, encoded):
+    """
+    Check ``password`` against the stored hash off the event loop.
+
+    Returns ``(matches, new_hash)``; ``new_hash`` is set when the stored
+    hash uses outdated parameters and should be replaced.
+    """
+    return await hashing_pool.run(_verify, password, encoded)
@@ -0,0 +1,93 @@
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+
+
+def get_ttl():
+    return getattr(settings, "IDEMPOTENCY_KEY_TTL", timedelta(hours=24))
+
+
+def request_fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.path}:{body}".encode()).hexdigest()
+
+
+def replay(record, fingerprint):
+    if record.request_fingerprint != fingerprint:
+        return Response(
+            {"error": f"{HEADER} was already used with a different request."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    response = Response(record.response_body, status=record.response_status)
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def idempotent(method):
+    """
+    Make an authenticated APIView handler safe to retry.
+
+    When the request carries an ``Idempotency-Key`` header, a successful
+    response is stored in the same transaction as the handler's writes and
+    replayed for later requests with the same key until it expires. A
+    concurrent duplicate fails on the unique constraint, rolls back its own
+    writes and replays the winner's response instead.
+    """
+
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return method(self, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response(
+                {"error": f"{HEADER} must be at most 255 characters."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        fingerprint = request_fingerprint(request)
+        record = IdempotencyKey.objects.filter(user_id=request.user.id, key=key).first()
+        if record is not None:
+            if record.expires_at > timezone.now():
+                return replay(record, fingerprint)
+            record.delete()
+
+        try:
+            with transaction.atomic():
+                response = method(self, request, *args, **kwargs)
+                if status.is_success(response.status_code):
+                    IdempotencyKey.objects.create(
+                        user_id=request.user.id,
+                        key=key,
+                        request_fingerprint=fingerprint,
+                        response_status=response.status_code,
+                        response_body=response.data,
+                        expires_at=timezone.now() + get_ttl(),
+                    )
+        except IntegrityError:
+            record = IdempotencyKey.objects.filter(
+                user_id=request.user.id, key=key
+            ).first()
+            if record is None:
+                raise
+            return replay(record, fingerprint)
+        return response
+
+    return wrapper
+
+
+def prune_expired_keys():
+    """Delete every expired key in a single statement."""
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from users.models import CustomUser, KitchenItem, Order, OrderItem
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy item names/prices, kitchen names and totals onto orders placed "
+        "before checkout started snapshotting them. Safe to run repeatedly."
+    )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        menu_item = KitchenItem.objects.filter(pk=OuterRef("item_id"))
+        lines = OrderItem.objects.filter(name="", item__isnull=False).update(
+            name=Subquery(menu_item.values("name")[:1]),
+            unit_price=Subquery(menu_item.values("price")[:1]),
+        )
+
+        chef = CustomUser.objects.filter(pk=OuterRef("chef_id"))
+        line_totals = (
+            OrderItem.objects.filter(order=OuterRef("pk"))
+            .values("order")
+            .annotate(sum=Sum(F("unit_price") * F("quantity")))
+            .values("sum")
+        )
+        orders = Order.objects.filter(kitchen_name="", total=0).update(
+            kitchen_name=Coalesce(Subquery(chef.values("kitchen_name")[:1]), Value("")),
+            total=Coalesce(
+                Subquery(line_totals, output_field=DecimalField()),
+                Value(0),
+                output_field=DecimalField(),
+            ),
+        )
+        self.stdout.write(f"Backfilled {lines} order lines and {orders} orders.")
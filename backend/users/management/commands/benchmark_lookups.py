@@ -0,0 +1,167 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from users.models import CustomUser, KitchenItem, Order
+from users.pagination import OrderCursorPagination
+
+# The order feeds' ordering, so the plans show what the views really run.
+FEED_ORDERING = OrderCursorPagination.ordering
+STATUSES = list(Order.TRANSITIONS)
+
+
+class Rollback(Exception):
+    pass
+
+
+def hot_lookups(chef, customer):
+    """The hot queries, with the indexes or constraints each relies on."""
+    return [
+        (
+            "login by email",
+            CustomUser.objects.filter(email__lower=customer.email.lower()),
+            [(CustomUser, "unique_user_email_ci")],
+        ),
+        (
+            "login by kitchen name",
+            CustomUser.objects.filter(
+                kitchen_name__lower=chef.kitchen_name.lower(), role="chef"
+            ),
+            [(CustomUser, "unique_user_kitchen_name_ci")],
+        ),
+        (
+            "published menu",
+            KitchenItem.objects.filter(chef_id=chef.id, is_published=True),
+            [(KitchenItem, "kitchenitem_published_idx")],
+        ),
+        (
+            "customer order history",
+            Order.objects.filter(customer_id=customer.id).order_by(*FEED_ORDERING)[:20],
+            [(Order, "order_customer_created_idx")],
+        ),
+        (
+            "chef order feed",
+            Order.objects.filter(chef_id=chef.id).order_by(*FEED_ORDERING)[:20],
+            [(Order, "order_chef_created_idx")],
+        ),
+        (
+            "chef order feed by status",
+            Order.objects.filter(chef_id=chef.id, status="pending").order_by(
+                *FEED_ORDERING
+            )[:20],
+            [(Order, "order_chef_status_created_idx")],
+        ),
+    ]
+
+
+def drop(schema_editor, model, name):
+    for constraint in model._meta.constraints:
+        if constraint.name == name:
+            return schema_editor.remove_constraint(model, constraint)
+    for index in model._meta.indexes:
+        if index.name == name:
+            return schema_editor.remove_index(model, index)
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway dataset and print the query plans of the hot "
+        "lookups. On Postgres, --compare also shows each plan without its "
+        "index. Everything runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chefs", type=int, default=2000)
+        parser.add_argument("--customers", type=int, default=20000)
+        parser.add_argument("--items-per-chef", type=int, default=10)
+        parser.add_argument("--orders-per-customer", type=int, default=5)
+        parser.add_argument(
+            "--chef-history",
+            type=int,
+            default=20000,
+            help="Extra orders for the benchmarked chef, a busy kitchen with "
+            "a long history for its feeds to page through.",
+        )
+        parser.add_argument("--analyze", action="store_true")
+        parser.add_argument("--compare", action="store_true")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, options):
+        chefs = CustomUser.objects.bulk_create(
+            CustomUser(
+                email=f"Bench.Chef{i}@Example.com",
+                role="chef",
+                kitchen_name=f"Bench Kitchen {i}",
+                first_name="Chef",
+                phone_number="000",
+                country="PK",
+            )
+            for i in range(options["chefs"])
+        )
+        customers = CustomUser.objects.bulk_create(
+            CustomUser(
+                email=f"Bench.Customer{i}@Example.com",
+                role="customer",
+                first_name="Customer",
+                phone_number="000",
+                country="PK",
+            )
+            for i in range(options["customers"])
+        )
+        KitchenItem.objects.bulk_create(
+            KitchenItem(
+                chef=chef, name=f"Dish {n}", price=Decimal("9.50"), is_published=n % 3 > 0
+            )
+            for chef in chefs
+            for n in range(options["items_per_chef"])
+        )
+        Order.objects.bulk_create(
+            Order(
+                customer=customer,
+                chef=chefs[(i + n) % len(chefs)],
+                status=STATUSES[(i + n) % len(STATUSES)],
+            )
+            for i, customer in enumerate(customers)
+            for n in range(options["orders_per_customer"])
+        )
+        chef = chefs[len(chefs) // 2]
+        Order.objects.bulk_create(
+            Order(
+                customer=customers[n % len(customers)],
+                chef=chef,
+                status=STATUSES[n % len(STATUSES)],
+            )
+            for n in range(options["chef_history"])
+        )
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+        return chef, customers[len(customers) // 2]
+
+    def run(self, options):
+        chef, customer = self.seed(options)
+        explain_options = {"analyze": True} if options["analyze"] else {}
+        compare = options["compare"] and connection.vendor == "postgresql"
+        if options["compare"] and not compare:
+            self.stderr.write("--compare is only supported on PostgreSQL.")
+
+        for title, queryset, indexes in hot_lookups(chef, customer):
+            self.stdout.write(self.style.MIGRATE_HEADING(title))
+            self.stdout.write(queryset.explain(**explain_options))
+            if compare:
+                with transaction.atomic():
+                    with connection.schema_editor(atomic=False) as schema_editor:
+                        for model, name in indexes:
+                            drop(schema_editor, model, name)
+                    self.stdout.write(self.style.MIGRATE_LABEL("without index:"))
+                    self.stdout.write(queryset.explain(**explain_options))
+                    transaction.set_rollback(True)
+            self.stdout.write("")
@@ -0,0 +1,138 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from users.models import CustomUser, KitchenItem, Order, OrderItem
+from users.readers import ORDER_FIELDS, item_rows, order_rows
+from users.renderers import FastJSONRenderer
+from users.serializers import KitchenItemSerializer, OrderSerializer
+
+
+class Rollback(Exception):
+    pass
+
+
+def best_of(repeat, func):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway menu and order history and compare the per-object "
+        "cost of the DRF serializers with the values()-based readers and of "
+        "the stock JSON renderer with FastJSONRenderer. Everything runs in a "
+        "transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=10000)
+        parser.add_argument("--orders", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, options):
+        chef = CustomUser.objects.create(
+            email="bench.chef@example.com",
+            role="chef",
+            kitchen_name="Bench Kitchen",
+            first_name="Chef",
+            phone_number="000",
+            country="PK",
+        )
+        customer = CustomUser.objects.create(
+            email="bench.customer@example.com",
+            role="customer",
+            first_name="Customer",
+            phone_number="000",
+            country="PK",
+        )
+        items = KitchenItem.objects.bulk_create(
+            KitchenItem(
+                chef=chef,
+                name=f"Dish {n}",
+                description="A long description of the dish. " * 4,
+                origin="Thai",
+                ingredients=["rice", "tofu", "peanuts"],
+                allergens=["peanuts", "soy"],
+                price=Decimal("9.50"),
+                is_published=True,
+            )
+            for n in range(options["items"])
+        )
+        orders = Order.objects.bulk_create(
+            Order(customer=customer, chef=chef, kitchen_name=chef.kitchen_name)
+            for _ in range(options["orders"])
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(
+                order=order,
+                item=items[n % len(items)] if items else None,
+                name="Dish",
+                unit_price=Decimal("9.50"),
+                quantity=2,
+            )
+            for n, order in enumerate(orders)
+            for _ in range(2)
+        )
+        return chef, customer
+
+    def run(self, options):
+        chef, customer = self.seed(options)
+        repeat = options["repeat"]
+        # Fresh querysets per call, so no run reuses another's result cache.
+        items = KitchenItem.objects.filter(chef=chef)
+        orders = Order.objects.filter(customer=customer).order_by("-created_at")
+
+        cases = [
+            (
+                "items",
+                options["items"],
+                lambda: KitchenItemSerializer(items.all(), many=True).data,
+                lambda: item_rows(items.all()),
+            ),
+            (
+                "orders",
+                options["orders"],
+                lambda: OrderSerializer(
+                    orders.prefetch_related("items"), many=True
+                ).data,
+                lambda: order_rows(orders.values(*ORDER_FIELDS)),
+            ),
+        ]
+        for title, count, serialize, read in cases:
+            count = max(count, 1)
+            slow, slow_data = best_of(repeat, serialize)
+            fast, fast_data = best_of(repeat, read)
+            slow_json, slow_render = best_of(
+                repeat, lambda: JSONRenderer().render(slow_data)
+            )
+            fast_json, fast_render = best_of(
+                repeat, lambda: FastJSONRenderer().render(fast_data)
+            )
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{title} ({count})"))
+            self.stdout.write(
+                f"  serializer {slow / count * 1e6:8.2f} us/object   "
+                f"reader {fast / count * 1e6:8.2f} us/object"
+            )
+            self.stdout.write(
+                f"  JSONRenderer {slow_json / count * 1e6:6.2f} us/object   "
+                f"FastJSONRenderer {fast_json / count * 1e6:6.2f} us/object"
+            )
+            identical = "yes" if slow_render == fast_render else "NO"
+            self.stdout.write(f"  identical output: {identical}")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from users.idempotency import prune_expired_keys
+
+
+class Command(BaseCommand):
+    help = "Delete expired order idempotency keys. Meant to run from cron."
+
+    def handle(self, *args, **options):
+        deleted = prune_expired_keys()
+        self.stdout.write(f"Deleted {deleted} expired idempotency keys.")
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from users.authentication import prune_expired_tokens
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired refresh tokens and their blacklist entries in batches. "
+        "Meant to run from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        deleted = prune_expired_tokens(options["batch_size"])
+        self.stdout.write(f"Deleted {deleted} expired refresh tokens.")
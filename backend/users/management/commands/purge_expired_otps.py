@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from users.otp import get_otp_store
+
+
+class Command(BaseCommand):
+    help = "Delete expired one-time passwords in bulk. Meant to run from cron."
+
+    def handle(self, *args, **options):
+        deleted = get_otp_store().purge_expired()
+        self.stdout.write(f"Deleted {deleted} expired one-time passwords.")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from users.orders import purge_past_slot_usage
+
+
+class Command(BaseCommand):
+    help = "Delete kitchen slot usage from past days. Meant to run from cron."
+
+    def handle(self, *args, **options):
+        deleted = purge_past_slot_usage()
+        self.stdout.write(f"Deleted {deleted} past slot usage rows.")
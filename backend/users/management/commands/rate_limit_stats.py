@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from users.ratelimit import rate_limiter
+
+
+class Command(BaseCommand):
+    help = "Print how many requests each rate limit has rejected so far."
+
+    def handle(self, *args, **options):
+        for name, count in sorted(rate_limiter.rejections.items()):
+            self.stdout.write(f"{name}: {count}")
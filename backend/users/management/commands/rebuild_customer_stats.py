@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from users.models import Order
+from users.stats import rebuild_customer_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute customer dashboard totals from order history."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "customer_ids",
+            nargs="*",
+            type=int,
+            help="Only rebuild these customers (default: everyone with orders).",
+        )
+
+    def handle(self, *args, **options):
+        customer_ids = options["customer_ids"] or list(
+            Order.objects.values_list("customer_id", flat=True).distinct()
+        )
+        for customer_id in customer_ids:
+            with transaction.atomic():
+                rebuild_customer_stats(customer_id)
+        self.stdout.write(f"Rebuilt stats for {len(customer_ids)} customers.")
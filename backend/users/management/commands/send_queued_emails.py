@@ -0,0 +1,44 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.outbox import send_queued_emails
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Send queued outbound emails in batches over one connection. Run it "
+        "from cron, or with --loop as a long-running worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--loop", action="store_true", help="Keep polling for new emails."
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=2.0,
+            help="Seconds to wait between polls when the queue is empty.",
+        )
+
+    def handle(self, *args, **options):
+        if not options["loop"]:
+            sent = send_queued_emails(options["batch_size"])
+            self.stdout.write(f"Sent {sent} queued emails.")
+            return
+        while True:
+            try:
+                sent = send_queued_emails(options["batch_size"])
+            except Exception:
+                # Keep the worker alive; the next poll tries again.
+                logger.exception("Sending queued emails failed")
+                sent = 0
+            if sent:
+                self.stdout.write(f"Sent {sent} queued emails.")
+            if sent < options["batch_size"]:
+                time.sleep(options["interval"])
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from users.models import KitchenItem
+from users.tags import sync_item_tags
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the normalized allergen/ingredient tags of every kitchen "
+        "item from its JSON fields. Safe to run repeatedly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        items = KitchenItem.objects.only("id", "allergens", "ingredients")
+        items = items.order_by("id")
+        synced, last_id = 0, 0
+        while True:
+            batch = list(items.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                sync_item_tags(batch)
+            synced += len(batch)
+            last_id = batch[-1].id
+        self.stdout.write(f"Synced tags for {synced} items.")
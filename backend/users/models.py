@@ -4,16 +4,32 @@ from django.contrib.auth.models import (
     PermissionsMixin,
     BaseUserManager,
 )
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+# Enables ``field__lower=value`` lookups, which match the Lower() indexes
+# below (``__iexact`` compiles to UPPER() on Postgres and can't use them).
+models.CharField.register_lookup(Lower)
 
 
 class CustomUserManager(BaseUserManager):
-    def create_user(self, email, password=None, role="customer", **extra_fields):
+    def create_user(
+        self, email, password=None, role="customer", password_hash=None, **extra_fields
+    ):
+        """
+        ``password_hash`` takes an already hashed password (from
+        make_password) instead of hashing ``password`` here.
+        """
         if not email:
             raise ValueError("Users must have an email address.")
         email = self.normalize_email(email)
         user = self.model(email=email, role=role, **extra_fields)
-        user.set_password(password)
+        if password_hash:
+            user.password = password_hash
+        else:
+            user.set_password(password)
         user.save(using=self._db)
         return user
 
@@ -40,6 +56,8 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     second_name = models.CharField(max_length=100, null=True, blank=True)
     phone_number = models.CharField(max_length=20)
     country = models.CharField(max_length=100)
+    # Bumped whenever the kitchen's public menu or name changes.
+    kitchen_updated_at = models.DateTimeField(null=True, blank=True)
 
     is_active = models.BooleanField(default=False)
     is_staff = models.BooleanField(default=False)
@@ -49,6 +67,15 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["first_name", "phone_number", "country"]
 
+    class Meta:
+        constraints = [
+            # Logins and the kitchen name check look these up case-insensitively.
+            models.UniqueConstraint(Lower("email"), name="unique_user_email_ci"),
+            models.UniqueConstraint(
+                Lower("kitchen_name"), name="unique_user_kitchen_name_ci"
+            ),
+        ]
+
     def __str__(self):
         return self.email
 
@@ -59,10 +86,25 @@ class KitchenItem(models.Model):
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=6, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     allergens = models.JSONField(default=list, blank=True)
     origin = models.CharField(max_length=100, blank=True)
     ingredients = models.JSONField(default=list, blank=True)
     is_published = models.BooleanField(default=False)
+    # Normalized copies of allergens and ingredients, kept in sync by
+    # users.tags so filters on them run in the database.
+    tags = models.ManyToManyField("Tag", related_name="items", blank=True)
+
+    class Meta:
+        indexes = [
+            # Public menus and checkout only ever read published items; the
+            # chef's own dashboard reads all of them through the FK index.
+            models.Index(
+                fields=["chef"],
+                condition=models.Q(is_published=True),
+                name="kitchenitem_published_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.chef.kitchen_name}"
@@ -70,6 +112,26 @@ class KitchenItem(models.Model):
 
 
 
+class Tag(models.Model):
+    """A lower-cased allergen or ingredient name."""
+
+    KIND_CHOICES = (
+        ("allergen", "Allergen"),
+        ("ingredient", "Ingredient"),
+    )
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    name = models.CharField(max_length=100)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "name"], name="unique_tag_per_kind")
+        ]
+
+    def __str__(self):
+        return f"{self.kind}: {self.name}"
+
+
 # class Order(models.Model):
 #     customer = models.ForeignKey(
 #         CustomUser,
@@ -95,6 +157,24 @@ class KitchenItem(models.Model):
 
 
 class Order(models.Model):
+    STATUS_CHOICES = (
+        ("pending", "Pending"),
+        ("accepted", "Accepted"),
+        ("preparing", "Preparing"),
+        ("ready", "Ready"),
+        ("completed", "Completed"),
+        ("cancelled", "Cancelled"),
+    )
+    # Allowed moves from each status; completed and cancelled are final.
+    TRANSITIONS = {
+        "pending": {"accepted", "cancelled"},
+        "accepted": {"preparing", "cancelled"},
+        "preparing": {"ready", "cancelled"},
+        "ready": {"completed", "cancelled"},
+        "completed": set(),
+        "cancelled": set(),
+    }
+
     customer = models.ForeignKey(
         CustomUser,
         on_delete=models.CASCADE,
@@ -108,29 +188,198 @@ class Order(models.Model):
         related_name="orders_received",
     )
     created_at = models.DateTimeField(auto_now_add=True)
-    status = models.CharField(max_length=20, default="pending")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    status_changed_at = models.DateTimeField(null=True, blank=True)
+    # Snapshots taken at checkout so order history never reads the chef or
+    # the menu.
+    kitchen_name = models.CharField(max_length=100, blank=True)
+    total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["customer", "-created_at"], name="order_customer_created_idx"
+            ),
+            models.Index(fields=["chef", "-created_at"], name="order_chef_created_idx"),
+            models.Index(
+                fields=["chef", "status", "-created_at"],
+                name="order_chef_status_created_idx",
+            ),
+        ]
+
+    @property
+    def lines(self):
+        """
+        The order's items: the list left by ``Prefetch("items",
+        to_attr="prefetched_items")`` if there is one, else ``items.all()``.
+        """
+        try:
+            return self.prefetched_items
+        except AttributeError:
+            return self.items.all()
 
     def __str__(self):
-        return f"Order #{self.pk} by {self.customer.email} from {self.chef.kitchen_name}"
+        return f"Order #{self.pk} by {self.customer.email} from {self.kitchen_name}"
 
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="items")
-    item = models.ForeignKey(KitchenItem, on_delete=models.CASCADE)
+    item = models.ForeignKey(
+        KitchenItem, on_delete=models.SET_NULL, null=True, blank=True
+    )
     quantity = models.PositiveIntegerField(default=1)
+    # Snapshots of the menu item at checkout.
+    name = models.CharField(max_length=100, blank=True)
+    unit_price = models.DecimalField(max_digits=6, decimal_places=2, default=0)
 
     def __str__(self):
-        return f"{self.quantity} x {self.item.name}"
+        return f"{self.quantity} x {self.name}"
 
 from django.conf import settings
 
 
 class EmailVerificationToken(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    otp = models.CharField(max_length=6)  
-    created_at = models.DateTimeField(auto_now_add=True)
+    otp = models.CharField(max_length=6)
+    # Wrong guesses against this code; see users.otp.
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
     def is_expired(self):
-        from django.utils import timezone
-        from datetime import timedelta
-        return timezone.now() - self.created_at > timedelta(minutes=10)
\ No newline at end of file
+        from .otp import get_ttl
+
+        return timezone.now() - self.created_at > get_ttl()
+
+class IdempotencyKey(models.Model):
+    """Stored outcome of a request sent with an ``Idempotency-Key`` header."""
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="idempotency_keys",
+    )
+    key = models.CharField(max_length=255)
+    request_fingerprint = models.CharField(max_length=64)
+    response_status = models.PositiveSmallIntegerField()
+    response_body = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "key"], name="unique_idempotency_key_per_user"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.user_id})"
+
+
+class CustomerStats(models.Model):
+    """
+    Running totals behind the customer dashboard, updated as orders are
+    placed and change status so reading them never scans order history.
+    """
+
+    customer = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+    )
+    total_spent = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    order_count = models.PositiveIntegerField(default=0)
+    # {"pending": 2, "completed": 5}
+    status_counts = models.JSONField(default=dict)
+    # {"<chef id>": {"kitchen_name": "...", "spent": "12.50", "orders": 1}}
+    kitchen_spend = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Stats for {self.customer_id}"
+
+
+class KitchenCapacity(models.Model):
+    """
+    Back-pressure settings for a kitchen. Kitchens without a row take
+    unlimited orders. ``open_orders`` is a counter kept in step by checkout
+    and status changes while this row is locked.
+    """
+
+    chef = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="capacity",
+    )
+    is_accepting_orders = models.BooleanField(default=True)
+    max_open_orders = models.PositiveIntegerField(null=True, blank=True)
+    max_items_per_slot = models.PositiveIntegerField(null=True, blank=True)
+    slot_minutes = models.PositiveSmallIntegerField(default=30)
+    open_orders = models.PositiveIntegerField(default=0)
+
+    @property
+    def is_open(self):
+        return self.is_accepting_orders and (
+            self.max_open_orders is None or self.open_orders < self.max_open_orders
+        )
+
+    def __str__(self):
+        return f"Capacity for {self.chef_id}"
+
+
+class KitchenSlotUsage(models.Model):
+    """Items ordered from a kitchen within one time slot."""
+
+    chef = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="slot_usage"
+    )
+    slot_start = models.DateTimeField()
+    items = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["chef", "slot_start"], name="unique_slot_usage_per_chef"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.items} items for {self.chef_id} at {self.slot_start}"
+
+
+class OutboundEmail(models.Model):
+    """
+    An email waiting to be sent by the ``send_queued_emails`` worker, so
+    request handlers never talk to SMTP themselves.
+    """
+
+    STATUS_CHOICES = (
+        ("pending", "Pending"),
+        ("sent", "Sent"),
+        ("failed", "Failed"),
+    )
+
+    to_email = models.EmailField()
+    from_email = models.CharField(max_length=254, blank=True)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["next_attempt_at"],
+                condition=models.Q(status="pending"),
+                name="outbound_email_due_idx",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {self.to_email} ({self.status})"
@@ -0,0 +1,395 @@
+from datetime import datetime, time
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .catalogue import mark_kitchen_modified
+from .events import order_events
+from .models import (
+    KitchenCapacity,
+    KitchenItem,
+    KitchenSlotUsage,
+    Order,
+    OrderItem,
+)
+from .serializers import OrderSerializer
+from .stats import record_orders, record_status_change
+
+
+CLOSED_STATUSES = {status for status, moves in Order.TRANSITIONS.items() if not moves}
+OPEN_STATUSES = set(Order.TRANSITIONS) - CLOSED_STATUSES
+
+
+class OrderError(Exception):
+    status_code = 400
+
+
+class KitchenUnavailable(OrderError):
+    status_code = 409
+
+
+def parse_cart(items):
+    """
+    Normalise cart lines into ``{item_id: quantity}``, merging repeated ids.
+    Raises OrderError for malformed lines.
+    """
+    if not isinstance(items, list) or not items:
+        raise OrderError("Missing order details.")
+
+    cart = {}
+    for line in items:
+        try:
+            item_id = int(line["item_id"])
+            quantity = int(line.get("quantity", 1))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            raise OrderError("Each item needs a numeric item_id and quantity.")
+        if quantity < 1:
+            raise OrderError("Quantity must be at least 1.")
+        cart[item_id] = cart.get(item_id, 0) + quantity
+    return cart
+
+
+def _slot_start(moment, slot_minutes):
+    minutes = moment.hour * 60 + moment.minute
+    minutes -= minutes % slot_minutes
+    return moment.replace(
+        hour=minutes // 60, minute=minutes % 60, second=0, microsecond=0
+    )
+
+
+def reserve_capacity(carts):
+    """
+    Claim an open-order slot and the ordered item count from every kitchen
+    in ``carts`` that has a capacity row, or raise KitchenUnavailable.
+
+    Must run inside the checkout transaction: the capacity rows are locked
+    (in chef id order, so concurrent checkouts can't deadlock) until it
+    commits, which serialises competing checkouts for the same kitchen.
+    """
+    chefs = {chef.id: chef for chef, _ in carts}
+    capacities = list(
+        KitchenCapacity.objects.select_for_update()
+        .filter(chef_id__in=chefs)
+        .order_by("chef_id")
+    )
+    if not capacities:
+        return
+
+    items = {chef.id: sum(cart.values()) for chef, cart in carts}
+    now = timezone.now()
+    slots = {
+        capacity.chef_id: _slot_start(now, capacity.slot_minutes)
+        for capacity in capacities
+        if capacity.max_items_per_slot is not None
+    }
+    used = {}
+    if slots:
+        used = {
+            usage.chef_id: usage.items
+            for usage in KitchenSlotUsage.objects.filter(
+                reduce(or_, (Q(chef_id=c, slot_start=s) for c, s in slots.items()))
+            )
+        }
+
+    for capacity in capacities:
+        name = chefs[capacity.chef_id].kitchen_name
+        if not capacity.is_open:
+            raise KitchenUnavailable(f"{name} is not accepting orders right now.")
+        if capacity.chef_id in slots and (
+            used.get(capacity.chef_id, 0) + items[capacity.chef_id]
+            > capacity.max_items_per_slot
+        ):
+            raise KitchenUnavailable(f"{name} is fully booked for this time slot.")
+        capacity.open_orders += 1
+
+    KitchenCapacity.objects.bulk_update(capacities, ["open_orders"])
+    if slots:
+        KitchenSlotUsage.objects.bulk_create(
+            [
+                KitchenSlotUsage(
+                    chef_id=chef_id,
+                    slot_start=slot_start,
+                    items=used.get(chef_id, 0) + items[chef_id],
+                )
+                for chef_id, slot_start in slots.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["chef", "slot_start"],
+            update_fields=["items"],
+        )
+    for capacity in capacities:
+        if not capacity.is_open:
+            # Just filled up: public listings must stop showing it as open.
+            transaction.on_commit(
+                lambda chef_id=capacity.chef_id: mark_kitchen_modified(chef_id)
+            )
+
+
+def release_capacity(chef_id, count, cancelled=()):
+    """
+    Give back ``count`` open-order slots after orders were closed. The
+    items of ``cancelled`` orders placed in the current time slot are given
+    back to it too; earlier slots are over and only wait to be purged.
+    """
+    capacity = (
+        KitchenCapacity.objects.select_for_update().filter(chef_id=chef_id).first()
+    )
+    if capacity is None:
+        return
+    was_open = capacity.is_open
+    capacity.open_orders = max(capacity.open_orders - count, 0)
+    capacity.save(update_fields=["open_orders"])
+    if capacity.max_items_per_slot is not None and cancelled:
+        slot_start = _slot_start(timezone.now(), capacity.slot_minutes)
+        current = [
+            order.id
+            for order in cancelled
+            if _slot_start(order.created_at, capacity.slot_minutes) == slot_start
+        ]
+        items = 0
+        if current:
+            items = OrderItem.objects.filter(order_id__in=current).aggregate(
+                items=Sum("quantity")
+            )["items"]
+        if items:
+            KitchenSlotUsage.objects.filter(
+                chef_id=chef_id, slot_start=slot_start
+            ).update(items=Greatest(F("items") - items, 0))
+    if capacity.is_open and not was_open:
+        transaction.on_commit(lambda: mark_kitchen_modified(chef_id))
+
+
+def purge_past_slot_usage():
+    """
+    Delete slot usage from before today. Slots never span midnight, so
+    those are all over. Returns the number of rows deleted.
+    """
+    today = _slot_start(timezone.now(), 24 * 60)
+    deleted, _ = KitchenSlotUsage.objects.filter(slot_start__lt=today).delete()
+    return deleted
+
+
+def _create_orders(customer, carts):
+    """
+    Create one order per ``(chef, {food: quantity})`` pair in ``carts`` with
+    two bulk inserts inside one transaction.
+    """
+    with transaction.atomic():
+        reserve_capacity(carts)
+        orders = Order.objects.bulk_create(
+            Order(
+                customer_id=customer.id,
+                chef=chef,
+                kitchen_name=chef.kitchen_name or "",
+                total=sum(food.price * quantity for food, quantity in cart.items()),
+            )
+            for chef, cart in carts
+        )
+        order_items = OrderItem.objects.bulk_create(
+            OrderItem(
+                order=order,
+                item=food,
+                quantity=quantity,
+                name=food.name,
+                unit_price=food.price,
+            )
+            for order, (_, cart) in zip(orders, carts)
+            for food, quantity in cart.items()
+        )
+        record_orders(customer.id, orders)
+
+    lines = {}
+    for order_item in order_items:
+        lines.setdefault(order_item.order_id, []).append(order_item)
+    for order in orders:
+        # What Prefetch("items", to_attr="prefetched_items") would leave, so
+        # serializers read the lines we just created instead of querying.
+        order.prefetched_items = lines.get(order.id, [])
+        order_events.publish_on_commit(
+            order.chef_id,
+            {"type": "order.created", "order": OrderSerializer(order).data},
+        )
+    return orders
+
+
+def place_order(customer, chef, items):
+    """
+    Create an order for ``chef`` from raw cart lines in a single transaction.
+
+    All item ids are validated with one query and the lines are written with
+    one bulk insert. The returned order has its lines attached, so it can be
+    serialized without further queries.
+    """
+    cart = parse_cart(items)
+    foods = KitchenItem.objects.filter(chef=chef, is_published=True).in_bulk(list(cart))
+    missing = sorted(set(cart) - set(foods))
+    if missing:
+        raise OrderError(f"Invalid items for this kitchen: {missing}")
+
+    carts = [(chef, {foods[item_id]: quantity for item_id, quantity in cart.items()})]
+    return _create_orders(customer, carts)[0]
+
+
+def place_cart_orders(customer, items):
+    """
+    Split a cart spanning several kitchens into one order per chef.
+
+    Costs one query to validate the items (and load their chefs) plus the
+    inserts of ``_create_orders``, however many kitchens are involved.
+    """
+    cart = parse_cart(items)
+    foods = (
+        KitchenItem.objects.filter(is_published=True, chef__role="chef")
+        .select_related("chef")
+        .in_bulk(list(cart))
+    )
+    missing = sorted(set(cart) - set(foods))
+    if missing:
+        raise OrderError(f"Invalid items: {missing}")
+
+    carts = {}
+    for item_id, quantity in cart.items():
+        food = foods[item_id]
+        carts.setdefault(food.chef_id, (food.chef, {}))[1][food] = quantity
+    return _create_orders(customer, list(carts.values()))
+
+
+def _parse_moment(value, end_of_day=False):
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise OrderError(f"Invalid date: {value}")
+        moment = datetime.combine(day, time.max if end_of_day else time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def filter_order_history(orders, params):
+    """
+    Apply the ``status`` (comma separated), ``created_after`` and
+    ``created_before`` query parameters to an order queryset.
+    """
+    statuses = [s for s in params.get("status", "").split(",") if s]
+    if statuses:
+        orders = orders.filter(status__in=statuses)
+    try:
+        if params.get("created_after"):
+            orders = orders.filter(
+                created_at__gte=_parse_moment(params["created_after"])
+            )
+        if params.get("created_before"):
+            orders = orders.filter(
+                created_at__lte=_parse_moment(params["created_before"], end_of_day=True)
+            )
+    except ValueError:
+        raise OrderError("Invalid date range.")
+    return orders
+
+
+MAX_TRANSITION_BATCH = 200
+
+
+def transition_orders(chef, order_ids, new_status):
+    """
+    Move many of ``chef``'s orders to ``new_status`` at once.
+
+    Current statuses are read with one query and every allowed move is then
+    applied with a single conditional UPDATE that only matches rows still in
+    the status we read (optimistic concurrency). Returns one result per
+    requested id: ``updated``, ``not_found``, ``invalid_transition`` or
+    ``conflict`` when another request changed the order in between.
+    """
+    if new_status not in Order.TRANSITIONS:
+        raise OrderError(f"Unknown status: {new_status}")
+    if not isinstance(order_ids, (list, tuple)):
+        raise OrderError("order_ids must be a list of ids.")
+    try:
+        order_ids = list(dict.fromkeys(int(order_id) for order_id in order_ids))
+    except (TypeError, ValueError):
+        raise OrderError("order_ids must be a list of ids.")
+    if not order_ids:
+        raise OrderError("order_ids must not be empty.")
+    if len(order_ids) > MAX_TRANSITION_BATCH:
+        raise OrderError(f"At most {MAX_TRANSITION_BATCH} orders per request.")
+
+    orders = (
+        Order.objects.filter(chef_id=chef.id)
+        .only(
+            "id",
+            "status",
+            "customer_id",
+            "chef_id",
+            "kitchen_name",
+            "total",
+            "created_at",
+        )
+        .in_bulk(order_ids)
+    )
+    results = {}
+    movable = {}
+    for order_id in order_ids:
+        order = orders.get(order_id)
+        if order is None:
+            results[order_id] = {"id": order_id, "result": "not_found"}
+        elif new_status not in Order.TRANSITIONS[order.status]:
+            results[order_id] = {
+                "id": order_id,
+                "result": "invalid_transition",
+                "status": order.status,
+            }
+        else:
+            movable.setdefault(order.status, []).append(order_id)
+
+    if movable:
+        candidates = [order_id for ids in movable.values() for order_id in ids]
+        changed_at = timezone.now()
+        still_in_status = reduce(
+            or_, (Q(id__in=ids, status=status) for status, ids in movable.items())
+        )
+        with transaction.atomic():
+            count = (
+                Order.objects.filter(chef_id=chef.id)
+                .filter(still_in_status)
+                .update(status=new_status, status_changed_at=changed_at)
+            )
+            if count == len(candidates):
+                updated = set(candidates)
+            else:
+                # Someone else moved some of them first; find the rows this
+                # UPDATE actually changed.
+                updated = set(
+                    Order.objects.filter(
+                        id__in=candidates, status_changed_at=changed_at
+                    ).values_list("id", flat=True)
+                )
+
+            record_status_change([orders[order_id] for order_id in updated], new_status)
+            if new_status in CLOSED_STATUSES and updated:
+                cancelled = ()
+                if new_status == "cancelled":
+                    cancelled = [orders[order_id] for order_id in updated]
+                release_capacity(chef.id, len(updated), cancelled)
+            for order_id in updated:
+                order_events.publish_on_commit(
+                    chef.id,
+                    {"type": "order.status", "order_id": order_id, "status": new_status},
+                )
+
+        for order_id in candidates:
+            if order_id in updated:
+                results[order_id] = {
+                    "id": order_id,
+                    "result": "updated",
+                    "status": new_status,
+                }
+            else:
+                results[order_id] = {"id": order_id, "result": "conflict"}
+
+    return [results[order_id] for order_id in order_ids]
@@ -0,0 +1,144 @@
+import hmac
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import EmailVerificationToken
+
+VERIFIED = "verified"
+INVALID = "invalid"
+EXPIRED = "expired"
+NOT_FOUND = "not_found"
+LOCKED = "locked"
+
+
+def get_ttl():
+    return getattr(settings, "OTP_TTL", timedelta(minutes=10))
+
+
+def get_max_attempts():
+    return getattr(settings, "OTP_MAX_ATTEMPTS", 5)
+
+
+def generate_otp():
+    return str(random.SystemRandom().randint(100000, 999999))
+
+
+class BaseOTPStore:
+    """
+    Issues and checks one-time passwords, keyed by the user's email.
+
+    ``verify`` returns VERIFIED, INVALID, EXPIRED, NOT_FOUND or LOCKED. A
+    code is consumed once verified; after OTP_MAX_ATTEMPTS wrong guesses it
+    is LOCKED until a new one is issued.
+    """
+
+    def issue(self, user):
+        raise NotImplementedError
+
+    def verify(self, email, otp):
+        raise NotImplementedError
+
+    def purge_expired(self):
+        """Delete expired codes in bulk and return how many were removed."""
+        return 0
+
+
+class DatabaseOTPStore(BaseOTPStore):
+    """
+    Codes live in EmailVerificationToken, one row per user. Issuing is a
+    single upsert; verifying reads the row and atomically claims an
+    attempt before the code is compared.
+    """
+
+    def issue(self, user):
+        otp = generate_otp()
+        EmailVerificationToken.objects.bulk_create(
+            [EmailVerificationToken(user=user, otp=otp, attempts=0)],
+            update_conflicts=True,
+            unique_fields=["user"],
+            update_fields=["otp", "attempts", "created_at"],
+        )
+        return otp
+
+    def verify(self, email, otp):
+        record = (
+            EmailVerificationToken.objects.filter(user__email__lower=email.lower())
+            .only("id", "otp", "attempts", "created_at")
+            .first()
+        )
+        if record is None:
+            return NOT_FOUND
+        if record.is_expired():
+            record.delete()
+            return EXPIRED
+        # Claim an attempt before comparing, in one conditional UPDATE, so
+        # parallel guesses can't all slip in under the limit.
+        claimed = EmailVerificationToken.objects.filter(
+            id=record.id, attempts__lt=get_max_attempts()
+        ).update(attempts=F("attempts") + 1)
+        if not claimed:
+            return LOCKED
+        if not hmac.compare_digest(record.otp, str(otp)):
+            return INVALID
+        record.delete()
+        return VERIFIED
+
+    def purge_expired(self):
+        deleted, _ = EmailVerificationToken.objects.filter(
+            created_at__lt=timezone.now() - get_ttl()
+        ).delete()
+        return deleted
+
+
+class CacheOTPStore(BaseOTPStore):
+    """
+    Codes live in a Django cache with a native TTL, so nothing ever needs
+    purging. The attempt counter uses the cache's atomic ``incr``.
+    """
+
+    def __init__(self, alias="default"):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @staticmethod
+    def key(email):
+        return f"otp:{email.lower()}"
+
+    def issue(self, user):
+        otp = generate_otp()
+        ttl = get_ttl().total_seconds()
+        key = self.key(user.email)
+        self.cache.set_many({key: otp, f"{key}:attempts": 0}, ttl)
+        return otp
+
+    def verify(self, email, otp):
+        key = self.key(email)
+        stored = self.cache.get(key)
+        if stored is None:
+            # Expired codes simply vanish from the cache.
+            return NOT_FOUND
+        try:
+            attempts = self.cache.incr(f"{key}:attempts")
+        except ValueError:
+            attempts = get_max_attempts() + 1
+        if attempts > get_max_attempts():
+            return LOCKED
+        if not hmac.compare_digest(stored, str(otp)):
+            return INVALID
+        self.cache.delete_many([key, f"{key}:attempts"])
+        return VERIFIED
+
+
+def get_otp_store():
+    config = getattr(settings, "OTP_STORE", {})
+    store_class = import_string(config.get("BACKEND", "users.otp.DatabaseOTPStore"))
+    return store_class(**config.get("OPTIONS", {}))
@@ -0,0 +1,96 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+
+def enqueue_email(to_email, subject, body, from_email=None):
+    """Queue an email for the ``send_queued_emails`` worker. One INSERT."""
+    return OutboundEmail.objects.create(
+        to_email=to_email,
+        subject=subject,
+        body=body,
+        from_email=from_email or "",
+    )
+
+
+def get_max_attempts():
+    return getattr(settings, "OUTBOX_MAX_ATTEMPTS", 5)
+
+
+def retry_delay(attempts):
+    """Exponential backoff: base, 2x base, 4x base... capped at one hour."""
+    base = getattr(settings, "OUTBOX_RETRY_BACKOFF", timedelta(seconds=30))
+    return min(base * 2 ** (attempts - 1), timedelta(hours=1))
+
+
+def _record_failure(email, error, now, max_attempts):
+    email.last_error = f"{type(error).__name__}: {error}"
+    if email.attempts >= max_attempts:
+        email.status = "failed"
+    else:
+        email.next_attempt_at = now + retry_delay(email.attempts)
+
+
+def send_queued_emails(batch_size=100):
+    """
+    Send up to ``batch_size`` due emails over a single backend connection.
+
+    The batch is claimed with SELECT ... FOR UPDATE SKIP LOCKED, so several
+    workers can run side by side without sending anything twice. A failed
+    message is retried after an exponential backoff until it has used
+    OUTBOX_MAX_ATTEMPTS attempts, then marked ``failed``; when the
+    connection itself can't be opened, that counts as a failed attempt for
+    the whole batch. Returns the number of emails sent.
+    """
+    now = timezone.now()
+    max_attempts = get_max_attempts()
+    with transaction.atomic():
+        emails = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status="pending", next_attempt_at__lte=now)
+            .order_by("next_attempt_at")[:batch_size]
+        )
+        if not emails:
+            return 0
+
+        sent = 0
+        connection = get_connection()
+        try:
+            connection.open()
+        except Exception as e:
+            for email in emails:
+                email.attempts += 1
+                _record_failure(email, e, now, max_attempts)
+        else:
+            try:
+                for email in emails:
+                    message = EmailMessage(
+                        subject=email.subject,
+                        body=email.body,
+                        from_email=email.from_email or None,
+                        to=[email.to_email],
+                        connection=connection,
+                    )
+                    email.attempts += 1
+                    try:
+                        message.send()
+                    except Exception as e:
+                        _record_failure(email, e, now, max_attempts)
+                    else:
+                        email.status = "sent"
+                        email.sent_at = timezone.now()
+                        email.last_error = ""
+                        sent += 1
+            finally:
+                connection.close()
+
+        OutboundEmail.objects.bulk_update(
+            emails,
+            ["status", "attempts", "next_attempt_at", "last_error", "sent_at"],
+        )
+    return sent
@@ -0,0 +1,33 @@
+from rest_framework.pagination import CursorPagination
+
+
+class OptionalCursorPagination(CursorPagination):
+    """
+    Cursor pagination that only kicks in when the client asks for it with
+    ``?page_size=`` or ``?cursor=``, so existing clients keep getting a plain
+    list.
+    """
+
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+    def is_requested(self, request):
+        return (
+            self.cursor_query_param in request.query_params
+            or self.page_size_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request):
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+class KitchenCursorPagination(OptionalCursorPagination):
+    ordering = "id"
+
+
+class OrderCursorPagination(OptionalCursorPagination):
+    # The id breaks ties between orders created in the same instant.
+    ordering = ("-created_at", "-id")
@@ -0,0 +1,255 @@
+import logging
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from django.utils.module_loading import import_string
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+
+def parse_rate(rate):
+    """``"10/min"`` -> ``(10, 60)``: bucket capacity and refill period in seconds."""
+    num, period = rate.split("/")
+    duration = {"s": 1, "m": 60, "h": 3600, "d": 86400}[period[0]]
+    return int(num), duration
+
+
+class MemoryBucketBackend:
+    """
+    Token buckets in this process, split across ``shards`` dicts with their
+    own locks so concurrent requests rarely contend. Each shard keeps at
+    most ``max_keys`` buckets and forgets the least recently used ones.
+    Limits are per process, so only exact for a single worker. ``clock``
+    supplies the current time when ``consume`` isn't given one.
+    """
+
+    def __init__(self, shards=16, max_keys=10000, clock=time.monotonic):
+        self._shards = [(threading.Lock(), OrderedDict()) for _ in range(shards)]
+        self.max_keys = max_keys
+        self.clock = clock
+
+    def consume(self, key, capacity, period, now=None):
+        now = self.clock() if now is None else now
+        lock, buckets = self._shards[zlib.crc32(key.encode()) % len(self._shards)]
+        with lock:
+            tokens, updated = buckets.pop(key, (capacity, now))
+            tokens, allowed, wait = _take(tokens, updated, now, capacity, period)
+            buckets[key] = (tokens, now)
+            if len(buckets) > self.max_keys:
+                buckets.popitem(last=False)
+        return allowed, wait
+
+    def clear(self):
+        for lock, buckets in self._shards:
+            with lock:
+                buckets.clear()
+
+
+class CacheBucketBackend:
+    """
+    Token buckets in a Django cache shared by every node. The read-modify-
+    write is not atomic, so a burst racing on one key may let a few extra
+    requests through; it never blocks legitimate ones.
+    """
+
+    def __init__(self, alias="default", clock=time.time):
+        self.alias = alias
+        self.clock = clock
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def consume(self, key, capacity, period, now=None):
+        now = self.clock() if now is None else now
+        cache_key = f"ratelimit:{key}"
+        tokens, updated = self.cache.get(cache_key) or (capacity, now)
+        tokens, allowed, wait = _take(tokens, updated, now, capacity, period)
+        self.cache.set(cache_key, (tokens, now), period)
+        return allowed, wait
+
+    def clear(self):
+        self.cache.clear()
+
+
+def _take(tokens, updated, now, capacity, period):
+    """Refill a bucket for the time elapsed and try to take one token."""
+    refill_rate = capacity / period
+    tokens = min(capacity, tokens + (now - updated) * refill_rate)
+    if tokens >= 1:
+        return tokens - 1, True, 0
+    return tokens, False, (1 - tokens) / refill_rate
+
+
+class RateLimiter:
+    """
+    Checks requests against the ``"<scope>.<kind>"`` rates in
+    ``DEFAULT_THROTTLE_RATES`` (e.g. ``"login.ip": "20/min"``).
+
+    Rejections are counted per scope and kind in the RATE_LIMIT_STATS_CACHE
+    cache, which totals them across workers when it is shared (see
+    ``rejections`` and the ``rate_limit_stats`` command). Each scope and kind logs at most one
+    warning per RATE_LIMIT_LOG_INTERVAL seconds, saying how many hits it
+    left out, so an attack doesn't flood the logs.
+    """
+
+    stats_prefix = "ratelimit:rejections:"
+
+    def __init__(self):
+        self._backend = None
+        self._lock = threading.Lock()
+        self._last_logged = {}
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    config = getattr(settings, "RATE_LIMIT_BACKEND", {})
+                    backend_class = import_string(
+                        config.get("BACKEND", "users.ratelimit.MemoryBucketBackend")
+                    )
+                    self._backend = backend_class(**config.get("OPTIONS", {}))
+        return self._backend
+
+    @property
+    def stats_cache(self):
+        return caches[getattr(settings, "RATE_LIMIT_STATS_CACHE", "default")]
+
+    @property
+    def rejections(self):
+        """Rejections so far per ``"<scope>.<kind>"``."""
+        names = list(api_settings.DEFAULT_THROTTLE_RATES)
+        counts = self.stats_cache.get_many(
+            [self.stats_prefix + name for name in names]
+        )
+        return Counter(
+            {name: counts.get(self.stats_prefix + name, 0) for name in names}
+        )
+
+    def reset(self):
+        """Empty the buckets and counters, and rebuild the backend from settings."""
+        with self._lock:
+            if self._backend is not None:
+                self._backend.clear()
+            self._backend = None
+            self._last_logged.clear()
+        self.stats_cache.delete_many(
+            [self.stats_prefix + name for name in api_settings.DEFAULT_THROTTLE_RATES]
+        )
+
+    def _count_rejection(self, name):
+        key = self.stats_prefix + name
+        try:
+            self.stats_cache.incr(key)
+        except ValueError:
+            if not self.stats_cache.add(key, 1, None):
+                self.stats_cache.incr(key)
+
+        interval = getattr(settings, "RATE_LIMIT_LOG_INTERVAL", 60)
+        now = time.monotonic()
+        with self._lock:
+            logged_at, skipped = self._last_logged.get(name, (None, 0))
+            if logged_at is not None and now - logged_at < interval:
+                self._last_logged[name] = (logged_at, skipped + 1)
+                return
+            self._last_logged[name] = (now, 0)
+        logger.warning(
+            "Rate limit hit for %s (%d more in the previous %ss not logged)",
+            name,
+            skipped,
+            interval,
+        )
+
+    def check(self, scope, kind, key):
+        """Take a token for ``key``; returns seconds to wait, or None if allowed."""
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(f"{scope}.{kind}")
+        if rate is None or key is None:
+            return None
+        capacity, period = parse_rate(rate)
+        allowed, wait = self.backend.consume(
+            f"{scope}:{kind}:{key}", capacity, period
+        )
+        if allowed:
+            return None
+        self._count_rejection(f"{scope}.{kind}")
+        return wait
+
+
+rate_limiter = RateLimiter()
+
+
+def get_ip(request):
+    # DRF's client address logic, honoring NUM_PROXIES.
+    return BaseThrottle().get_ident(request)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    DRF throttle backed by ``rate_limiter``. Views set ``throttle_scope``;
+    subclasses choose what the bucket is keyed on.
+    """
+
+    kind = None
+
+    def get_key(self, request, view):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        scope = getattr(view, "throttle_scope", None)
+        if scope is None:
+            return True
+        self._wait = rate_limiter.check(scope, self.kind, self.get_key(request, view))
+        return self._wait is None
+
+    def wait(self):
+        return self._wait
+
+
+class IPRateThrottle(TokenBucketThrottle):
+    kind = "ip"
+
+    def get_key(self, request, view):
+        return get_ip(request)
+
+
+class IdentityRateThrottle(TokenBucketThrottle):
+    """
+    Keyed on the account a request acts for: the logged-in user, or the
+    identity returned by the view's ``get_throttle_identity(request)``.
+    """
+
+    kind = "identity"
+
+    def get_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return f"user:{request.user.id}"
+        get_identity = getattr(view, "get_throttle_identity", None)
+        identity = get_identity(request) if get_identity else None
+        return str(identity).strip().lower() if identity else None
+
+
+def check_rate_limits(request, scope, identity=None):
+    """
+    The IP and identity checks for plain Django views. Returns a 429
+    response when either bucket is empty, else None.
+    """
+    for kind, key in (
+        ("ip", get_ip(request)),
+        ("identity", str(identity).strip().lower() if identity else None),
+    ):
+        wait = rate_limiter.check(scope, kind, key)
+        if wait is not None:
+            response = JsonResponse(
+                {"detail": "Too many requests. Please try again later."}, status=429
+            )
+            response["Retry-After"] = str(max(1, round(wait)))
+            return response
+    return None
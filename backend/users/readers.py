@@ -0,0 +1,160 @@
+import json
+from collections import defaultdict
+
+from django.db.models import JSONField, TextField
+from django.db.models.functions import Cast
+
+from .fieldsets import Fieldset
+from .models import KitchenItem, OrderItem
+from .serializers import KitchenItemSerializer, OrderItemSerializer, OrderSerializer
+
+# values()-based read paths for the list endpoints. Each returns exactly
+# what the matching serializer's ``.data`` would, without building model
+# instances or running every field through DRF. Decimals and datetimes
+# still go through the serializers' own field objects, so the rendered JSON
+# is byte-identical.
+
+ITEM_FIELDS = tuple(KitchenItemSerializer.Meta.fields)
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+
+_item_price = KitchenItemSerializer().fields["price"].to_representation
+_line_price = OrderItemSerializer().fields["price"].to_representation
+_order_total = OrderSerializer().fields["total"].to_representation
+_order_created_at = OrderSerializer().fields["created_at"].to_representation
+
+
+def _item_columns(fields):
+    """
+    The values_list() columns and per-column converters for ``fields``.
+    JSON columns are read as text and decoded here, which is much cheaper
+    than the ORM's per-value decoding when orjson is available.
+    """
+    columns, converters = [], []
+    for name in fields:
+        if isinstance(KitchenItem._meta.get_field(name), JSONField):
+            columns.append(Cast(name, TextField()))
+            converters.append((name, _json_value))
+        else:
+            columns.append(name)
+            if name == "price":
+                converters.append((name, _item_price))
+    return columns, converters
+
+
+def _json_value(text):
+    return None if text is None else json_loads(text)
+
+
+def _item_row_iter(items, fields):
+    columns, converters = _item_columns(fields)
+    for values in items.values_list(*columns):
+        row = dict(zip(fields, values))
+        for name, convert in converters:
+            row[name] = convert(row[name])
+        yield row
+
+
+def item_rows(items, fields=ITEM_FIELDS):
+    """
+    ``KitchenItemSerializer(items, many=True).data`` for a queryset,
+    reading only the columns behind ``fields``.
+    """
+    return list(_item_row_iter(items, fields))
+
+
+def item_rows_by_chef(items, fields=ITEM_FIELDS):
+    """Serialized items of a queryset, grouped by ``chef_id``."""
+    grouped = defaultdict(list)
+    for row in _item_row_iter(items, (*fields, "chef_id")):
+        grouped[row.pop("chef_id")].append(row)
+    return grouped
+
+
+def item_fieldset(params=None):
+    return Fieldset(params or {}, ITEM_FIELDS)
+
+
+ORDER_KEYS = ("id", "customer", "chef", "items", "total", "created_at", "status")
+ORDER_LINE_FIELDS = ("id", "name", "price", "quantity")
+
+# Output key -> (columns read, value built from the row).
+ORDER_VALUES = {
+    "id": (("id",), lambda order: order["id"]),
+    "customer": (("customer_id",), lambda order: order["customer_id"]),
+    "chef": (
+        ("chef_id", "kitchen_name"),
+        lambda order: {
+            "id": order["chef_id"],
+            "kitchen_name": order["kitchen_name"],
+        },
+    ),
+    "total": (("total",), lambda order: _order_total(order["total"])),
+    "created_at": (
+        ("created_at",),
+        lambda order: _order_created_at(order["created_at"]),
+    ),
+    "status": (("status",), lambda order: order["status"]),
+}
+LINE_COLUMNS = {
+    "id": "id",
+    "name": "name",
+    "price": "unit_price",
+    "quantity": "quantity",
+}
+
+
+def order_fieldset(params=None):
+    return Fieldset(params or {}, ORDER_KEYS, embeds={"items": ORDER_LINE_FIELDS})
+
+
+def order_columns(fieldset=None):
+    """
+    The ``values()`` columns ``order_rows`` needs for ``fieldset``. The id
+    and creation time are always read: lines and cursors depend on them.
+    """
+    fieldset = fieldset or order_fieldset()
+    columns = {"id", "created_at"}
+    for key in fieldset.keys:
+        columns.update(ORDER_VALUES.get(key, ((),))[0])
+    return tuple(sorted(columns))
+
+
+ORDER_FIELDS = order_columns()
+
+
+def order_rows(orders, fieldset=None):
+    """
+    ``OrderSerializer(orders, many=True).data``, narrowed to ``fieldset``,
+    for dicts from ``orders.values(*order_columns(fieldset))``. When lines
+    are included they are read in one more query.
+    """
+    fieldset = fieldset or order_fieldset()
+    orders = list(orders)
+    lines = defaultdict(list)
+    if "items" in fieldset:
+        line_fields = fieldset.embedded["items"]
+        columns = [LINE_COLUMNS[name] for name in line_fields]
+        for order_id, *values in (
+            OrderItem.objects.filter(order_id__in=[order["id"] for order in orders])
+            .order_by("id")
+            .values_list("order_id", *columns)
+        ):
+            line = dict(zip(line_fields, values))
+            if "price" in line:
+                line["price"] = _line_price(line["price"])
+            lines[order_id].append(line)
+    values = [
+        (key, None if key == "items" else ORDER_VALUES[key][1])
+        for key in fieldset.keys
+    ]
+    return [
+        {
+            key: lines[order["id"]] if build is None else build(order)
+            for key, build in values
+        }
+        for order in orders
+    ]
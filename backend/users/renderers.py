@@ -0,0 +1,76 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    # Datetimes and dataclasses go through DRF's encoder like they would
+    # with the stock renderer, so the output is the same.
+    ORJSON_OPTIONS = (
+        orjson.OPT_NON_STR_KEYS
+        | orjson.OPT_PASSTHROUGH_DATETIME
+        | orjson.OPT_PASSTHROUGH_DATACLASS
+    )
+
+# Leaf types that never need a closer look in ``_has_unsafe_float``.
+SCALAR_TYPES = frozenset((str, int, bool, type(None)))
+
+
+def _has_unsafe_float(data):
+    """
+    Whether ``data`` holds a float orjson writes differently from ``json``:
+    NaN and infinities (``null`` instead of the stock renderer's error under
+    STRICT_JSON) and floats ``repr`` puts in exponent form (``1e16`` and
+    ``0.000025`` instead of ``1e+16`` and ``2.5e-05``). Only values are
+    checked; float dict keys aren't worth walking every key for.
+    """
+    stack = [[data]]
+    while stack:
+        container = stack.pop()
+        if isinstance(container, dict):
+            container = container.values()
+        for value in container:
+            cls = type(value)
+            if cls in SCALAR_TYPES:
+                continue
+            if cls is float:
+                if value and not 1e-4 <= abs(value) < 1e16:
+                    return True
+            elif isinstance(value, (dict, list, tuple)):
+                stack.append(value)
+    return False
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson when it is installed, producing
+    the same bytes as the stock compact, unicode output. Indented output
+    (e.g. ``Accept: application/json; indent=4``), non-default JSON settings,
+    output with floats orjson formats differently and anything orjson can't
+    encode fall back to the stock renderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or data is None
+            or not self.compact
+            or self.ensure_ascii
+            or self.get_indent(accepted_media_type, renderer_context or {})
+            or _has_unsafe_float(data)
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data, default=self.encoder_class().default, option=ORJSON_OPTIONS
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Like the stock renderer, escape the line separators JavaScript
+        # treats as newlines.
+        if b"\xe2\x80" in ret:
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028")
+            ret = ret.replace(b"\xe2\x80\xa9", b"\\u2029")
+        return ret
@@ -0,0 +1,445 @@
+import heapq
+import re
+import threading
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection, connections
+from django.db.models import Count, Q, TextField
+from django.db.models.functions import Cast
+from django.utils.module_loading import import_string
+
+from .models import CustomUser, KitchenItem, Tag
+from .tags import filter_items
+
+CONFIG = "english"
+ITEM_VECTOR = SearchVector(
+    "name",
+    "description",
+    "origin",
+    Cast("ingredients", TextField()),
+    Cast("allergens", TextField()),
+    config=CONFIG,
+)
+KITCHEN_VECTOR = SearchVector("kitchen_name", config=CONFIG)
+
+# Created by create_search_indexes() after migrate, and only on Postgres:
+# the other databases can't build them.
+SEARCH_INDEXES = [
+    (KitchenItem, GinIndex(ITEM_VECTOR, name="kitchenitem_search_idx")),
+    (CustomUser, GinIndex(KITCHEN_VECTOR, name="user_kitchen_search_idx")),
+]
+
+
+class SearchError(Exception):
+    pass
+
+
+class SearchParams:
+    """Validated search query parameters."""
+
+    def __init__(self, params):
+        self.query = params.get("q", "").strip()
+        self.origin = params.get("origin", "").strip().lower() or None
+        self.allergen_free = {
+            a.strip().lower() for a in params.get("allergen_free", "").split(",")
+        } - {""}
+        try:
+            self.price_min = self._price(params.get("price_min"))
+            self.price_max = self._price(params.get("price_max"))
+            self.limit = min(int(params.get("limit", 20)), 100)
+            self.offset = int(params.get("offset", 0))
+        except (InvalidOperation, ValueError):
+            raise SearchError("Invalid price, limit or offset.")
+        if self.limit < 1 or self.offset < 0:
+            raise SearchError("Invalid limit or offset.")
+
+    @staticmethod
+    def _price(value):
+        return Decimal(value) if value not in (None, "") else None
+
+
+def price_buckets():
+    return getattr(settings, "SEARCH_PRICE_BUCKETS", [5, 10, 20])
+
+
+def price_bucket(price, bounds):
+    index = bisect_right(bounds, price)
+    if index == 0:
+        return f"0-{bounds[0]}"
+    if index == len(bounds):
+        return f"{bounds[-1]}+"
+    return f"{bounds[index - 1]}-{bounds[index]}"
+
+
+def price_ranges(bounds):
+    """``(label, low, high)`` for each price_bucket; None is an open end."""
+    edges = [None, *bounds, None]
+    ranges = []
+    for low, high in zip(edges, edges[1:]):
+        if low is None:
+            label = f"0-{high}"
+        elif high is None:
+            label = f"{low}+"
+        else:
+            label = f"{low}-{high}"
+        ranges.append((label, low, high))
+    return ranges
+
+
+class SearchResult:
+    def __init__(self, ids, count, facets):
+        self.ids = ids
+        self.count = count
+        self.facets = facets
+
+
+class PostgresSearchBackend:
+    """Full-text search with the GIN indexes in SEARCH_INDEXES."""
+
+    def matches(self, params):
+        items = KitchenItem.objects.filter(is_published=True, chef__role="chef")
+        if params.query:
+            query = SearchQuery(params.query, search_type="websearch", config=CONFIG)
+            kitchens = (
+                CustomUser.objects.annotate(document=KITCHEN_VECTOR)
+                .filter(document=query)
+                .values("id")
+            )
+            items = (
+                items.annotate(
+                    document=ITEM_VECTOR, rank=SearchRank(ITEM_VECTOR, query)
+                )
+                .filter(Q(document=query) | Q(chef_id__in=kitchens))
+                .order_by("-rank", "id")
+            )
+        else:
+            items = items.order_by("id")
+        if params.origin:
+            items = items.filter(origin__iexact=params.origin)
+        if params.allergen_free:
+            items = filter_items(items, allergen_free=params.allergen_free)
+        if params.price_min is not None:
+            items = items.filter(price__gte=params.price_min)
+        if params.price_max is not None:
+            items = items.filter(price__lte=params.price_max)
+        return items
+
+    def search(self, params):
+        items = self.matches(params)
+        ids = list(
+            items.values_list("id", flat=True)[
+                params.offset : params.offset + params.limit
+            ]
+        )
+        return SearchResult(ids, items.count(), self.facets(items))
+
+    def facets(self, items):
+        base = items.order_by()
+        origins = Counter(
+            {
+                row["origin"]: row["n"]
+                for row in base.exclude(origin="")
+                .values("origin")
+                .annotate(n=Count("id"))
+            }
+        )
+        ranges = price_ranges(price_buckets())
+        counts = base.aggregate(
+            **{
+                f"bucket_{i}": Count(
+                    "id",
+                    filter=Q(
+                        *([Q(price__gte=low)] if low is not None else []),
+                        *([Q(price__lt=high)] if high is not None else []),
+                    ),
+                )
+                for i, (_, low, high) in enumerate(ranges)
+            }
+        )
+        prices = Counter(
+            {
+                label: counts[f"bucket_{i}"]
+                for i, (label, _, _) in enumerate(ranges)
+                if counts[f"bucket_{i}"]
+            }
+        )
+
+        allergens = Counter(
+            dict(
+                Tag.objects.filter(kind="allergen", items__in=base.values("id"))
+                .annotate(n=Count("items"))
+                .values_list("name", "n")
+            )
+        )
+        return build_facets(origins, allergens, prices)
+
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(*texts):
+    tokens = []
+    for text in texts:
+        if isinstance(text, (list, tuple)):
+            tokens.extend(tokenize(*text))
+        elif text:
+            tokens.extend(TOKEN_RE.findall(str(text).lower()))
+    return tokens
+
+
+class IndexedItem:
+    __slots__ = ("chef_id", "origin", "allergens", "price", "price_bucket", "terms")
+
+    def __init__(self, chef_id, origin, allergens, price, price_bucket, terms):
+        self.chef_id = chef_id
+        self.origin = origin
+        self.allergens = allergens
+        self.price = price
+        self.price_bucket = price_bucket
+        self.terms = terms
+
+
+class InMemorySearchBackend:
+    """
+    A pure-Python inverted index over published items, for SQLite and
+    development. Built on first use and refreshed per kitchen after
+    ``invalidate_kitchen``; every term of the query must match an item's
+    fields or its kitchen name. Lives in the process that builds it.
+
+    Terms, origins, allergens and price buckets all have posting sets, so
+    matching, filtering and facet counts are set operations. Items with
+    more query terms in their name rank first.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._built = False
+            self._dirty = set()
+            self._items = {}
+            self._postings = defaultdict(set)
+            self._name_postings = defaultdict(set)
+            self._origins = defaultdict(set)
+            self._allergens = defaultdict(set)
+            self._prices = defaultdict(set)
+            self._kitchen_items = defaultdict(set)
+            self._kitchen_postings = defaultdict(set)
+            self._kitchen_terms = {}
+            self._bounds = price_buckets()
+
+    def invalidate_kitchen(self, chef_id):
+        with self._lock:
+            self._dirty.add(chef_id)
+
+    def _load(self, chef_ids=None):
+        items = KitchenItem.objects.filter(is_published=True, chef__role="chef")
+        chefs = CustomUser.objects.filter(role="chef")
+        if chef_ids is not None:
+            items = items.filter(chef_id__in=chef_ids)
+            chefs = chefs.filter(id__in=chef_ids)
+        for chef_id, kitchen_name in chefs.values_list("id", "kitchen_name"):
+            terms = set(tokenize(kitchen_name))
+            self._kitchen_terms[chef_id] = terms
+            for term in terms:
+                self._kitchen_postings[term].add(chef_id)
+        for item in items.values(
+            "id",
+            "chef_id",
+            "name",
+            "description",
+            "origin",
+            "ingredients",
+            "allergens",
+            "price",
+        ):
+            self._add(item)
+
+    def _add(self, item):
+        item_id = item["id"]
+        name_terms = set(tokenize(item["name"]))
+        terms = name_terms.union(
+            tokenize(
+                item["description"],
+                item["origin"],
+                item["ingredients"],
+                item["allergens"],
+            )
+        )
+        origin = (item["origin"] or "").strip()
+        allergens = frozenset(str(a).strip().lower() for a in item["allergens"] or [])
+        bucket = price_bucket(item["price"], self._bounds)
+        self._items[item_id] = IndexedItem(
+            item["chef_id"], origin, allergens, item["price"], bucket, terms
+        )
+        self._kitchen_items[item["chef_id"]].add(item_id)
+        for term in terms:
+            self._postings[term].add(item_id)
+        for term in name_terms:
+            self._name_postings[term].add(item_id)
+        self._origins[origin].add(item_id)
+        for allergen in allergens:
+            self._allergens[allergen].add(item_id)
+        self._prices[bucket].add(item_id)
+
+    def _drop_kitchen(self, chef_id):
+        for item_id in self._kitchen_items.pop(chef_id, ()):
+            item = self._items.pop(item_id)
+            for term in item.terms:
+                self._postings[term].discard(item_id)
+                self._name_postings[term].discard(item_id)
+            self._origins[item.origin].discard(item_id)
+            for allergen in item.allergens:
+                self._allergens[allergen].discard(item_id)
+            self._prices[item.price_bucket].discard(item_id)
+        for term in self._kitchen_terms.pop(chef_id, ()):
+            self._kitchen_postings[term].discard(chef_id)
+
+    def _refresh(self):
+        if not self._built:
+            self._load()
+            self._built = True
+            self._dirty.clear()
+        elif self._dirty:
+            dirty, self._dirty = self._dirty, set()
+            for chef_id in dirty:
+                self._drop_kitchen(chef_id)
+            self._load(dirty)
+
+    def _term_matches(self, term):
+        matches = self._postings.get(term, set())
+        chef_ids = self._kitchen_postings.get(term)
+        if chef_ids:
+            matches = matches.union(
+                *(self._kitchen_items.get(chef_id, ()) for chef_id in chef_ids)
+            )
+        return matches
+
+    @staticmethod
+    def _counts(postings, matched):
+        counts = {}
+        for value, ids in postings.items():
+            count = len(matched & ids) if ids else 0
+            if count:
+                counts[value] = count
+        return Counter(counts)
+
+    def search(self, params):
+        with self._lock:
+            self._refresh()
+            terms = tokenize(params.query)
+            if terms:
+                postings = sorted((self._term_matches(t) for t in terms), key=len)
+                matched = postings[0].intersection(*postings[1:])
+            else:
+                matched = set(self._items)
+            if params.origin:
+                matched &= set().union(
+                    *(
+                        ids
+                        for origin, ids in self._origins.items()
+                        if origin.lower() == params.origin
+                    )
+                )
+            for allergen in params.allergen_free:
+                matched -= self._allergens.get(allergen, set())
+            if params.price_min is not None or params.price_max is not None:
+                low, high = params.price_min, params.price_max
+                items = self._items
+                matched = {
+                    item_id
+                    for item_id in matched
+                    if (low is None or items[item_id].price >= low)
+                    and (high is None or items[item_id].price <= high)
+                }
+
+            origins = self._counts(self._origins, matched)
+            origins.pop("", None)
+            allergens = self._counts(self._allergens, matched)
+            prices = self._counts(self._prices, matched)
+
+            end = params.offset + params.limit
+            name_hits = Counter()
+            for term in set(terms):
+                name_hits.update(matched & self._name_postings.get(term, set()))
+            page = heapq.nsmallest(
+                end, name_hits.items(), key=lambda hit: (-hit[1], hit[0])
+            )
+            page = [item_id for item_id, _ in page]
+            if len(page) < end:
+                page += heapq.nsmallest(end - len(page), matched.difference(name_hits))
+
+        return SearchResult(
+            page[params.offset :], len(matched), build_facets(origins, allergens, prices)
+        )
+
+
+def build_facets(origins, allergens, prices):
+    return {
+        "origin": dict(origins.most_common()),
+        "allergens": dict(allergens.most_common()),
+        "price": dict(prices),
+    }
+
+
+class SearchIndex:
+    """
+    Picks the backend: SEARCH_BACKEND if set, otherwise Postgres full-text
+    search on Postgres and the in-memory index elsewhere.
+    """
+
+    def __init__(self):
+        self._backend = None
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    path = getattr(settings, "SEARCH_BACKEND", None)
+                    if path:
+                        self._backend = import_string(path)()
+                    elif connection.vendor == "postgresql":
+                        self._backend = PostgresSearchBackend()
+                    else:
+                        self._backend = InMemorySearchBackend()
+        return self._backend
+
+    def search(self, params):
+        return self.backend.search(params)
+
+    def invalidate_kitchen(self, chef_id):
+        invalidate = getattr(self.backend, "invalidate_kitchen", None)
+        if invalidate:
+            invalidate(chef_id)
+
+    def reset(self):
+        with self._lock:
+            self._backend = None
+
+
+search_index = SearchIndex()
+
+
+def create_search_indexes(using="default", **kwargs):
+    """post_migrate handler creating the GIN indexes on Postgres."""
+    conn = connections[using]
+    if conn.vendor != "postgresql":
+        return
+    with conn.cursor() as cursor:
+        existing = {
+            table: conn.introspection.get_constraints(cursor, table)
+            for table in {model._meta.db_table for model, _ in SEARCH_INDEXES}
+        }
+    with conn.schema_editor() as schema_editor:
+        for model, index in SEARCH_INDEXES:
+            if index.name not in existing[model._meta.db_table]:
+                schema_editor.add_index(model, index)
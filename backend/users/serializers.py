@@ -1,11 +1,18 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
 from .models import CustomUser, KitchenItem
+from .tags import sync_item_tags
 from .utils import handle_otp_for_user
 import uuid
 
 
 class LoginSerializer(serializers.Serializer):
+    """
+    Resolves the user for an email or kitchen name and checks the password.
+    Pass ``context={"check_password": False}`` to only resolve the user and
+    verify the password separately (see users.hashing).
+    """
+
     identifier = serializers.CharField()
     password = serializers.CharField(write_only=True)
 
@@ -15,18 +22,19 @@ class LoginSerializer(serializers.Serializer):
 
         try:
             if "@" in identifier:
-                user = CustomUser.objects.get(email__iexact=identifier)
+                user = CustomUser.objects.get(email__lower=identifier)
             else:
                 user = CustomUser.objects.get(
-                    kitchen_name__iexact=identifier, role="chef"
+                    kitchen_name__lower=identifier, role="chef"
                 )
         except CustomUser.DoesNotExist:
             raise serializers.ValidationError("Invalid credentials.")
-        print(user.email, password)
         # user = authenticate(
         #     request=self.context.get("request"), username=user.email, password=password
         # )
-        if (user.check_password(password)):
+        if not self.context.get("check_password", True) or user.check_password(
+            password
+        ):
             data["user"] = user
             return data
         # print(user)
@@ -44,7 +52,7 @@ class BaseUserSerializer(serializers.ModelSerializer):
     def validate_email(self, email):
         user = self.context.get("request").user if self.context.get("request") else None
         if (
-            CustomUser.objects.filter(email__iexact=email)
+            CustomUser.objects.filter(email__lower=email.lower())
             .exclude(id=getattr(user, "id", None))
             .exists()
         ):
@@ -71,6 +79,14 @@ class ChefUserSerializer(BaseUserSerializer):
         fields = BaseUserSerializer.Meta.fields + ["kitchen_name"]
         extra_kwargs = {"password": {"write_only": True}}
 
+    def validate_kitchen_name(self, kitchen_name):
+        if (
+            kitchen_name
+            and CustomUser.objects.filter(kitchen_name__lower=kitchen_name.lower()).exists()
+        ):
+            raise serializers.ValidationError("Kitchen name already taken.")
+        return kitchen_name
+
     def create(self, validated_data):
         """ validated_data["kitchen_name"] = (
             f"kitchen_{uuid.uuid4().hex[:8]}"
@@ -78,7 +94,9 @@ class ChefUserSerializer(BaseUserSerializer):
             else validated_data["kitchen_name"]
         ) """
         validated_data["role"] = "chef"
-        user = CustomUser.objects.create_user(**validated_data)
+        user = CustomUser.objects.create_user(
+            **validated_data, password_hash=self.context.get("password_hash")
+        )
 
         return user
 
@@ -90,9 +108,10 @@ class CustomerUserSerializer(BaseUserSerializer):
         extra_kwargs = {"password": {"write_only": True}}
 
     def create(self, validated_data):
-        print(validated_data)
         validated_data["role"] = "customer"
-        user = CustomUser.objects.create_user(**validated_data)
+        user = CustomUser.objects.create_user(
+            **validated_data, password_hash=self.context.get("password_hash")
+        )
         return user
 
 
@@ -110,14 +129,25 @@ class KitchenItemSerializer(serializers.ModelSerializer):
             "is_published",
         ]
 
+    def create(self, validated_data):
+        item = super().create(validated_data)
+        sync_item_tags([item])
+        return item
+
+    def update(self, instance, validated_data):
+        item = super().update(instance, validated_data)
+        if "allergens" in validated_data or "ingredients" in validated_data:
+            sync_item_tags([item])
+        return item
+
 
 from .models import Order, OrderItem
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
-    name = serializers.CharField(source="item.name", read_only=True)
+    name = serializers.CharField(read_only=True)
     price = serializers.DecimalField(
-        source="item.price", max_digits=10, decimal_places=2, read_only=True
+        source="unit_price", max_digits=10, decimal_places=2, read_only=True
     )
 
     class Meta:
@@ -126,16 +156,16 @@ class OrderItemSerializer(serializers.ModelSerializer):
 
 
 class OrderSerializer(serializers.ModelSerializer):
-    items = OrderItemSerializer(many=True)
+    items = OrderItemSerializer(many=True, source="lines")
     chef = serializers.SerializerMethodField()
 
     class Meta:
         model = Order
-        fields = ["id", "customer", "chef", "items", "created_at", "status"]
-        read_only_fields = ["customer", "chef", "created_at", "status"]
+        fields = ["id", "customer", "chef", "items", "total", "created_at", "status"]
+        read_only_fields = ["customer", "chef", "total", "created_at", "status"]
 
     def create(self, validated_data):
-        items_data = validated_data.pop("items")
+        items_data = validated_data.pop("lines")
         order = Order.objects.create(**validated_data)
 
         for item_data in items_data:
@@ -145,6 +175,30 @@ class OrderSerializer(serializers.ModelSerializer):
 
     def get_chef(self, obj):
         return {
-            "id": obj.chef.id,
-            "kitchen_name": obj.chef.kitchen_name,
+            "id": obj.chef_id,
+            "kitchen_name": obj.kitchen_name,
         }
+
+
+from .models import KitchenCapacity
+
+
+class KitchenCapacitySerializer(serializers.ModelSerializer):
+    is_open = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = KitchenCapacity
+        fields = [
+            "is_accepting_orders",
+            "max_open_orders",
+            "max_items_per_slot",
+            "slot_minutes",
+            "open_orders",
+            "is_open",
+        ]
+        read_only_fields = ["open_orders"]
+
+    def validate_slot_minutes(self, value):
+        if not 1 <= value <= 24 * 60:
+            raise serializers.ValidationError("Slot length must be 1 to 1440 minutes.")
+        return value
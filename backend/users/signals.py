@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .autocomplete import autocomplete_index
+from .models import CustomUser, KitchenItem
+from .search import search_index
+
+
+# Views already report their writes through mark_kitchen_modified; these
+# catch writes made elsewhere, e.g. in the admin.
+@receiver([post_save, post_delete], sender=KitchenItem)
+def kitchen_item_changed(sender, instance, **kwargs):
+    search_index.invalidate_kitchen(instance.chef_id)
+    autocomplete_index.invalidate_kitchen(instance.chef_id)
+
+
+@receiver(post_save, sender=CustomUser)
+def kitchen_changed(sender, instance, **kwargs):
+    if instance.role == "chef":
+        search_index.invalidate_kitchen(instance.id)
+        autocomplete_index.invalidate_kitchen(instance.id)
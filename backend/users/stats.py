@@ -0,0 +1,111 @@
+from decimal import Decimal
+
+from django.utils import timezone
+
+from .models import CustomerStats, Order
+
+# Orders in these states don't count towards what a customer has spent.
+UNPAID_STATUSES = {"cancelled"}
+
+
+def _add_order(stats, order, sign=1):
+    amount = order.total * sign
+    stats.total_spent += amount
+    kitchen = stats.kitchen_spend.setdefault(
+        str(order.chef_id),
+        {"kitchen_name": order.kitchen_name, "spent": "0.00", "orders": 0},
+    )
+    kitchen["spent"] = str(Decimal(kitchen["spent"]) + amount)
+    kitchen["orders"] += sign
+
+
+def _count_status(stats, status, delta):
+    stats.status_counts[status] = stats.status_counts.get(status, 0) + delta
+    if not stats.status_counts[status]:
+        del stats.status_counts[status]
+
+
+def record_orders(customer_id, orders):
+    """
+    Fold newly placed orders into the customer's totals. Call inside the
+    transaction that creates them; the stats row is locked until it commits.
+    """
+    stats, _ = CustomerStats.objects.select_for_update().get_or_create(
+        customer_id=customer_id
+    )
+    for order in orders:
+        stats.order_count += 1
+        _count_status(stats, order.status, 1)
+        if order.status not in UNPAID_STATUSES:
+            _add_order(stats, order)
+    stats.save()
+
+
+def record_status_change(orders, new_status):
+    """
+    Move ``orders`` (still carrying their previous ``status``) to
+    ``new_status`` in their customers' totals. Costs one locking SELECT and
+    one bulk UPDATE however many customers are involved.
+    """
+    orders = [order for order in orders if order.status != new_status]
+    if not orders:
+        return
+
+    stats_by_customer = CustomerStats.objects.select_for_update().in_bulk(
+        {order.customer_id for order in orders}
+    )
+    for order in orders:
+        stats = stats_by_customer.get(order.customer_id)
+        if stats is None:
+            # Not built yet; rebuild_customer_stats will pick it up.
+            continue
+        _count_status(stats, order.status, -1)
+        _count_status(stats, new_status, 1)
+        was_paid = order.status not in UNPAID_STATUSES
+        is_paid = new_status not in UNPAID_STATUSES
+        if was_paid != is_paid:
+            _add_order(stats, order, sign=1 if is_paid else -1)
+
+    # bulk_update() skips auto_now, so stamp the rows ourselves.
+    now = timezone.now()
+    for stats in stats_by_customer.values():
+        stats.updated_at = now
+    CustomerStats.objects.bulk_update(
+        stats_by_customer.values(),
+        ["total_spent", "status_counts", "kitchen_spend", "updated_at"],
+    )
+
+
+def rebuild_customer_stats(customer_id):
+    """Recompute a customer's totals from their full order history."""
+    stats = CustomerStats(customer_id=customer_id)
+    for order in Order.objects.filter(customer_id=customer_id).only(
+        "chef_id", "kitchen_name", "status", "total"
+    ):
+        stats.order_count += 1
+        _count_status(stats, order.status, 1)
+        if order.status not in UNPAID_STATUSES:
+            _add_order(stats, order)
+    stats.save()
+    return stats
+
+
+def serialize_stats(stats):
+    return {
+        "total_spent": f"{stats.total_spent:.2f}",
+        "order_count": stats.order_count,
+        "status_counts": stats.status_counts,
+        "kitchens": [
+            {
+                "id": int(chef_id),
+                "kitchen_name": kitchen["kitchen_name"],
+                "spent": f"{Decimal(kitchen['spent']):.2f}",
+                "orders": kitchen["orders"],
+            }
+            for chef_id, kitchen in sorted(
+                stats.kitchen_spend.items(),
+                key=lambda entry: Decimal(entry[1]["spent"]),
+                reverse=True,
+            )
+        ],
+    }
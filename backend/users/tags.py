@@ -0,0 +1,95 @@
+from functools import reduce
+from operator import or_
+
+from django.db.models import Exists, OuterRef, Q
+
+from .models import KitchenItem, Tag
+
+# Item field holding the raw values for each tag kind.
+TAG_FIELDS = {"allergen": "allergens", "ingredient": "ingredients"}
+
+
+def normalize_tags(values):
+    """Lower-cased, stripped, de-duplicated names from a free-form list."""
+    if not isinstance(values, (list, tuple)):
+        return set()
+    return {str(value).strip().lower()[:100] for value in values} - {""}
+
+
+def item_tag_keys(item):
+    return {
+        (kind, name)
+        for kind, field in TAG_FIELDS.items()
+        for name in normalize_tags(getattr(item, field))
+    }
+
+
+def sync_item_tags(items):
+    """
+    Point each item's ``tags`` at its current allergens and ingredients.
+
+    Takes a constant number of queries however many items are passed:
+    missing tags are inserted in bulk, then the through rows of the items
+    are replaced in bulk.
+    """
+    items = list(items)
+    if not items:
+        return
+    wanted = {item.id: item_tag_keys(item) for item in items}
+    keys = set().union(*wanted.values())
+
+    tag_ids = {}
+    if keys:
+        Tag.objects.bulk_create(
+            [Tag(kind=kind, name=name) for kind, name in keys], ignore_conflicts=True
+        )
+        lookup = reduce(
+            or_,
+            (
+                Q(kind=kind, name__in=[name for k, name in keys if k == kind])
+                for kind in {kind for kind, _ in keys}
+            ),
+        )
+        tag_ids = {
+            (kind, name): tag_id
+            for tag_id, kind, name in Tag.objects.filter(lookup).values_list(
+                "id", "kind", "name"
+            )
+        }
+
+    through = KitchenItem.tags.through
+    through.objects.filter(kitchenitem_id__in=wanted).delete()
+    through.objects.bulk_create(
+        through(kitchenitem_id=item_id, tag_id=tag_ids[key])
+        for item_id, item_keys in wanted.items()
+        for key in item_keys
+    )
+
+
+def _has_tag(kind, names):
+    return Exists(
+        KitchenItem.tags.through.objects.filter(
+            kitchenitem_id=OuterRef("pk"), tag__kind=kind, tag__name__in=names
+        )
+    )
+
+
+def filter_items(items, allergen_free=(), ingredients=()):
+    """
+    Drop items tagged with any of ``allergen_free`` and keep those with
+    every one of ``ingredients``, all in SQL.
+    """
+    allergen_free = normalize_tags(list(allergen_free))
+    if allergen_free:
+        items = items.exclude(_has_tag("allergen", allergen_free))
+    for ingredient in sorted(normalize_tags(list(ingredients))):
+        items = items.filter(_has_tag("ingredient", [ingredient]))
+    return items
+
+
+def tag_params(params):
+    """``allergen_free`` and ``ingredients`` (comma separated) from a request."""
+    return (
+        sorted(normalize_tags(params.get("allergen_free", "").split(","))),
+        sorted(normalize_tags(params.get("ingredients", "").split(","))),
+    )
@@ -1,3 +1,1878 @@
-from django.test import TestCase
+import asyncio
+import json
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.hashers import make_password
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Prefetch
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .authentication import UserRefreshToken
+from .autocomplete import PrefixIndex, autocomplete_index
+from .cache import LRUCacheBackend, kitchen_cache
+from .catalogue import build_kitchen_catalogue, mark_kitchen_modified
+from .drf_views import KitchenDetailAPIView
+from .events import LocalBroker, OrderEventHub, order_events
+from .models import (
+    CustomerStats,
+    CustomUser,
+    EmailVerificationToken,
+    IdempotencyKey,
+    KitchenItem,
+    KitchenSlotUsage,
+    Order,
+    OutboundEmail,
+    OrderItem,
+    Tag,
+)
+from .orders import place_order, transition_orders
+from .otp import CacheOTPStore, DatabaseOTPStore
+from .outbox import enqueue_email, send_queued_emails
+from .readers import ORDER_FIELDS, item_rows, order_rows
+from .renderers import FastJSONRenderer
+from .ratelimit import CacheBucketBackend, MemoryBucketBackend, rate_limiter
+from .search import PostgresSearchBackend, search_index
+from .serializers import (
+    ChefUserSerializer,
+    KitchenItemSerializer,
+    LoginSerializer,
+    OrderSerializer,
+)
+from .stats import record_status_change, serialize_stats
+from .tags import filter_items, sync_item_tags
+from .utils import create_signed_token
+
+
+def make_kitchens(count, items_per_kitchen=2):
+    chefs = CustomUser.objects.bulk_create(
+        CustomUser(
+            email=f"chef{i}@example.com",
+            role="chef",
+            kitchen_name=f"Kitchen {i}",
+            first_name=f"Chef {i}",
+            phone_number="000",
+            country="PK",
+            is_active=True,
+        )
+        for i in range(count)
+    )
+    KitchenItem.objects.bulk_create(
+        KitchenItem(
+            chef=chef,
+            name=f"Dish {n}",
+            price=Decimal("9.50"),
+            is_published=n > 0 or items_per_kitchen == 1,
+        )
+        for chef in chefs
+        for n in range(items_per_kitchen)
+    )
+    return chefs
+
+
+def login(client, user):
+    client.cookies["access"] = str(UserRefreshToken.for_user(user).access_token)
+
+
+class KitchenCatalogueTests(TestCase):
+    def setUp(self):
+        kitchen_cache.reset()
+
+    def test_payload_shape(self):
+        chef = make_kitchens(1)[0]
+        CustomUser.objects.create_user(
+            email="empty@example.com",
+            password="pw",
+            role="chef",
+            kitchen_name="Empty",
+            first_name="Empty",
+            phone_number="000",
+            country="PK",
+        )
+
+        kitchens = build_kitchen_catalogue()
+
+        self.assertEqual(len(kitchens), 1)
+        kitchen = kitchens[0]
+        self.assertEqual(kitchen["id"], chef.id)
+        self.assertEqual(kitchen["name"], "Kitchen 0")
+        self.assertEqual(kitchen["description"], "Chef 0")
+        self.assertEqual(kitchen["foodCount"], 1)
+        self.assertEqual(
+            [item["name"] for item in kitchen["foodItems"]], ["Dish 1"]
+        )
+
+    def test_query_count_is_constant(self):
+        for count in (10, 1000, 10000):
+            with self.subTest(count=count):
+                CustomUser.objects.all().delete()
+                make_kitchens(count)
+                with self.assertNumQueries(2):
+                    kitchens = build_kitchen_catalogue()
+                self.assertEqual(len(kitchens), count)
+
+    def test_endpoint(self):
+        make_kitchens(3)
+        # Two aggregates for the validators, then the catalogue itself.
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("get-all-kitchens"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 3)
+
+    def test_summary_mode(self):
+        make_kitchens(2)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("get-all-kitchens"), {"summary": "1"})
+        self.assertEqual(
+            set(response.json()[0]), {"id", "name", "description", "foodCount"}
+        )
+
+    def test_cursor_pagination(self):
+        chefs = make_kitchens(5)
+        url = reverse("get-all-kitchens")
+
+        seen = []
+        params = {"page_size": 2}
+        while url:
+            with self.assertNumQueries(4):
+                data = self.client.get(url, params).json()
+            seen += [kitchen["id"] for kitchen in data["results"]]
+            url, params = data["next"], None
+
+        self.assertEqual(seen, [chef.id for chef in chefs])
+
+
+class KitchenCacheTests(TestCase):
+    def setUp(self):
+        kitchen_cache.reset()
+        self.chef = make_kitchens(1)[0]
+
+    def tearDown(self):
+        kitchen_cache.reset()
+
+    def test_lru_add_is_atomic(self):
+        backend = LRUCacheBackend(max_entries=8)
+        barrier = threading.Barrier(8)
+        results = []
+
+        def add(value):
+            barrier.wait()
+            results.append(backend.add("key", value))
+
+        threads = [threading.Thread(target=add, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results.count(True), 1)
+
+        backend.set("stale", 1, timeout=-1)
+        self.assertTrue(backend.add("stale", 2))
+        self.assertFalse(backend.add("stale", 3))
+        self.assertEqual(backend.get("stale"), 2)
+
+    def test_lru_evicts_least_recently_used(self):
+        backend = LRUCacheBackend(max_entries=2)
+        backend.set("a", 1)
+        backend.set("b", 2)
+        backend.get("a")
+        backend.set("c", 3)
+        self.assertEqual(backend.get("a"), 1)
+        self.assertIsNone(backend.get("b"))
+        self.assertEqual(backend.get("c"), 3)
+
+    def test_reads_are_served_from_cache(self):
+        url = reverse("kitchen-detail", args=[self.chef.id])
+        first = self.client.get(url).json()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).json(), first)
+        first = self.client.get(reverse("get-all-kitchens")).json()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse("get-all-kitchens")).json(), first)
+
+    def test_writes_invalidate_only_their_kitchen(self):
+        other = CustomUser.objects.create(
+            email="other@example.com", role="chef", kitchen_name="Other"
+        )
+        cache = kitchen_cache
+        cache.set_kitchen(other.id, cache.kitchen_version(other.id), {"cached": True})
+        cache.set_kitchen(
+            self.chef.id, cache.kitchen_version(self.chef.id), {"cached": True}
+        )
+        cache.set_catalogue("all", cache.catalogue_version(), ["cached"])
+
+        cache.invalidate_kitchen(self.chef.id)
+
+        self.assertIsNone(
+            cache.get_kitchen(self.chef.id, cache.kitchen_version(self.chef.id))
+        )
+        self.assertIsNone(cache.get_catalogue("all", cache.catalogue_version()))
+        self.assertEqual(
+            cache.get_kitchen(other.id, cache.kitchen_version(other.id)),
+            {"cached": True},
+        )
+
+    def test_write_during_a_miss_orphans_the_payload(self):
+        version = kitchen_cache.catalogue_version()
+        self.assertIsNone(kitchen_cache.get_catalogue("all", version))
+        kitchen_cache.invalidate_kitchen(self.chef.id)
+        kitchen_cache.set_catalogue("all", version, ["stale"])
+        current = kitchen_cache.catalogue_version()
+        self.assertIsNone(kitchen_cache.get_catalogue("all", current))
+
+        def build_across_a_write(payload):
+            def build(*args, **kwargs):
+                kitchen_cache.invalidate_kitchen(self.chef.id)
+                return payload
+
+            return build
+
+        builders = [
+            (
+                reverse("get-all-kitchens"),
+                mock.patch(
+                    "users.drf_views.build_kitchen_catalogue",
+                    side_effect=build_across_a_write([]),
+                ),
+            ),
+            (
+                reverse("kitchen-detail", args=[self.chef.id]),
+                mock.patch.object(
+                    KitchenDetailAPIView,
+                    "serialize_kitchen",
+                    side_effect=build_across_a_write({}),
+                ),
+            ),
+        ]
+        for url, builder in builders:
+            with self.subTest(url=url):
+                with builder:
+                    self.client.get(url)
+                # What was built across the write is not served as fresh.
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(url)
+                self.assertTrue(queries)
+
+    def test_publish_toggle_invalidates(self):
+        url = reverse("kitchen-detail", args=[self.chef.id])
+        self.assertEqual(len(self.client.get(url).json()["food_items"]), 1)
+
+        login(self.client, self.chef)
+        item = self.chef.items.get(is_published=False)
+        self.client.patch(reverse("chef-item-detail", args=[item.id]))
+
+        self.assertEqual(len(self.client.get(url).json()["food_items"]), 2)
+
+    @override_settings(
+        KITCHEN_CACHE={"BACKEND": "users.cache.DjangoCacheBackend", "TIMEOUT": 60}
+    )
+    def test_django_cache_backend(self):
+        kitchen_cache.reset()
+        version = kitchen_cache.kitchen_version(self.chef.id)
+        kitchen_cache.set_kitchen(self.chef.id, version, {"cached": True})
+        self.assertEqual(
+            kitchen_cache.get_kitchen(self.chef.id, version), {"cached": True}
+        )
+        kitchen_cache.invalidate_kitchen(self.chef.id)
+        version = kitchen_cache.kitchen_version(self.chef.id)
+        self.assertIsNone(kitchen_cache.get_kitchen(self.chef.id, version))
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        kitchen_cache.reset()
+        self.chef = make_kitchens(1)[0]
+        mark_kitchen_modified(self.chef.id)
+
+    def tearDown(self):
+        kitchen_cache.reset()
+
+    def test_kitchen_detail_not_modified(self):
+        url = reverse("kitchen-detail", args=[self.chef.id])
+        response = self.client.get(url)
+        etag = response.headers["ETag"]
+        self.assertIn("Last-Modified", response.headers)
+
+        kitchen_cache.reset()
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["ETag"], etag)
+
+    def test_kitchen_change_updates_etag(self):
+        url = reverse("kitchen-detail", args=[self.chef.id])
+        etag = self.client.get(url).headers["ETag"]
+
+        login(self.client, self.chef)
+        item = self.chef.items.first()
+        self.client.delete(reverse("chef-item-detail", args=[item.id]))
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+    def test_kitchen_list_not_modified(self):
+        url = reverse("get-all-kitchens")
+        response = self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                url, HTTP_IF_MODIFIED_SINCE=response.headers["Last-Modified"]
+            )
+        self.assertEqual(response.status_code, 304)
+
+        summary = self.client.get(url, {"summary": "1"})
+        self.assertNotEqual(summary.headers["ETag"], response.headers["ETag"])
+
+
+def make_customer(email="customer@example.com"):
+    return CustomUser.objects.create(
+        email=email,
+        role="customer",
+        first_name="Customer",
+        phone_number="000",
+        country="PK",
+        is_active=True,
+    )
+
+
+class PlaceOrderTests(TestCase):
+    def setUp(self):
+        kitchen_cache.reset()
+        self.chef = make_kitchens(1, items_per_kitchen=4)[0]
+        self.items = list(self.chef.items.filter(is_published=True))
+        self.customer = make_customer()
+        login(self.client, self.customer)
+
+    def place(self, items):
+        return self.client.post(
+            reverse("place-order"),
+            {"kitchen_id": self.chef.id, "items": items},
+            content_type="application/json",
+        )
+
+    def test_order_lines_are_bulk_created(self):
+        cart = [{"item_id": item.id, "quantity": 2} for item in self.items]
+        # Chef, items, then savepoint, capacity lock, order, bulk insert,
+        # customer stats (lookup, create with savepoint, update) and release.
+        with self.assertNumQueries(12):
+            response = self.place(cart)
+
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual(len(data["items"]), 3)
+        self.assertEqual(data["chef"]["kitchen_name"], "Kitchen 0")
+        self.assertEqual(data["items"][0]["price"], "9.50")
+
+    def test_invalid_item_rolls_back_nothing_written(self):
+        unpublished = self.chef.items.get(is_published=False)
+        response = self.place(
+            [{"item_id": self.items[0].id, "quantity": 1}, {"item_id": unpublished.id}]
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_bad_quantity(self):
+        response = self.place([{"item_id": self.items[0].id, "quantity": 0}])
+        self.assertEqual(response.status_code, 400)
+
+
+class CartCheckoutTests(TestCase):
+    def setUp(self):
+        self.chefs = make_kitchens(3)
+        self.customer = make_customer()
+        login(self.client, self.customer)
+
+    def checkout(self, items):
+        return self.client.post(
+            reverse("cart-checkout"), {"items": items}, content_type="application/json"
+        )
+
+    def test_cart_is_split_per_chef(self):
+        items = KitchenItem.objects.filter(is_published=True)
+        cart = [{"item_id": item.id, "quantity": 1} for item in items]
+
+        # Items, then savepoint, capacity locks, orders, lines, customer stats
+        # (lookup, create with savepoint, update) and release.
+        with self.assertNumQueries(11):
+            response = self.checkout(cart)
+
+        self.assertEqual(response.status_code, 201)
+        orders = response.json()["orders"]
+        self.assertEqual(
+            sorted(order["chef"]["id"] for order in orders),
+            [chef.id for chef in self.chefs],
+        )
+        self.assertEqual(Order.objects.filter(customer=self.customer).count(), 3)
+
+    def test_invalid_item_creates_nothing(self):
+        item = KitchenItem.objects.filter(is_published=True).first()
+        response = self.checkout([{"item_id": item.id}, {"item_id": 0}])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.chef = make_kitchens(1)[0]
+        self.item = self.chef.items.get(is_published=True)
+        self.customer = make_customer()
+        login(self.client, self.customer)
+
+    def place(self, key, quantity=1):
+        return self.client.post(
+            reverse("place-order"),
+            {
+                "kitchen_id": self.chef.id,
+                "items": [{"item_id": self.item.id, "quantity": quantity}],
+            },
+            content_type="application/json",
+            HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_retry_replays_original_response(self):
+        first = self.place("abc")
+        retry = self.place("abc")
+
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry.headers["Idempotent-Replayed"], "true")
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_key_reused_with_different_body(self):
+        self.place("abc")
+        self.assertEqual(self.place("abc", quantity=2).status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_expired_keys(self):
+        self.place("abc")
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+
+        self.assertNotIn("Idempotent-Replayed", self.place("abc").headers)
+        self.assertEqual(Order.objects.count(), 2)
+
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+        call_command("prune_idempotency_keys", stdout=StringIO())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+class OrderSnapshotTests(TestCase):
+    def setUp(self):
+        self.chef = make_kitchens(1)[0]
+        self.item = self.chef.items.get(is_published=True)
+        self.customer = make_customer()
+        login(self.client, self.customer)
+
+    def test_history_survives_menu_changes(self):
+        self.client.post(
+            reverse("place-order"),
+            {
+                "kitchen_id": self.chef.id,
+                "items": [{"item_id": self.item.id, "quantity": 2}],
+            },
+            content_type="application/json",
+        )
+        KitchenItem.objects.filter(id=self.item.id).update(price=Decimal("20.00"))
+        self.item.delete()
+
+        # Orders and order items; authentication reads the token claims.
+        with self.assertNumQueries(2):
+            orders = self.client.get(reverse("customer-orders")).json()
+
+        self.assertEqual(orders[0]["total"], "19.00")
+        self.assertEqual(orders[0]["chef"]["kitchen_name"], "Kitchen 0")
+        self.assertEqual(orders[0]["items"][0]["name"], "Dish 1")
+        self.assertEqual(orders[0]["items"][0]["price"], "9.50")
+
+    def test_backfill(self):
+        order = Order.objects.create(customer=self.customer, chef=self.chef)
+        OrderItem.objects.create(order=order, item=self.item, quantity=3)
+
+        call_command("backfill_order_snapshots", stdout=StringIO())
+
+        order.refresh_from_db()
+        self.assertEqual(order.kitchen_name, "Kitchen 0")
+        self.assertEqual(order.total, Decimal("28.50"))
+        line = order.items.get()
+        self.assertEqual((line.name, line.unit_price), ("Dish 1", Decimal("9.50")))
+
+
+class CustomerDashboardTests(TestCase):
+    def setUp(self):
+        self.chefs = make_kitchens(2)
+        self.customer = make_customer()
+        login(self.client, self.customer)
+
+    def test_summary_tracks_orders(self):
+        items = KitchenItem.objects.filter(is_published=True)
+        self.client.post(
+            reverse("cart-checkout"),
+            {"items": [{"item_id": item.id, "quantity": 2} for item in items]},
+            content_type="application/json",
+        )
+        order = Order.objects.filter(chef=self.chefs[0]).get()
+        record_status_change([order], "cancelled")
+
+        # Just the stats row.
+        with self.assertNumQueries(1):
+            summary = self.client.get(reverse("customer-dashboard-summary")).json()
+
+        self.assertEqual(summary["total_spent"], "19.00")
+        self.assertEqual(summary["order_count"], 2)
+        self.assertEqual(summary["status_counts"], {"pending": 1, "cancelled": 1})
+        self.assertEqual(
+            [(k["id"], k["spent"]) for k in summary["kitchens"]],
+            [(self.chefs[1].id, "19.00"), (self.chefs[0].id, "0.00")],
+        )
+
+    def test_status_change_stamps_updated_at(self):
+        item = KitchenItem.objects.filter(is_published=True).first()
+        self.client.post(
+            reverse("cart-checkout"),
+            {"items": [{"item_id": item.id}]},
+            content_type="application/json",
+        )
+        earlier = timezone.now() - timedelta(hours=1)
+        CustomerStats.objects.update(updated_at=earlier)
+
+        record_status_change([Order.objects.get()], "cancelled")
+        self.assertGreater(CustomerStats.objects.get().updated_at, earlier)
+
+    def test_rebuild_matches_incremental(self):
+        item = KitchenItem.objects.filter(is_published=True).first()
+        self.client.post(
+            reverse("cart-checkout"),
+            {"items": [{"item_id": item.id, "quantity": 3}]},
+            content_type="application/json",
+        )
+        before = serialize_stats(CustomerStats.objects.get())
+
+        CustomerStats.objects.all().delete()
+        call_command("rebuild_customer_stats", stdout=StringIO())
+
+        self.assertEqual(serialize_stats(CustomerStats.objects.get()), before)
+
+    def test_empty_dashboard(self):
+        summary = self.client.get(reverse("customer-dashboard-summary")).json()
+        self.assertEqual(summary["total_spent"], "0.00")
+        self.assertEqual(summary["kitchens"], [])
+
+
+class OrderHistoryTests(TestCase):
+    def setUp(self):
+        self.chef = make_kitchens(1)[0]
+        self.item = self.chef.items.get(is_published=True)
+        self.customer = make_customer()
+        for status in ["pending", "accepted", "pending", "completed", "pending"]:
+            order = Order.objects.create(
+                customer=self.customer, chef=self.chef, status=status
+            )
+            OrderItem.objects.create(order=order, item=self.item, name="Dish 1")
+        self.orders = list(Order.objects.order_by("-created_at", "-id"))
+
+    def walk(self, url, params):
+        seen = []
+        while url:
+            # The page and its order lines.
+            with self.assertNumQueries(2):
+                data = self.client.get(url, params).json()
+            seen += [order["id"] for order in data["results"]]
+            url, params = data["next"], None
+        return seen
+
+    def test_customer_feed_is_paginated_newest_first(self):
+        login(self.client, self.customer)
+        seen = self.walk(reverse("customer-orders"), {"page_size": 2})
+        self.assertEqual(seen, [order.id for order in self.orders])
+
+    def test_orders_created_together_page_by_id(self):
+        Order.objects.update(created_at=timezone.now())
+        login(self.client, self.customer)
+        seen = self.walk(reverse("customer-orders"), {"page_size": 2})
+        ids = sorted((order.id for order in self.orders), reverse=True)
+        self.assertEqual(seen, ids)
+
+    def test_chef_feed_filters_by_status(self):
+        login(self.client, self.chef)
+        seen = self.walk(
+            reverse("chef-orders"), {"page_size": 2, "status": "pending,accepted"}
+        )
+        self.assertEqual(
+            seen, [o.id for o in self.orders if o.status in ("pending", "accepted")]
+        )
+
+    def test_date_range(self):
+        login(self.client, self.customer)
+        Order.objects.filter(id=self.orders[-1].id).update(
+            created_at=timezone.now() - timedelta(days=10)
+        )
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+
+        orders = self.client.get(reverse("customer-orders"), {"created_after": since})
+        self.assertEqual(len(orders.json()), 4)
+
+        response = self.client.get(reverse("customer-orders"), {"created_after": "x"})
+        self.assertEqual(response.status_code, 400)
+
+
+class OrderEventTests(TestCase):
+    async def test_hub_fans_out_per_chef(self):
+        broker = LocalBroker()
+        hub = OrderEventHub(broker)
+
+        async with hub.subscribe(1) as first, hub.subscribe(1) as second:
+            async with hub.subscribe(2) as other:
+                self.assertEqual(len(broker._callbacks[hub.channel(1)]), 1)
+                hub.publish(1, {"type": "order.created", "id": 7})
+                for subscription in (first, second):
+                    message = await asyncio.wait_for(subscription.get(), 1)
+                    self.assertEqual(json.loads(message)["id"], 7)
+                self.assertTrue(other.queue.empty())
+
+        self.assertEqual(broker._callbacks, {})
+
+    def test_checkout_publishes_after_commit(self):
+        chef = make_kitchens(1)[0]
+        customer = make_customer()
+        item = chef.items.get(is_published=True)
+        published = []
+        unsubscribe = order_events.broker.subscribe(
+            order_events.channel(chef.id), published.append
+        )
+        self.addCleanup(unsubscribe)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order = place_order(customer, chef, [{"item_id": item.id}])
+            self.assertEqual(published, [])
+
+        event = json.loads(published[0])
+        self.assertEqual(event["type"], "order.created")
+        self.assertEqual(event["order"]["id"], order.id)
+
+    async def test_stream_endpoint(self):
+        [chef] = await sync_to_async(make_kitchens)(1)
+        await sync_to_async(login)(self.async_client, chef)
+
+        response = await self.async_client.get(reverse("chef-order-stream"))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b": connected\n\n")
+
+        order_events.publish(chef.id, {"type": "order.status", "id": 3})
+        chunk = await asyncio.wait_for(anext(stream), 1)
+        self.assertTrue(chunk.startswith(b"event: order.status\ndata: "))
+        await stream.aclose()
+
+    async def test_stream_requires_chef(self):
+        response = await self.async_client.get(reverse("chef-order-stream"))
+        self.assertEqual(response.status_code, 403)
+
+
+class OrderStatusTests(TestCase):
+    def setUp(self):
+        self.chef = make_kitchens(1)[0]
+        self.customer = make_customer()
+        item = self.chef.items.get(is_published=True)
+        self.orders = [
+            place_order(self.customer, self.chef, [{"item_id": item.id}])
+            for _ in range(3)
+        ]
+        login(self.client, self.chef)
+
+    def transition(self, order_ids, status):
+        return self.client.post(
+            reverse("chef-order-status"),
+            {"order_ids": order_ids, "status": status},
+            content_type="application/json",
+        )
+
+    def test_bulk_transition_reports_per_order(self):
+        first, second, third = (order.id for order in self.orders)
+        Order.objects.filter(id=third).update(status="completed")
+
+        response = self.transition([first, second, third, 999], "accepted")
+
+        self.assertEqual(
+            [(r["id"], r["result"]) for r in response.json()["results"]],
+            [
+                (first, "updated"),
+                (second, "updated"),
+                (third, "invalid_transition"),
+                (999, "not_found"),
+            ],
+        )
+        self.assertEqual(Order.objects.filter(status="accepted").count(), 2)
+        stats = CustomerStats.objects.get()
+        self.assertEqual(stats.status_counts, {"pending": 1, "accepted": 2})
+
+    def test_single_update_statement(self):
+        ids = [order.id for order in self.orders]
+        with CaptureQueriesContext(connection) as queries:
+            self.transition(ids, "accepted")
+        updates = [q for q in queries if q["sql"].startswith('UPDATE "users_order"')]
+        self.assertEqual(len(updates), 1)
+
+    def test_unknown_status(self):
+        response = self.transition([self.orders[0].id], "eaten")
+        self.assertEqual(response.status_code, 400)
+
+    def test_order_ids_must_be_a_list(self):
+        for order_ids in ("12", str(self.orders[0].id), {"1": 1}, 5):
+            response = self.transition(order_ids, "accepted")
+            self.assertEqual(response.status_code, 400)
+            error = response.json()["error"]
+            self.assertEqual(error, "order_ids must be a list of ids.")
+        self.assertFalse(Order.objects.filter(status="accepted").exists())
+
+    def test_other_chefs_orders_are_not_found(self):
+        other = CustomUser.objects.create(
+            email="other@example.com", role="chef", kitchen_name="Other", is_active=True
+        )
+        login(self.client, other)
+        response = self.transition([self.orders[0].id], "accepted")
+        self.assertEqual(response.json()["results"][0]["result"], "not_found")
+
+
+class KitchenCapacityTests(TestCase):
+    def setUp(self):
+        kitchen_cache.reset()
+        self.chef = make_kitchens(1)[0]
+        self.item = self.chef.items.get(is_published=True)
+        self.customer = make_customer()
+
+    def tearDown(self):
+        kitchen_cache.reset()
+
+    def configure(self, **limits):
+        login(self.client, self.chef)
+        response = self.client.put(
+            reverse("kitchen-capacity"), limits, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def place(self, quantity=1):
+        login(self.client, self.customer)
+        return self.client.post(
+            reverse("place-order"),
+            {
+                "kitchen_id": self.chef.id,
+                "items": [{"item_id": self.item.id, "quantity": quantity}],
+            },
+            content_type="application/json",
+        )
+
+    def test_max_open_orders(self):
+        place_order(self.customer, self.chef, [{"item_id": self.item.id}])
+        self.assertEqual(self.configure(max_open_orders=2)["open_orders"], 1)
+
+        self.assertEqual(self.place().status_code, 201)
+        self.assertEqual(self.place().status_code, 409)
+        self.assertEqual(Order.objects.count(), 2)
+
+        kitchens = self.client.get(reverse("get-all-kitchens")).json()
+        self.assertFalse(kitchens[0]["isOpen"])
+        detail = self.client.get(reverse("kitchen-detail", args=[self.chef.id]))
+        self.assertFalse(detail.json()["is_open"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            transition_orders(self.chef, [Order.objects.first().id], "cancelled")
+        self.assertTrue(self.client.get(reverse("get-all-kitchens")).json()[0]["isOpen"])
+        self.assertEqual(self.place().status_code, 201)
+
+    def test_max_items_per_slot(self):
+        self.configure(max_items_per_slot=5, slot_minutes=60)
+        self.assertEqual(self.place(quantity=3).status_code, 201)
+        self.assertEqual(self.place(quantity=3).status_code, 409)
+        self.assertEqual(self.place(quantity=2).status_code, 201)
+        self.assertEqual(KitchenSlotUsage.objects.get().items, 5)
+
+    def test_cancelling_gives_items_back_to_the_slot(self):
+        now = timezone.now().replace(hour=12, minute=10)
+        self.configure(max_items_per_slot=5, slot_minutes=60)
+        with mock.patch("django.utils.timezone.now", return_value=now):
+            first = self.place(quantity=3).json()["id"]
+            self.assertEqual(self.place(quantity=2).status_code, 201)
+            transition_orders(self.chef, [first], "cancelled")
+            self.assertEqual(KitchenSlotUsage.objects.get().items, 2)
+            self.assertEqual(self.place(quantity=3).status_code, 201)
+
+        # Orders from an earlier slot leave the current one alone.
+        with mock.patch(
+            "django.utils.timezone.now", return_value=now + timedelta(hours=1)
+        ):
+            self.assertEqual(self.place(quantity=4).status_code, 201)
+            transition_orders(self.chef, [first + 1], "cancelled")
+            self.assertEqual(
+                KitchenSlotUsage.objects.order_by("slot_start").last().items, 4
+            )
+
+    def test_purge_past_slot_usage(self):
+        now = timezone.now()
+        KitchenSlotUsage.objects.bulk_create(
+            [
+                KitchenSlotUsage(chef=self.chef, slot_start=now - timedelta(days=1)),
+                KitchenSlotUsage(chef=self.chef, slot_start=now.replace(hour=0)),
+            ]
+        )
+        out = StringIO()
+        call_command("purge_slot_usage", stdout=out)
+        self.assertIn("Deleted 1 past slot usage rows.", out.getvalue())
+        self.assertEqual(KitchenSlotUsage.objects.count(), 1)
+
+    def test_paused_kitchen(self):
+        self.configure(is_accepting_orders=False)
+        self.assertEqual(self.place().status_code, 409)
+
+    def test_kitchens_without_limits_are_open(self):
+        kitchens = self.client.get(reverse("get-all-kitchens")).json()
+        self.assertTrue(kitchens[0]["isOpen"])
+        self.assertEqual(self.place().status_code, 201)
+
+
+class StatelessAuthenticationTests(TestCase):
+    def setUp(self):
+        kitchen_cache.reset()
+        self.chef = make_kitchens(1)[0]
+
+    def tearDown(self):
+        kitchen_cache.reset()
+
+    def test_claims_replace_user_lookup(self):
+        login(self.client, self.chef)
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("user-status"))
+        self.assertEqual(
+            response.json(),
+            {
+                "id": self.chef.id,
+                "email": self.chef.email,
+                "role": "chef",
+                "kitchen_name": "Kitchen 0",
+                "is_authenticated": True,
+            },
+        )
+
+    def test_tokens_without_claims_fall_back_to_database(self):
+        self.client.cookies["access"] = str(RefreshToken.for_user(self.chef).access_token)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("user-status"))
+        self.assertEqual(response.json()["role"], "chef")
+
+    def test_inactive_claim_is_rejected(self):
+        self.chef.is_active = False
+        login(self.client, self.chef)
+        response = self.client.get(reverse("user-status"))
+        self.assertEqual(response.status_code, 401)
+
+    def test_rename_reissues_claims(self):
+        login(self.client, self.chef)
+        response = self.client.post(
+            reverse("update-kitchen-name"),
+            {"kitchen_name": "New Name"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.cookies["access"]["max-age"], 900)
+        status_response = self.client.get(reverse("user-status"))
+        self.assertEqual(status_response.json()["kitchen_name"], "New Name")
+
+
+class TokenRefreshTests(TestCase):
+    def setUp(self):
+        self.chef = make_kitchens(1)[0]
+        self.refresh = UserRefreshToken.for_user(self.chef)
+        self.client.cookies["refresh"] = str(self.refresh)
+
+    def test_rotates_and_blacklists(self):
+        response = self.client.post(reverse("token-refresh"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.cookies["access"]["max-age"], 900)
+        self.assertNotEqual(response.cookies["refresh"].value, str(self.refresh))
+        self.assertTrue(
+            BlacklistedToken.objects.filter(token__jti=self.refresh["jti"]).exists()
+        )
+
+        self.client.cookies["refresh"] = str(self.refresh)
+        self.assertEqual(self.client.post(reverse("token-refresh")).status_code, 401)
+
+    def test_reissues_claims(self):
+        CustomUser.objects.filter(id=self.chef.id).update(kitchen_name="Renamed")
+        self.client.post(reverse("token-refresh"))
+        status_response = self.client.get(reverse("user-status"))
+        self.assertEqual(status_response.json()["kitchen_name"], "Renamed")
+
+    def test_inactive_user_cannot_refresh(self):
+        CustomUser.objects.filter(id=self.chef.id).update(is_active=False)
+        self.assertEqual(self.client.post(reverse("token-refresh")).status_code, 401)
+
+    def test_missing_cookie(self):
+        del self.client.cookies["refresh"]
+        self.assertEqual(self.client.post(reverse("token-refresh")).status_code, 401)
+
+    def test_prune_expired_tokens(self):
+        for _ in range(3):
+            UserRefreshToken.for_user(self.chef).blacklist()
+        OutstandingToken.objects.filter(blacklistedtoken__isnull=False).update(
+            expires_at=timezone.now() - timedelta(days=1)
+        )
+
+        out = StringIO()
+        call_command("prune_token_blacklist", batch_size=2, stdout=out)
+        self.assertIn("Deleted 3", out.getvalue())
+        self.assertEqual(OutstandingToken.objects.count(), 1)
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+
+class LoginSignupTests(TestCase):
+    def setUp(self):
+        self.customer = make_customer()
+        self.customer.set_password("secret-pass")
+        self.customer.save()
+
+    def login(self, password="secret-pass"):
+        return self.client.post(
+            reverse("login"),
+            {"identifier": self.customer.email, "password": password},
+            content_type="application/json",
+        )
+
+    def test_login(self):
+        response = self.login()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["user"]["id"], self.customer.id)
+        self.assertIn("access", response.cookies)
+        self.client.cookies.clear()
+        self.assertEqual(self.login("wrong").status_code, 400)
+
+    @override_settings(PASSWORD_HASH_QUEUE_DEPTH=0)
+    def test_saturated_pool_answers_429(self):
+        response = self.login()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "1")
+
+    def test_rehash_on_login(self):
+        hashers = ["users.hashing.ConfigurablePBKDF2PasswordHasher"]
+        with override_settings(PASSWORD_HASHERS=hashers, PASSWORD_HASH_ITERATIONS=1000):
+            CustomUser.objects.filter(id=self.customer.id).update(
+                password=make_password("secret-pass")
+            )
+        with override_settings(PASSWORD_HASHERS=hashers, PASSWORD_HASH_ITERATIONS=2000):
+            self.assertEqual(self.login().status_code, 200)
+            self.customer.refresh_from_db()
+            self.assertTrue(self.customer.password.startswith("pbkdf2_sha256$2000$"))
+            self.assertTrue(self.customer.check_password("secret-pass"))
+
+    def test_signup(self):
+        response = self.client.post(
+            reverse("customer-signup"),
+            {
+                "email": "new@example.com",
+                "first_name": "New",
+                "phone_number": "000",
+                "country": "PK",
+                "password": "another-pass",
+            },
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertIn("otp_token", response.cookies)
+        user = CustomUser.objects.get(email="new@example.com")
+        self.assertFalse(user.is_active)
+        self.assertEqual(user.role, "customer")
+        self.assertTrue(user.check_password("another-pass"))
+
+
+class FailingEmailBackend(EmailBackend):
+    def send_messages(self, messages):
+        raise ConnectionError("SMTP is down")
+
+
+class UnreachableEmailBackend(EmailBackend):
+    def open(self):
+        raise ConnectionRefusedError("SMTP login failed")
+
+
+class OutboxTests(TestCase):
+    def test_signup_only_enqueues(self):
+        response = self.client.post(
+            reverse("customer-signup"),
+            {
+                "email": "new@example.com",
+                "first_name": "New",
+                "phone_number": "000",
+                "country": "PK",
+                "password": "another-pass",
+            },
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(mail.outbox, [])
+        queued = OutboundEmail.objects.get()
+        self.assertEqual(queued.to_email, "new@example.com")
+
+        out = StringIO()
+        call_command("send_queued_emails", stdout=out)
+        self.assertIn("Sent 1", out.getvalue())
+        self.assertEqual(mail.outbox[0].to, ["new@example.com"])
+        self.assertIn("Your OTP is", mail.outbox[0].body)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, "sent")
+
+    def test_batches_share_one_connection(self):
+        for n in range(3):
+            enqueue_email(f"user{n}@example.com", "Hello", "Body")
+        opened = []
+        original_open = EmailBackend.open
+
+        def counting_open(backend):
+            opened.append(backend)
+            return original_open(backend)
+
+        EmailBackend.open = counting_open
+        try:
+            self.assertEqual(send_queued_emails(batch_size=2), 2)
+        finally:
+            EmailBackend.open = original_open
+        self.assertEqual(len(set(opened)), 1)
+        self.assertEqual(OutboundEmail.objects.filter(status="pending").count(), 1)
+
+    @override_settings(
+        EMAIL_BACKEND="users.tests.FailingEmailBackend",
+        OUTBOX_MAX_ATTEMPTS=2,
+        OUTBOX_RETRY_BACKOFF=timedelta(minutes=1),
+    )
+    def test_retries_with_backoff(self):
+        email = enqueue_email("user@example.com", "Hello", "Body")
+        self.assertEqual(send_queued_emails(), 0)
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ("pending", 1))
+        self.assertIn("SMTP is down", email.last_error)
+        self.assertGreater(email.next_attempt_at, timezone.now())
+
+        # Not due yet.
+        self.assertEqual(send_queued_emails(), 0)
+        email.refresh_from_db()
+        self.assertEqual(email.attempts, 1)
+
+        OutboundEmail.objects.update(next_attempt_at=timezone.now())
+        send_queued_emails()
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ("failed", 2))
+
+    @override_settings(
+        EMAIL_BACKEND="users.tests.UnreachableEmailBackend",
+        OUTBOX_RETRY_BACKOFF=timedelta(minutes=1),
+    )
+    def test_failed_connection_backs_off_the_batch(self):
+        for n in range(2):
+            enqueue_email(f"user{n}@example.com", "Hello", "Body")
+        self.assertEqual(send_queued_emails(), 0)
+        for email in OutboundEmail.objects.all():
+            self.assertEqual((email.status, email.attempts), ("pending", 1))
+            self.assertIn("SMTP login failed", email.last_error)
+            self.assertGreater(email.next_attempt_at, timezone.now())
+
+    def test_loop_survives_errors(self):
+        command = "users.management.commands.send_queued_emails"
+        with mock.patch(
+            f"{command}.send_queued_emails",
+            side_effect=[RuntimeError("database is down"), KeyboardInterrupt],
+        ), mock.patch(f"{command}.time.sleep") as sleep:
+            with self.assertLogs(command, "ERROR") as logs:
+                with self.assertRaises(KeyboardInterrupt):
+                    call_command("send_queued_emails", loop=True, stdout=StringIO())
+        sleep.assert_called_once_with(2.0)
+        self.assertIn("database is down", logs.output[0])
+
+
+class OTPStoreTestsMixin:
+    def setUp(self):
+        self.user = make_customer()
+        self.user.is_active = False
+        self.user.save()
+
+    def test_verify_once(self):
+        otp = self.store.issue(self.user)
+        self.assertEqual(self.store.verify(self.user.email, otp), "verified")
+        self.assertEqual(self.store.verify(self.user.email, otp), "not_found")
+
+    def test_reissue_replaces_code(self):
+        first = self.store.issue(self.user)
+        second = self.store.issue(self.user)
+        if first != second:
+            self.assertEqual(self.store.verify(self.user.email, first), "invalid")
+        self.assertEqual(self.store.verify(self.user.email, second), "verified")
+
+    @override_settings(OTP_MAX_ATTEMPTS=2)
+    def test_attempts_lock_the_code(self):
+        otp = self.store.issue(self.user)
+        wrong = "000000" if otp != "000000" else "111111"
+        self.assertEqual(self.store.verify(self.user.email, wrong), "invalid")
+        self.assertEqual(self.store.verify(self.user.email, wrong), "invalid")
+        self.assertEqual(self.store.verify(self.user.email, otp), "locked")
+
+        # A new code resets the counter.
+        otp = self.store.issue(self.user)
+        self.assertEqual(self.store.verify(self.user.email, otp), "verified")
+
+
+class DatabaseOTPStoreTests(OTPStoreTestsMixin, TestCase):
+    store = DatabaseOTPStore()
+
+    def test_issue_is_one_upsert(self):
+        self.store.issue(self.user)
+        with self.assertNumQueries(1):
+            self.store.issue(self.user)
+        self.assertEqual(EmailVerificationToken.objects.count(), 1)
+
+    def test_verify_is_one_lookup(self):
+        self.store.issue(self.user)
+        with self.assertNumQueries(1):
+            self.store.verify("nobody@example.com", "123456")
+
+    @override_settings(OTP_MAX_ATTEMPTS=1)
+    def test_attempt_is_claimed_before_comparing(self):
+        otp = self.store.issue(self.user)
+        claim = EmailVerificationToken.objects.filter(user=self.user)
+
+        def parallel_guess(record):
+            # Another request claims the last attempt after this one read the row.
+            claim.update(attempts=1)
+            return False
+
+        with mock.patch.object(EmailVerificationToken, "is_expired", parallel_guess):
+            self.assertEqual(self.store.verify(self.user.email, otp), "locked")
+        self.assertEqual(claim.get().attempts, 1)
+
+    def test_purge_expired(self):
+        otp = self.store.issue(self.user)
+        self.store.issue(make_customer("other@example.com"))
+        EmailVerificationToken.objects.filter(user=self.user).update(
+            created_at=timezone.now() - timedelta(hours=1)
+        )
+        self.assertEqual(self.store.verify(self.user.email, otp), "expired")
+
+        out = StringIO()
+        EmailVerificationToken.objects.update(
+            created_at=timezone.now() - timedelta(hours=1)
+        )
+        call_command("purge_expired_otps", stdout=out)
+        self.assertIn("Deleted 1", out.getvalue())
+        self.assertFalse(EmailVerificationToken.objects.exists())
+
+
+class CacheOTPStoreTests(OTPStoreTestsMixin, TestCase):
+    store = CacheOTPStore()
+
+    def setUp(self):
+        super().setUp()
+        self.store.cache.clear()
+
+    def test_codes_expire_with_the_cache(self):
+        with override_settings(OTP_TTL=timedelta(seconds=-1)):
+            otp = self.store.issue(self.user)
+        self.assertEqual(self.store.verify(self.user.email, otp), "not_found")
+
+
+class VerifyOTPTests(TestCase):
+    def setUp(self):
+        self.user = make_customer()
+        self.user.is_active = False
+        self.user.save()
+        self.otp = DatabaseOTPStore().issue(self.user)
+        self.client.cookies["otp_token"] = create_signed_token(self.user.email, "signup")
+
+    def verify(self, otp):
+        return self.client.post(
+            reverse("verify-otp"), {"otp": otp}, content_type="application/json"
+        )
+
+    def test_verify_activates_user(self):
+        # Code lookup, claiming an attempt, consuming it and activating the user.
+        with self.assertNumQueries(4):
+            response = self.verify(self.otp)
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_active)
+
+    @override_settings(OTP_MAX_ATTEMPTS=1)
+    def test_brute_force_is_locked(self):
+        wrong = "000000" if self.otp != "000000" else "111111"
+        self.assertEqual(self.verify(wrong).status_code, 400)
+        self.assertEqual(self.verify(self.otp).status_code, 429)
+
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        rate_limiter.reset()
+        self.customer = make_customer()
+
+    def tearDown(self):
+        rate_limiter.reset()
+
+    def test_buckets_refill(self):
+        for backend in (MemoryBucketBackend(shards=4), CacheBucketBackend()):
+            with self.subTest(backend=type(backend).__name__):
+                backend.clear()
+                results = [backend.consume("k", 2, 60, now=100)[0] for _ in range(3)]
+                self.assertEqual(results, [True, True, False])
+                self.assertEqual(backend.consume("k", 2, 60, now=100)[1], 30)
+                self.assertTrue(backend.consume("k", 2, 60, now=130)[0])
+                self.assertTrue(backend.consume("other", 2, 60, now=100)[0])
+
+    def test_memory_backend_is_bounded(self):
+        backend = MemoryBucketBackend(shards=1, max_keys=2)
+        for key in ("a", "b", "c"):
+            backend.consume(key, 1, 60, now=0)
+        # "a" was evicted, so it starts again with a full bucket.
+        self.assertTrue(backend.consume("a", 1, 60, now=0)[0])
+        self.assertFalse(backend.consume("c", 1, 60, now=0)[0])
+
+    @override_settings(
+        REST_FRAMEWORK={
+            "DEFAULT_AUTHENTICATION_CLASSES": [
+                "users.authentication.CookieJWTStatelessAuthentication"
+            ],
+            "DEFAULT_THROTTLE_RATES": {"login.identity": "2/min"},
+        }
+    )
+    def test_login_identity_limit(self):
+        # Freeze the buckets' clock so no tokens refill while passwords hash.
+        rate_limiter.backend.clock = lambda: 1000.0
+
+        def attempt(identifier):
+            return self.client.post(
+                reverse("login"),
+                {"identifier": identifier, "password": "wrong"},
+                content_type="application/json",
+            )
+
+        self.assertEqual(attempt(self.customer.email).status_code, 400)
+        self.assertEqual(attempt(self.customer.email.upper()).status_code, 400)
+        response = attempt(self.customer.email)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "30")
+        self.assertEqual(attempt("other@example.com").status_code, 400)
+        self.assertEqual(rate_limiter.rejections["login.identity"], 1)
+
+    @override_settings(
+        REST_FRAMEWORK={
+            "DEFAULT_AUTHENTICATION_CLASSES": [
+                "users.authentication.CookieJWTStatelessAuthentication"
+            ],
+            "DEFAULT_THROTTLE_RATES": {"place-order.identity": "1/min"},
+        }
+    )
+    def test_place_order_throttle(self):
+        chef = make_kitchens(1)[0]
+        item = chef.items.get(is_published=True)
+        login(self.client, self.customer)
+
+        def place():
+            return self.client.post(
+                reverse("place-order"),
+                {"kitchen_id": chef.id, "items": [{"item_id": item.id}]},
+                content_type="application/json",
+            )
+
+        self.assertEqual(place().status_code, 201)
+        response = place()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(rate_limiter.rejections["place-order.identity"], 1)
+
+    @override_settings(
+        REST_FRAMEWORK={"DEFAULT_THROTTLE_RATES": {"login.ip": "1/min"}},
+        RATE_LIMIT_LOG_INTERVAL=60,
+    )
+    def test_rejections_are_counted_and_warnings_throttled(self):
+        clock = mock.patch("users.ratelimit.time.monotonic", return_value=1000.0)
+        with clock as monotonic, self.assertLogs("users.ratelimit") as logs:
+            for _ in range(5):
+                rate_limiter.check("login", "ip", "10.0.0.1")
+            monotonic.return_value = 1061.0
+            rate_limiter.check("login", "ip", "10.0.0.1")
+        self.assertEqual(len(logs.records), 2)
+        self.assertIn("3 more", logs.output[1])
+
+        out = StringIO()
+        call_command("rate_limit_stats", stdout=out)
+        self.assertEqual(out.getvalue(), "login.ip: 5\n")
+
+
+class CaseInsensitiveLookupTests(TestCase):
+    def setUp(self):
+        self.chef = make_kitchens(2)[0]
+
+    def test_login_lookup_uses_lower(self):
+        with CaptureQueriesContext(connection) as queries:
+            LoginSerializer(
+                data={"identifier": "KITCHEN 0", "password": "x"},
+                context={"check_password": False},
+            ).is_valid(raise_exception=True)
+        self.assertIn("LOWER(", queries[0]["sql"].upper())
+
+    def test_kitchen_names_are_unique_ignoring_case(self):
+        login(self.client, self.chef)
+        response = self.client.post(
+            reverse("update-kitchen-name"),
+            {"kitchen_name": "kitchen 1"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        serializer = ChefUserSerializer(
+            data={
+                "email": "new@example.com",
+                "first_name": "New",
+                "phone_number": "000",
+                "country": "PK",
+                "password": "pass",
+                "kitchen_name": "KITCHEN 1",
+            }
+        )
+        self.assertFalse(serializer.is_valid())
+        self.assertIn("kitchen_name", serializer.errors)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command(
+            "benchmark_lookups",
+            chefs=5,
+            customers=10,
+            items_per_chef=2,
+            orders_per_customer=1,
+            chef_history=20,
+            stdout=out,
+        )
+        self.assertIn("login by email", out.getvalue())
+        self.assertFalse(CustomUser.objects.filter(email__startswith="Bench").exists())
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        search_index.reset()
+        self.addCleanup(search_index.reset)
+        self.chefs = make_kitchens(2, items_per_kitchen=1)
+        KitchenItem.objects.all().delete()
+        KitchenItem.objects.bulk_create(
+            [
+                KitchenItem(
+                    chef=self.chefs[0],
+                    name="Vegan Pad Thai",
+                    origin="Thai",
+                    ingredients=["rice noodles", "tofu", "peanuts"],
+                    allergens=["Peanuts", "Soy"],
+                    price=Decimal("12.00"),
+                    is_published=True,
+                ),
+                KitchenItem(
+                    chef=self.chefs[0],
+                    name="Vegan Curry",
+                    description="Coconut curry",
+                    origin="Thai",
+                    allergens=[],
+                    price=Decimal("8.00"),
+                    is_published=True,
+                ),
+                KitchenItem(
+                    chef=self.chefs[1],
+                    name="Lasagne",
+                    origin="Italian",
+                    ingredients=["pasta", "beef"],
+                    allergens=["gluten"],
+                    price=Decimal("15.00"),
+                    is_published=True,
+                ),
+                KitchenItem(
+                    chef=self.chefs[1],
+                    name="Secret vegan special",
+                    is_published=False,
+                    price=Decimal("1.00"),
+                ),
+            ]
+        )
+        sync_item_tags(KitchenItem.objects.all())
+
+    def search(self, **params):
+        response = self.client.get(reverse("search"), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def names(self, data):
+        return [hit["name"] for hit in data["results"]]
+
+    def test_full_text_and_facets(self):
+        data = self.search(q="vegan")
+        self.assertEqual(data["count"], 2)
+        self.assertEqual(sorted(self.names(data)), ["Vegan Curry", "Vegan Pad Thai"])
+        self.assertEqual(data["results"][0]["kitchen"]["name"], "Kitchen 0")
+        self.assertEqual(
+            data["facets"],
+            {
+                "origin": {"Thai": 2},
+                "allergens": {"peanuts": 1, "soy": 1},
+                "price": {"5-10": 1, "10-20": 1},
+            },
+        )
+
+    def test_filters(self):
+        self.assertEqual(
+            self.names(self.search(q="vegan", allergen_free="peanuts")),
+            ["Vegan Curry"],
+        )
+        self.assertEqual(self.names(self.search(origin="italian")), ["Lasagne"])
+        self.assertEqual(
+            self.names(self.search(price_min="9", price_max="13")), ["Vegan Pad Thai"]
+        )
+        self.assertEqual(self.search(q="tofu coconut")["count"], 0)
+
+    def test_price_facet_is_counted_in_the_database(self):
+        items = KitchenItem.objects.filter(is_published=True)
+        KitchenItem.objects.filter(name="Vegan Curry").update(price=Decimal("10.00"))
+        with CaptureQueriesContext(connection) as queries:
+            facets = PostgresSearchBackend().facets(items)
+        self.assertEqual(facets["price"], {"10-20": 3})
+        # Buckets come from one aggregate, not from reading every price.
+        select_prices = 'SELECT "users_kitchenitem"."price"'
+        self.assertFalse(
+            any(query["sql"].startswith(select_prices) for query in queries)
+        )
+
+    def test_kitchen_name_matches_its_items(self):
+        data = self.search(q="kitchen 1")
+        self.assertEqual(self.names(data), ["Lasagne"])
+
+    def test_index_follows_menu_changes(self):
+        self.assertEqual(self.search(q="ramen")["count"], 0)
+        login(self.client, self.chefs[1])
+        self.client.post(
+            reverse("chef-dashboard"),
+            {"name": "Ramen", "price": "11.00", "is_published": True},
+            content_type="application/json",
+        )
+        self.assertEqual(self.names(self.search(q="ramen")), ["Ramen"])
+
+    def test_invalid_params(self):
+        response = self.client.get(reverse("search"), {"price_min": "cheap"})
+        self.assertEqual(response.status_code, 400)
+
+
+class TagFilterTests(TestCase):
+    def setUp(self):
+        kitchen_cache.reset()
+        self.addCleanup(kitchen_cache.reset)
+        self.chefs = make_kitchens(2, items_per_kitchen=1)
+        KitchenItem.objects.all().delete()
+        self.satay, self.curry, self.lasagne = KitchenItem.objects.bulk_create(
+            [
+                KitchenItem(
+                    chef=self.chefs[0],
+                    name="Satay",
+                    ingredients=["Chicken", "peanuts "],
+                    allergens=["Peanuts", "soy"],
+                    price=Decimal("9.00"),
+                    is_published=True,
+                ),
+                KitchenItem(
+                    chef=self.chefs[0],
+                    name="Curry",
+                    ingredients=["chicken", "coconut"],
+                    allergens=[],
+                    price=Decimal("8.00"),
+                    is_published=True,
+                ),
+                KitchenItem(
+                    chef=self.chefs[1],
+                    name="Lasagne",
+                    ingredients=["pasta", "beef"],
+                    allergens=["Gluten"],
+                    price=Decimal("15.00"),
+                    is_published=True,
+                ),
+            ]
+        )
+        call_command("sync_item_tags", stdout=StringIO())
+
+    def names(self, items):
+        return sorted(item["name"] for item in items)
+
+    def test_tags_are_normalized_and_shared(self):
+        self.assertEqual(
+            set(self.satay.tags.values_list("kind", "name")),
+            {
+                ("allergen", "peanuts"),
+                ("allergen", "soy"),
+                ("ingredient", "chicken"),
+                ("ingredient", "peanuts"),
+            },
+        )
+        chicken = Tag.objects.filter(kind="ingredient", name="chicken")
+        self.assertEqual(chicken.count(), 1)
+
+    def test_sync_is_a_constant_number_of_queries(self):
+        items = list(KitchenItem.objects.all())
+        with CaptureQueriesContext(connection) as queries:
+            sync_item_tags(items)
+        with CaptureQueriesContext(connection) as more_queries:
+            sync_item_tags(items * 5)
+        self.assertEqual(len(queries), len(more_queries))
+
+    def test_filter_items(self):
+        items = KitchenItem.objects.all()
+        self.assertEqual(
+            {item.name for item in filter_items(items, allergen_free=["PEANUTS"])},
+            {"Curry", "Lasagne"},
+        )
+        self.assertEqual(
+            {
+                item.name
+                for item in filter_items(items, ingredients=["chicken", "coconut"])
+            },
+            {"Curry"},
+        )
+        self.assertEqual(
+            {
+                item.name
+                for item in filter_items(
+                    items, allergen_free=["soy"], ingredients=["chicken"]
+                )
+            },
+            {"Curry"},
+        )
+
+    def test_serializer_keeps_tags_in_sync(self):
+        login(self.client, self.chefs[1])
+        response = self.client.put(
+            reverse("chef-item-detail", args=[self.lasagne.id]),
+            {"allergens": ["milk"]},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        allergens = self.lasagne.tags.filter(kind="allergen")
+        self.assertEqual(list(allergens.values_list("name", flat=True)), ["milk"])
+        response = self.client.post(
+            reverse("chef-dashboard"),
+            {"name": "Salad", "price": "6.00", "ingredients": ["Lettuce"]},
+            content_type="application/json",
+        )
+        item = KitchenItem.objects.get(id=response.json()["id"])
+        self.assertEqual(list(item.tags.values_list("name", flat=True)), ["lettuce"])
+
+    def test_kitchen_detail_filters(self):
+        url = reverse("kitchen-detail", args=[self.chefs[0].id])
+        full = self.client.get(url)
+        self.assertEqual(self.names(full.json()["food_items"]), ["Curry", "Satay"])
+
+        filtered = self.client.get(url, {"allergen_free": "Peanuts"})
+        self.assertEqual(self.names(filtered.json()["food_items"]), ["Curry"])
+        self.assertNotEqual(filtered["ETag"], full["ETag"])
+        with_peanuts = self.client.get(url, {"ingredients": "peanuts"})
+        self.assertEqual(self.names(with_peanuts.json()["food_items"]), ["Satay"])
+        # The cached unfiltered payload is unaffected.
+        full = self.client.get(url)
+        self.assertEqual(self.names(full.json()["food_items"]), ["Curry", "Satay"])
+
+        not_modified = self.client.get(
+            url, {"allergen_free": "peanuts"}, HTTP_IF_NONE_MATCH=filtered["ETag"]
+        )
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_kitchen_list_filters(self):
+        url = reverse("get-all-kitchens")
+        kitchens = self.client.get(url, {"allergen_free": "gluten,soy"}).json()
+        self.assertEqual([k["name"] for k in kitchens], ["Kitchen 0"])
+        self.assertEqual(kitchens[0]["foodCount"], 1)
+        self.assertEqual(self.names(kitchens[0]["foodItems"]), ["Curry"])
+
+        kitchens = self.client.get(url, {"ingredients": "beef", "summary": "1"}).json()
+        self.assertEqual([k["name"] for k in kitchens], ["Kitchen 1"])
+        self.assertEqual(len(self.client.get(url).json()), 2)
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        autocomplete_index.reset()
+        self.addCleanup(autocomplete_index.reset)
+        # Refresh in the committing thread so the test can see the result.
+        patcher = mock.patch.object(autocomplete_index, "background", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.chefs = make_kitchens(2, items_per_kitchen=1)
+        KitchenItem.objects.all().delete()
+        self.pad_thai, self.draft = KitchenItem.objects.bulk_create(
+            [
+                KitchenItem(
+                    chef=self.chefs[0],
+                    name="Vegan Pad Thai",
+                    price=Decimal("12.00"),
+                    is_published=True,
+                ),
+                KitchenItem(
+                    chef=self.chefs[1],
+                    name="Kitchen Sink Soup",
+                    price=Decimal("5.00"),
+                    is_published=False,
+                ),
+            ]
+        )
+
+    def suggest(self, q, **params):
+        response = self.client.get(reverse("autocomplete"), {"q": q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [(hit["type"], hit["name"]) for hit in response.json()["results"]]
+
+    def test_prefix_and_word_matches(self):
+        self.assertEqual(
+            self.suggest("kit"), [("kitchen", "Kitchen 0"), ("kitchen", "Kitchen 1")]
+        )
+        self.assertEqual(self.suggest("  PAD  th"), [("dish", "Vegan Pad Thai")])
+        self.assertEqual(self.suggest("thai"), [("dish", "Vegan Pad Thai")])
+        self.assertEqual(self.suggest("kit", limit="1"), [("kitchen", "Kitchen 0")])
+        self.assertEqual(self.suggest(""), [])
+        self.assertEqual(self.suggest("zzz"), [])
+
+    def test_follows_menu_changes(self):
+        self.assertEqual(self.suggest("soup"), [])
+        login(self.client, self.chefs[1])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse("chef-item-detail", args=[self.draft.id]))
+        self.assertEqual(self.suggest("soup"), [("dish", "Kitchen Sink Soup")])
+
+        login(self.client, self.chefs[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(
+                reverse("chef-item-detail", args=[self.pad_thai.id]),
+                {"name": "Green Curry"},
+                content_type="application/json",
+            )
+        self.assertEqual(self.suggest("thai"), [])
+        self.assertEqual(self.suggest("curry"), [("dish", "Green Curry")])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse("chef-item-detail", args=[self.pad_thai.id]))
+        self.assertEqual(self.suggest("curry"), [])
+
+    def test_lookups_do_not_query_once_built(self):
+        self.suggest("kit")
+        with self.assertNumQueries(0):
+            self.suggest("veg")
+
+    def test_changes_apply_after_commit_not_on_lookup(self):
+        self.suggest("kit")
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.pad_thai.name = "Green Curry"
+            self.pad_thai.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest("curry"), [])
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.suggest("curry"), [("dish", "Green Curry")])
+
+    def test_index_is_bounded(self):
+        index = PrefixIndex(max_keys=4)
+        index.extend(
+            [
+                ("dish", 1, "Pad Thai", {"kitchen_id": 7}),
+                ("dish", 2, "Soup", {"kitchen_id": 8}),
+                ("dish", 3, "Green Curry", {"kitchen_id": 8}),
+            ]
+        )
+        self.assertEqual(len(index), 3)
+        self.assertEqual(index.search("gre"), [])
+        index = index.without_kitchens({7})
+        self.assertEqual(len(index), 1)
+        soup = {"type": "dish", "id": 2, "name": "Soup", "kitchen_id": 8}
+        self.assertEqual(index.search("so"), [soup])
+
+
+class ReadPathTests(TestCase):
+    def setUp(self):
+        kitchen_cache.reset()
+        self.addCleanup(kitchen_cache.reset)
+        self.chef = make_kitchens(1, items_per_kitchen=1)[0]
+        KitchenItem.objects.create(
+            chef=self.chef,
+            name="Café crème 🍮",
+            description="Rich\u2028and smooth",
+            ingredients=[],
+            allergens=["milk", {"note": "traces"}],
+            price=Decimal("7"),
+            is_published=True,
+        )
+        self.customer = make_customer()
+        for item in KitchenItem.objects.all():
+            place_order(self.customer, self.chef, [{"item_id": item.id, "quantity": 2}])
+
+    def render(self, data):
+        return JSONRenderer().render(data), FastJSONRenderer().render(data)
+
+    def test_item_rows_match_serializer(self):
+        items = KitchenItem.objects.order_by("id")
+        expected = KitchenItemSerializer(items, many=True).data
+        self.assertEqual(item_rows(items), expected)
+        stock, fast = self.render(item_rows(items))
+        self.assertEqual(fast, stock)
+        self.assertIn(b"\\u2028", fast)
+
+    def test_order_rows_match_serializer(self):
+        orders = Order.objects.order_by("-created_at")
+        expected = OrderSerializer(orders.prefetch_related("items"), many=True).data
+        rows = order_rows(orders.values(*ORDER_FIELDS))
+        self.assertEqual(rows, expected)
+        self.assertEqual(*self.render(rows))
+        lines = Prefetch("items", to_attr="prefetched_items")
+        with self.assertNumQueries(2):
+            prefetched = OrderSerializer(
+                orders.prefetch_related(lines), many=True
+            ).data
+        self.assertEqual(prefetched, expected)
+
+    def test_renderer_matches_stock_output(self):
+        data = {
+            "when": timezone.now(),
+            "price": Decimal("1.50"),
+            1: ["a", None, True, 2.5],
+            "nested": {"text": " <>&\""},
+        }
+        self.assertEqual(*self.render(data))
+        floats = [0.0, -0.0, 1e-4, 0.1, 9.5e15, 1e16, -1e300, 2.5e-5, 1e-7]
+        self.assertEqual(*self.render({"floats": floats}))
+        for value in (float("nan"), float("inf")):
+            with self.assertRaises(ValueError):
+                FastJSONRenderer().render({"value": [value]})
+        self.assertEqual(*self.render("text"))
+        self.assertEqual(*self.render(2.5e-5))
+        self.assertEqual(FastJSONRenderer().render(None), b"")
+        indented = FastJSONRenderer().render({"a": 1}, "application/json; indent=2")
+        self.assertEqual(indented, b'{\n  "a": 1\n}')
+
+    def test_nulls_stay_on_the_fast_path(self):
+        url = reverse("get-all-kitchens")
+        with mock.patch.object(
+            JSONRenderer, "render", side_effect=AssertionError("stock renderer used")
+        ):
+            response = self.client.get(url, {"page_size": 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'"previous":null', response.content)
+
+    def test_endpoints_use_read_paths(self):
+        login(self.client, self.customer)
+        response = self.client.get(reverse("customer-orders"))
+        orders = Order.objects.order_by("-created_at").prefetch_related("items")
+        expected = JSONRenderer().render(OrderSerializer(orders, many=True).data)
+        self.assertEqual(response.content, expected)
+        url = reverse("kitchen-detail", args=[self.chef.id])
+        kitchen = self.client.get(url).json()
+        self.assertEqual(
+            [item["name"] for item in kitchen["food_items"]],
+            ["Dish 0", "Café crème 🍮"],
+        )
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command("benchmark_serializers", items=20, orders=20, repeat=1, stdout=out)
+        self.assertEqual(out.getvalue().count("identical output: yes"), 2)
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        kitchen_cache.reset()
+        self.addCleanup(kitchen_cache.reset)
+        self.chefs = make_kitchens(2)
+        self.customer = make_customer()
+        for chef in self.chefs:
+            item = chef.items.get(is_published=True)
+            place_order(self.customer, chef, [{"item_id": item.id, "quantity": 3}])
+
+    def get(self, name, params, *args):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(name, args=args), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), " ".join(query["sql"] for query in queries)
+
+    def test_menu_fields_are_pushed_down(self):
+        login(self.client, self.chefs[0])
+        data, sql = self.get("chef-dashboard", {"fields": "price,id,name"})
+        self.assertEqual([list(item) for item in data], [["id", "name", "price"]] * 2)
+        self.assertNotIn("description", sql)
+        self.assertNotIn("allergens", sql)
+
+    def test_unknown_fields_are_rejected(self):
+        login(self.client, self.chefs[0])
+        response = self.client.get(reverse("chef-dashboard"), {"fields": "id,secret"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("secret", response.json()["error"])
+        response = self.client.get(reverse("get-all-kitchens"), {"include": "orders"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_kitchen_list(self):
+        data, sql = self.get("get-all-kitchens", {"fields": "id,name", "include": ""})
+        self.assertEqual([list(kitchen) for kitchen in data], [["id", "name"]] * 2)
+        self.assertNotIn("users_kitchencapacity", sql)
+        self.assertNotIn("first_name", sql)
+        self.assertNotIn('"users_kitchenitem"."name"', sql)
+
+        data, sql = self.get(
+            "get-all-kitchens",
+            {"fields": "name", "include": "foodItems", "fields[foodItems]": "id,price"},
+        )
+        self.assertEqual(list(data[0]), ["name", "foodItems"])
+        self.assertEqual(list(data[0]["foodItems"][0]), ["id", "price"])
+        self.assertNotIn('"users_kitchenitem"."description"', sql)
+
+        summary, _ = self.get("get-all-kitchens", {"summary": "1", "fields": "id"})
+        self.assertEqual(list(summary[0]), ["id"])
+
+    def test_kitchen_detail(self):
+        url_args = (self.chefs[0].id,)
+        full = self.client.get(reverse("kitchen-detail", args=url_args))
+        data, sql = self.get(
+            "kitchen-detail", {"fields[food_items]": "name"}, *url_args
+        )
+        self.assertEqual(data["food_items"], [{"name": "Dish 1"}])
+        self.assertEqual(list(data), list(full.json()))
+
+        data, sql = self.get("kitchen-detail", {"include": ""}, *url_args)
+        self.assertNotIn("food_items", data)
+        self.assertNotIn('"users_kitchenitem"."name"', sql)
+        self.assertNotIn("password", sql)
+        self.assertEqual(
+            self.client.get(reverse("kitchen-detail", args=url_args)).json(),
+            full.json(),
+        )
+
+    def test_order_history(self):
+        login(self.client, self.customer)
+        data, sql = self.get("customer-orders", {"fields": "id,total", "include": ""})
+        self.assertEqual([list(order) for order in data], [["id", "total"]] * 2)
+        self.assertNotIn("users_orderitem", sql)
+
+        data, _ = self.get(
+            "customer-orders", {"fields": "status", "fields[items]": "quantity"}
+        )
+        self.assertEqual(data[0], {"items": [{"quantity": 3}], "status": "pending"})
+
+        # Cursors still work when created_at is not requested.
+        page, _ = self.get("customer-orders", {"fields": "id", "page_size": 1})
+        self.assertEqual(len(page["results"]), 1)
+        rest = self.client.get(page["next"]).json()
+        self.assertEqual(len(rest["results"]), 1)
+        self.assertNotEqual(rest["results"], page["results"])
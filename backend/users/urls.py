@@ -1,27 +1,34 @@
 from django.urls import path
+from .async_views import chef_order_stream, chef_signup, customer_signup, login
 from .drf_views import (
-    ChefSignupAPI,
-    CustomerSignupAPI,
-    LoginAPIView,
     LogoutAPIView,
+    TokenRefreshAPIView,
     KitchenItemListCreateAPIView,
     VerifyEmailAPIView,
     UpdateKitchenNameAPIView,
     UserStatusAPIView,
     KitchenItemDeleteUpdateView,
     PlaceOrderAPIView,
+    CartCheckoutAPIView,
     KitchenDetailAPIView,
     CustomerOrdersAPIView,
+    CustomerDashboardAPIView,
+    ChefOrderListAPIView,
+    ChefOrderStatusAPIView,
     KitchenListAPIView,
     GetKitchen,
-    VerifyOTPAPIView
+    KitchenCapacityAPIView,
+    VerifyOTPAPIView,
+    SearchAPIView,
+    AutocompleteAPIView,
 )
 
 urlpatterns = [
-    path("signup/chef/", ChefSignupAPI.as_view(), name="chef-signup"),
-    path("signup/customer/", CustomerSignupAPI.as_view(), name="customer-signup"),
-    path("login/", LoginAPIView.as_view(), name="login"),
+    path("signup/chef/", chef_signup, name="chef-signup"),
+    path("signup/customer/", customer_signup, name="customer-signup"),
+    path("login/", login, name="login"),
     path("logout/", LogoutAPIView.as_view(), name="logout"),
+    path("token/refresh/", TokenRefreshAPIView.as_view(), name="token-refresh"),
     path(
         "dashboard/chef/", KitchenItemListCreateAPIView.as_view(), name="chef-dashboard"
     ),
@@ -41,9 +48,27 @@ urlpatterns = [
     ),
     path("kitchen/<int:id>/", KitchenDetailAPIView.as_view(), name="kitchen-detail"),
     path("place-order/", PlaceOrderAPIView.as_view(), name="place-order"),
+    path("checkout/", CartCheckoutAPIView.as_view(), name="cart-checkout"),
     path("my-orders/", CustomerOrdersAPIView.as_view(), name="customer-orders"),
+    path("chef-orders/", ChefOrderListAPIView.as_view(), name="chef-orders"),
+    path("chef-orders/stream/", chef_order_stream, name="chef-order-stream"),
+    path(
+        "chef-orders/status/",
+        ChefOrderStatusAPIView.as_view(),
+        name="chef-order-status",
+    ),
+    path(
+        "dashboard/customer/summary/",
+        CustomerDashboardAPIView.as_view(),
+        name="customer-dashboard-summary",
+    ),
     path("get-all-kitchens/", KitchenListAPIView.as_view(), name="get-all-kitchens"),
+    path("search/", SearchAPIView.as_view(), name="search"),
+    path("autocomplete/", AutocompleteAPIView.as_view(), name="autocomplete"),
     path("get-kitchen/", GetKitchen.as_view(), name="get-kitchen-for-chef"),
+    path(
+        "kitchen-capacity/", KitchenCapacityAPIView.as_view(), name="kitchen-capacity"
+    ),
     path("verify-otp/", VerifyOTPAPIView.as_view(), name="verify-otp"),
 
 ]
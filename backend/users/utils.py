@@ -1,31 +1,29 @@
 
-from django.core.mail import send_mail
 from django.conf import settings
 from .models import EmailVerificationToken
+from .otp import get_otp_store
+from .outbox import enqueue_email
 from django.core.signing import TimestampSigner, BadSignature, SignatureExpired
 import json
 def send_verification_email(user):
     token, created = EmailVerificationToken.objects.get_or_create(user=user)
     verification_link = f"{settings.FRONTEND_URL}/verify-email/{token.token}"
-    send_mail(
+    enqueue_email(
+        user.email,
         subject='Verify your email',
-        message=f'Click the link to verify your account: {verification_link}',
+        body=f'Click the link to verify your account: {verification_link}',
         from_email=settings.DEFAULT_FROM_EMAIL,
-        recipient_list=[user.email],
     )
 
 def send_otp_email(email, otp):
-    send_mail(
+    # Only queued here; the send_queued_emails worker delivers it.
+    enqueue_email(
+        email,
         subject="Your verification code",
-        message=f"Your OTP is: {otp}. It expires in 10 minutes.",
+        body=f"Your OTP is: {otp}. It expires in 10 minutes.",
         from_email="noreply@yourapp.com",
-        recipient_list=[email],
     )
 
-import random
-
-def generate_otp():
-    return str(random.randint(100000, 999999))
 # def handle_otp_for_user(user):
 #     otp = generate_otp()
 
@@ -38,12 +36,8 @@ def generate_otp():
 #     # Send OTP via email
 #     send_otp_email(user.email, otp)
 def handle_otp_for_user(user, role, response):
-    otp = generate_otp()
-    EmailVerificationToken.objects.filter(user=user).delete()
-
-    EmailVerificationToken.objects.create(user=user,otp=otp)
-    # send_otp_email(user.email, otp)
-    print("otp", otp )
+    otp = get_otp_store().issue(user)
+    send_otp_email(user.email, otp)
     signed_token = create_signed_token(user.email, role)
     response.set_cookie(
                 key="otp_token",
@@ -70,5 +64,9 @@ def verify_signed_token(token, max_age=300):
         return None
 
  
+def query_flag(request, name):
+    return request.query_params.get(name, "").lower() in ("1", "true", "yes")
+
+
 def get_fields(data):
     pass
\ No newline at end of file